@@ -2,9 +2,10 @@
 A package of tools for capturing student code by matching it against patterns.
 """
 
-from pedal.cait.cait_api import (find_match, find_matches, find_asts,
+from pedal.cait.cait_api import (find_match, find_matches, find_matches_many, find_asts,
                                  parse_program,
                                  find_submatches, find_expr_sub_matches,
                                  def_use_error, data_state, data_type,
-                                 expire_cait_cache)
+                                 expire_cait_cache, profile_patterns)
+from pedal.cait.stretchy_tree_matching import compile_pattern
 from pedal.cait.constants import TOOL_NAME
@@ -43,10 +43,17 @@ class AstSymbolList:
     """
     This class is a wrapper for a list of AstSymbols for ease of access
     If accessed as a list, manipulable as a list, otherwise, acts as the first AstSymbol in the list
+
+    Lists are shared between AstMaps, so the maps never modify one after it
+    has been put into a table; instead, they build a new list with :py:meth:`extended`.
+
+    Attributes:
+        conflicted (bool): Whether the symbols in this list disagree about their ids.
     """
 
-    def __init__(self):
-        self.my_list = []
+    def __init__(self, symbols=None, conflicted=False):
+        self.my_list = [] if symbols is None else symbols
+        self.conflicted = conflicted
 
     def __getitem__(self, item):
         return self.my_list.__getitem__(item)
@@ -57,8 +64,21 @@ class AstSymbolList:
         Args:
             item:
         """
+        if self.my_list and item.id != self.my_list[0].id:
+            self.conflicted = True
         self.my_list.append(item)
 
+    def extended(self, other):
+        """
+        Args:
+            other (AstSymbolList): The symbols to add after this list's symbols.
+
+        Returns:
+            AstSymbolList: A new list with the symbols of both lists.
+        """
+        return AstSymbolList(self.my_list + other.my_list,
+                             self.conflicted or other.conflicted or self.my_list[0].id != other.my_list[0].id)
+
     def __getattr__(self, attr):
         return getattr(self.my_list[0], attr)
 
@@ -69,7 +89,15 @@ class AstSymbolList:
 class AstMap:
     """
     TODO: Seriously think about redoing this mapping system.
+
+    Maps are merged constantly during matching, so their tables are shared
+    between maps rather than copied: a table is only copied when a map that
+    shares it is about to change it, and the symbol lists inside the tables
+    are never changed at all. Conflicts are tracked incrementally, per key.
     """
+    #: frozenset[str]: The names of the tables this map shares with other maps.
+    _shared = frozenset()
+
     def __init__(self):
         self.mappings = {}
         self.symbol_table = {}
@@ -80,21 +108,32 @@ class AstMap:
         self.match_root = None
         self.diagnosis = ""
 
+    def _writable(self, table_name):
+        """ Gets the named table, first copying it if it is shared with another map. """
+        table = getattr(self, table_name)
+        if table_name in self._shared:
+            table = dict(table)
+            setattr(self, table_name, table)
+            self._shared = self._shared - {table_name}
+        return table
+
+    def _share(self, table_name, other):
+        """ Starts using the other map's table, instead of our (empty) one. """
+        setattr(self, table_name, getattr(other, table_name))
+        self._shared = self._shared | {table_name}
+        other._shared = other._shared | {table_name}
+
     def add_x_to_sym_table(self, key, value, x_table):
-        if key in x_table:
-            new_list = x_table[key]
-            if value not in new_list:
-                new_list.append(value)
-            if not (key in self.conflict_keys):
-                for other in new_list:
-                    if value.id != other.id:
-                        self.conflict_keys.append(key)
-                        break
+        table = self._writable(x_table)
+        if key in table:
+            new_list = table[key]
+            if value not in new_list.my_list:
+                new_list = new_list.extended(AstSymbolList([value]))
         else:
-            new_list = AstSymbolList()
-            new_list.append(value)
-
-        x_table[key] = new_list
+            new_list = AstSymbolList([value])
+        if new_list.conflicted and key not in self.conflict_keys:
+            self.conflict_keys.append(key)
+        table[key] = new_list
         return len(self.conflict_keys)
 
     def add_class_to_sym_table(self, ins_node, std_node):
@@ -129,7 +168,7 @@ class AstMap:
             value = AstSymbol(std_node.astNode.name, std_node)
         else:  # TODO: Little skulpt artifact that doesn't raise Attribute Errors...
             raise AttributeError
-        return self.add_x_to_sym_table(key, value, self.class_table)
+        return self.add_x_to_sym_table(key, value, 'class_table')
 
     def add_func_to_sym_table(self, ins_node, std_node):
         """
@@ -170,7 +209,7 @@ class AstMap:
                 node = node.parent
                 node._id = std_node._id
             value = AstSymbol(std_node._id, node)
-        return self.add_x_to_sym_table(key, value, self.func_table)
+        return self.add_x_to_sym_table(key, value, 'func_table')
 
     def add_var_to_sym_table(self, ins_node, std_node):
         """
@@ -193,7 +232,7 @@ class AstMap:
         else:
             key = ins_node.astNode._id
         value = AstSymbol(std_node.astNode._id, std_node)
-        return self.add_x_to_sym_table(key, value, self.symbol_table)
+        return self.add_x_to_sym_table(key, value, 'symbol_table')
 
     def add_exp_to_sym_table(self, ins_node, std_node):
         """
@@ -209,7 +248,7 @@ class AstMap:
         """
         if not isinstance(std_node, CaitNode):
             raise TypeError
-        self.exp_table[ins_node.astNode.id] = std_node
+        self._writable('exp_table')[ins_node.astNode.id] = std_node
 
     def add_node_pairing(self, ins_node, std_node):
         """
@@ -223,7 +262,8 @@ class AstMap:
         """
         if not isinstance(std_node, CaitNode):
             raise TypeError
-        self.mappings[ins_node] = std_node
+        mappings = self._writable('mappings') if self._shared else self.mappings
+        mappings[ins_node] = std_node
 
     def has_conflicts(self):
         """
@@ -248,6 +288,17 @@ class AstMap:
         new_map.merge_map_with(other)
         return new_map
 
+    def copy(self):
+        """
+        Returns:
+            AstMap: A new map with the same contents as this one, which can be
+                modified without affecting this one.
+        """
+        new_map = self.new_merged_map(None)
+        new_map.conflict_keys = list(self.conflict_keys)
+        new_map.match_root = self.match_root
+        return new_map
+
     def merge_map_with(self, other):
         """
         Returns a newly merged map consisting of this and other
@@ -265,25 +316,42 @@ class AstMap:
             raise TypeError
 
         # merge all mappings
-        self.mappings.update(other.mappings)
+        if other.mappings:
+            if self.mappings:
+                self._writable('mappings').update(other.mappings)
+            else:
+                self._share('mappings', other)
 
         # merge all expressions
-        self.exp_table.update(other.exp_table)
-
-        # merge all symbols
-        for key, value in other.symbol_table.items():
-            for sub_value in value:
-                self.add_var_to_sym_table(key, sub_value.astNode)
-
-        # merge all functions
-        for key, value in other.func_table.items():
-            for sub_value in value:
-                self.add_func_to_sym_table(str(key), sub_value.astNode)
-
-        # merge all classes
-        for key, value in other.class_table.items():
-            for sub_value in value:
-                self.add_class_to_sym_table(str(key), sub_value.astNode)
+        if other.exp_table:
+            if self.exp_table:
+                self._writable('exp_table').update(other.exp_table)
+            else:
+                self._share('exp_table', other)
+
+        # merge all symbols, functions, and classes
+        if other.symbol_table:
+            self._merge_symbols('symbol_table', other)
+        if other.func_table:
+            self._merge_symbols('func_table', other)
+        if other.class_table:
+            self._merge_symbols('class_table', other)
+
+    def _merge_symbols(self, table_name, other):
+        entries = getattr(other, table_name)
+        if getattr(self, table_name):
+            table = self._writable(table_name)
+            for key, symbols in entries.items():
+                if key in table:
+                    symbols = table[key].extended(symbols)
+                table[key] = symbols
+                if symbols.conflicted and key not in self.conflict_keys:
+                    self.conflict_keys.append(key)
+        else:
+            self._share(table_name, other)
+            for key, symbols in entries.items():
+                if symbols.conflicted and key not in self.conflict_keys:
+                    self.conflict_keys.append(key)
 
     @property
     def match_lineno(self):
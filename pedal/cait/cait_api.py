@@ -5,15 +5,17 @@
     :widths: 20, 20, 20, 40
 
     "ast", "CaitNode", "None", "The CaitNode tree that was most recently parsed out."
-    "cache", "{str: CaitNode}", "{}", "A dictionary mapping previously parsed code to CaitNode trees."
+    "cache", "{str: CaitNode}", "{}", "A dictionary mapping previously parsed code to CaitNode trees (shared with the Report's parsed artifacts)."
     "success", "bool", "True", "Whether the most recent parsing was successful."
     "error", "Exception", "None", "The most recent exception, or None."
+    "profile", "{str: PatternProfile}", "None", "The work done searching for each pattern, if :py:func:`profile_patterns` was called."
 
 """
 from pedal.cait.constants import TOOL_NAME
 from pedal.core.commands import system_error
 from pedal.core.report import Report, MAIN_REPORT
-from pedal.cait.stretchy_tree_matching import StretchyTreeMatcher
+from pedal.cait.stretchy_tree_matching import StretchyTreeMatcher, CompiledPattern, PatternProfile, compile_pattern
+from pedal.cait.match_cache import MATCH_CACHE
 from pedal.cait.cait_node import CaitNode
 import ast
 
@@ -38,14 +40,14 @@ def _parse_source(code, report=MAIN_REPORT):
         AstNode: The parsed AST reprensetation, or None
     """
     try:
-        parsed = ast.parse(code)
+        parsed = report.parsed.parse(code)
         report[TOOL_NAME]['success'] = True
         report[TOOL_NAME]['error'] = None
     except SyntaxError as e:
         system_error(TOOL_NAME, "Could not parse code:" + str(e), report=report)
         report[TOOL_NAME]['success'] = False
         report[TOOL_NAME]['error'] = e
-        return ast.parse("")
+        return report.parsed.parse("")
     return parsed
 
 
@@ -122,7 +124,42 @@ def expire_cait_cache(report=MAIN_REPORT):
         report (Report): The report to attach data to. Defaults to MAIN_REPORT.
     """
     report['cait']['ast'] = None
-    report['cait']['cache'] = {}
+    report.parsed.cait_nodes.clear()
+
+
+def profile_patterns(report=MAIN_REPORT):
+    """
+    Starts keeping a :py:class:`~pedal.cait.stretchy_tree_matching.PatternProfile`
+    for each pattern that is searched for, to find out which patterns are
+    expensive. The profiles are kept in ``report['cait']['profile']``.
+
+    Args:
+        report (Report): The report to attach data to. Defaults to MAIN_REPORT.
+
+    Returns:
+        dict[str, PatternProfile]: The profiles of each pattern, by their code.
+    """
+    if report[TOOL_NAME]['profile'] is None:
+        report[TOOL_NAME]['profile'] = {}
+    return report[TOOL_NAME]['profile']
+
+
+def get_pattern_profile(pattern, report=MAIN_REPORT):
+    """
+    Args:
+        pattern (CompiledPattern or any): The pattern being searched for.
+        report (Report): The report to attach data to. Defaults to MAIN_REPORT.
+
+    Returns:
+        PatternProfile or None: The pattern's profile, or None if patterns are
+            not being profiled (or the pattern has no code to identify it by).
+    """
+    profiles = report[TOOL_NAME]['profile']
+    if profiles is None or not isinstance(pattern, CompiledPattern):
+        return None
+    if pattern.pattern not in profiles:
+        profiles[pattern.pattern] = PatternProfile()
+    return profiles[pattern.pattern]
 
 
 def def_use_error(node, report=MAIN_REPORT):
@@ -209,17 +246,19 @@ def find_match(pattern, student_code=None, report=MAIN_REPORT, cut=False, use_pr
             None if nothing was found.
     """
     matches = find_matches(pattern=pattern, student_code=student_code,
-                           report=report, cut=cut, use_previous=use_previous)
+                           report=report, cut=cut, use_previous=use_previous, limit=1)
     if matches:
         return matches[0]
     else:
         return None
 
 
-def find_matches(pattern, student_code=None, cut=False, report=MAIN_REPORT, use_previous=None):
+def find_matches(pattern, student_code=None, cut=False, report=MAIN_REPORT, use_previous=None, limit=None):
     """
     Apply Tree Inclusion and return all matches of the `pattern` in the
-    `student_code`.
+    `student_code`. Unless `use_previous` is given, the matches are
+    remembered in the :py:data:`~pedal.cait.match_cache.MATCH_CACHE`, so
+    that code with the same structure is not matched again.
 
     Args:
         pattern (str): The CaitExpression to match against.
@@ -227,6 +266,8 @@ def find_matches(pattern, student_code=None, cut=False, report=MAIN_REPORT, use_
         report (Report): The report to attach data to.
         cut (bool): Set to true to trim root to first branch
         use_previous (AstMap): If user wants to continue off of a previously found match
+        limit (int): If given, only find (at most) this many matches, stopping
+            the search early.
     Returns:
         list[pedal.cait.ast_map.AstMap]: All matching nodes for the given pattern.
     """
@@ -234,8 +275,40 @@ def find_matches(pattern, student_code=None, cut=False, report=MAIN_REPORT, use_
     if not cait_report['success']:
         return []
     student_ast = cait_report['ast']
+    if isinstance(pattern, str):
+        pattern = compile_pattern(pattern)
     matcher = StretchyTreeMatcher(pattern, report=report)
-    return matcher.find_matches(student_ast, use_previous=use_previous)
+    matcher.profile = get_pattern_profile(pattern, report)
+    if use_previous is not None or not isinstance(pattern, CompiledPattern):
+        return matcher.find_matches(student_ast, use_previous=use_previous, limit=limit)
+    # Other submissions with the same structure will have the same matches
+    key = (pattern.pattern, limit, student_ast.get_tree_digest())
+    matches = MATCH_CACHE.get(key, pattern.root_node, student_ast)
+    if matches is None:
+        matches = matcher.find_matches(student_ast, limit=limit)
+        MATCH_CACHE.put(key, matches)
+    elif matcher.profile is not None:
+        matcher.profile.searches += 1
+        matcher.profile.cached += 1
+    return matches
+
+
+def find_matches_many(patterns, student_code=None, report=MAIN_REPORT, use_previous=None):
+    """
+    Apply Tree Inclusion for several patterns, giving the same results as
+    calling :py:func:`find_matches` for each of them.
+
+    Args:
+        patterns (list[str]): The CaitExpressions to match against.
+        student_code (str): The string of student code to check against.
+        report (Report): The report to attach data to.
+        use_previous (AstMap): If user wants to continue off of a previously found match
+    Returns:
+        list[list[pedal.cait.ast_map.AstMap]]: All matching nodes for each of
+            the given patterns, in the same order as the patterns.
+    """
+    return [find_matches(pattern, student_code, report=report, use_previous=use_previous)
+            for pattern in patterns]
 
 
 def find_submatches(pattern, student_code, is_mod=False, report=MAIN_REPORT):
@@ -261,7 +334,7 @@ def find_expr_sub_matches(pattern, student_code, is_mod=False, report=MAIN_REPOR
     is_node = isinstance(pattern, CaitNode)
     if not isinstance(pattern, str) and not is_node:
         raise TypeError("pattern expected str or CaitNode, found {0}".format(type(pattern)))
-    matcher = StretchyTreeMatcher(pattern, report=report)
+    matcher = StretchyTreeMatcher(pattern if is_node else compile_pattern(pattern), report=report)
     if (not is_node and not is_mod) and len(matcher.root_node.children) != 1:
         raise ValueError("pattern does not evaluate to a singular statement")
     return matcher.find_matches(student_code, check_meta=False)
@@ -304,7 +377,8 @@ def reset(report=MAIN_REPORT):
         'success': True,
         'error': None,
         'ast': None,
-        'cache': {}
+        'cache': report.parsed.cait_nodes,
+        'profile': None
     }
     return report[TOOL_NAME]
 
@@ -2,12 +2,192 @@
 Module for the CaitNode class, which wraps AST nodes.
 """
 import ast
+import hashlib
+from bisect import bisect_left
+from collections import OrderedDict
 from pedal.cait.ast_helpers import dump
 from types import MethodType
 
 from pedal.core.location import Location
 from pedal.core.report import MAIN_REPORT
-from pedal.utilities.system import IS_AT_LEAST_PYTHON_38, IS_SKULPT
+
+
+def get_constant_subtype(value):
+    """
+    Determines the old-style AST name (``Bool``, ``Num``, or ``Str``) for the
+    value of a ``Constant`` node.
+
+    Args:
+        value: The value of the constant.
+
+    Returns:
+        str or None: The name of the subtype, or None if it does not have one.
+    """
+    # TODO: Does this need to be extended for None, tuple, frozenset, anything else?
+    if isinstance(value, bool):
+        return 'Bool'
+    if isinstance(value, (int, float)):
+        return 'Num'
+    if isinstance(value, str):
+        return 'Str'
+    return None
+
+
+_COMPARE_SYMBOLS = {"Eq": "==", "NotEq": "!=", "Lt": "<", "LtE": "<=", "Gt": ">", "GtE": ">="}
+_BINOP_SYMBOLS = {"Add": "+", "Sub": "-", "Mult": "*", "Div": "/"}
+_UNARYOP_SYMBOLS = {"USub": "-", "Not": "not "}
+
+
+def _condition_source(node):
+    """
+    Rewrites a ``Compare`` or ``BoolOp`` AST node as the Python source of an
+    equivalent condition on ``x``, where every variable has been replaced by
+    ``x`` (see :py:meth:`CaitNode.numeric_logic_check`).
+
+    Raises:
+        NotImplementedError: If the node uses anything besides numbers,
+            variables, and the supported operators.
+    """
+    node_type = type(node).__name__
+    if node_type == "BoolOp":
+        joiner = {"And": " and ", "Or": " or "}[type(node.op).__name__]
+        return "(" + joiner.join(_condition_source(value) for value in node.values) + ")"
+    if node_type == "Compare":
+        parts = [_operand_source(node.left)]
+        for op, comparator in zip(node.ops, node.comparators):
+            parts.append(_COMPARE_SYMBOLS[type(op).__name__])
+            parts.append(_operand_source(comparator))
+        return "(" + " ".join(parts) + ")"
+    raise NotImplementedError(node_type)
+
+
+def _operand_source(node):
+    """ Rewrites one side of a comparison for :py:func:`_condition_source`. """
+    node_type = type(node).__name__
+    if node_type == "Name":
+        return "x"
+    if node_type == "Constant":
+        return repr(node.value)
+    if node_type == "Num":
+        return repr(node.n)
+    if node_type == "BinOp":
+        return "({} {} {})".format(_operand_source(node.left), _BINOP_SYMBOLS[type(node.op).__name__],
+                                   _operand_source(node.right))
+    if node_type == "UnaryOp":
+        return "({}{})".format(_UNARYOP_SYMBOLS[type(node.op).__name__], _operand_source(node.operand))
+    raise NotImplementedError(node_type)
+
+
+#: int: How many compiled conditions to keep for numeric_logic_check.
+CONDITION_CACHE_SIZE = 256
+_CONDITIONS = OrderedDict()
+
+
+def _compile_condition(node):
+    """ Turns the given condition into a function of ``x``, reusing previous compilations. """
+    source = _condition_source(node)
+    if source in _CONDITIONS:
+        _CONDITIONS.move_to_end(source)
+        return _CONDITIONS[source]
+    condition = eval(compile("lambda x: " + source, "<condition>", "eval"), {})
+    _CONDITIONS[source] = condition
+    if len(_CONDITIONS) > CONDITION_CACHE_SIZE:
+        _CONDITIONS.popitem(last=False)
+    return condition
+
+
+class TreeIndex:
+    """
+    An index over an entire tree of CaitNodes (by way of their shared
+    ``linear_tree``), so that searches do not have to walk the tree. Nodes are
+    referred to by their position in the ``linear_tree``, which is also their
+    ``tree_id``; the subtree of a node is always a contiguous run of positions,
+    starting from the node itself.
+
+    Attributes:
+        positions (dict[str, list[int]]): The positions of the nodes of each
+            AST type. ``Constant`` nodes are also listed under their subtype.
+        sizes (list[int]): How many nodes are in the subtree of each node.
+        heights (list[int]): How many levels are in the subtree of each node.
+    """
+
+    def __init__(self, linear_tree):
+        self.positions = {}
+        self.sizes = [1] * len(linear_tree)
+        self.heights = [1] * len(linear_tree)
+        for position, node in enumerate(linear_tree):
+            ast_name = type(node.astNode).__name__
+            self.positions.setdefault(ast_name, []).append(position)
+            if ast_name == 'Constant':
+                subtype = get_constant_subtype(node.astNode.value)
+                if subtype is not None:
+                    self.positions.setdefault(subtype, []).append(position)
+        for position in range(len(linear_tree) - 1, -1, -1):
+            for child in linear_tree[position].children:
+                self.sizes[position] += self.sizes[child.tree_id]
+                self.heights[position] = max(self.heights[position], self.heights[child.tree_id] + 1)
+
+    def find(self, node_types, start, stop):
+        """
+        Args:
+            node_types (list[str]): The AST types to look for.
+            start (int): The first position to include.
+            stop (int): The first position to not include.
+
+        Returns:
+            list[int]: The positions of the nodes of any of the given types, in order.
+        """
+        found = []
+        for node_type in node_types:
+            positions = self.positions.get(node_type, [])
+            found.extend(positions[bisect_left(positions, start):bisect_left(positions, stop)])
+        if len(node_types) > 1:
+            found = sorted(set(found))
+        return found
+
+
+class CaitTree:
+    """
+    The data shared by every CaitNode in a tree, which is kept here once rather
+    than on every node. The nodes of the tree are only numbered (and listed in
+    the ``linear_tree``) once something actually needs it.
+
+    Attributes:
+        report (Report): The report associated with this tree.
+        root (CaitNode): The root of the tree.
+        linear_tree (list[CaitNode] or None): Every node in the tree, in order,
+            once they have been numbered.
+        index (TreeIndex or None): The index of the tree, once it has been built.
+        digest (str or None): The digest of the tree's structure, once it has been computed.
+    """
+
+    __slots__ = ('report', 'root', 'linear_tree', 'index', 'digest')
+
+    def __init__(self, report, root):
+        self.report = report
+        self.root = root
+        self.linear_tree = None
+        self.index = None
+        self.digest = None
+
+    def number(self):
+        """
+        Wraps every node in the tree, giving each its ``tree_id`` (its position
+        in the ``linear_tree``).
+
+        Returns:
+            list[CaitNode]: The ``linear_tree``.
+        """
+        if self.linear_tree is None:
+            linear_tree = []
+            pending = [self.root]
+            while pending:
+                node = pending.pop()
+                node._tree_id = len(linear_tree)
+                linear_tree.append(node)
+                pending.extend(reversed(node.children))
+            self.linear_tree = linear_tree
+        return self.linear_tree
 
 
 class CaitNode:
@@ -15,6 +195,10 @@ class CaitNode:
     A wrapper class for AST nodes. Linearizes access to the children of the ast
     node and saves the field this AST node originated from.
 
+    Nodes are compact, and the children of a node are only wrapped when they
+    are first needed. Anything that needs the whole tree (the ``tree_id``, the
+    ``linear_tree``, or a search) wraps the rest of it at once.
+
     Attributes:
         ast_node (ast.AST): The original AstNode.
 
@@ -22,247 +206,155 @@ class CaitNode:
     use a production pattern instead.
     """
 
-    def __init__(self, ast_node, my_field='', tid=0, lin_tree=None,
-                 ancestor=None, report=None):
+    # A matched expression also gets the ``map`` it was matched as part of (see AstMap), and a
+    # matched call gets the ``_id`` of the function it calls (see AstMap.add_func_to_sym_table)
+    __slots__ = ('astNode', 'field', 'parent', '_children', '_tree_id', '_tree', 'map', '_id')
+
+    def __init__(self, ast_node, my_field='', ancestor=None, report=None):
         """
 
         Args:
             ast_node (ast_node): The AST node to be wrapped
             my_field (str): the field of the parent node that produced this child.
-            tid (int): the tree id
-            lin_tree list of cait_node: A linear version of the tree
             ancestor (cait_node): The parent of this node
-            report: The report associated with this particular match.
+            report: The report associated with this particular match (only
+                used by the root of the tree).
         """
-        if report is None:
-            report = MAIN_REPORT
-        self.report = report
-        self.children = []
         self.astNode = ast_node
         self.field = my_field
-        self.tree_id = tid
         self.parent = ancestor
-        if lin_tree is None:
-            self.linear_tree = [self]
+        self._children = None
+        self._tree_id = None
+        if ancestor is None:
+            self._tree = CaitTree(MAIN_REPORT if report is None else report, self)
         else:
-            lin_tree.append(self)
-            self.linear_tree = lin_tree
-
-        # reference to the easy node wrapping the ast_node
-        setattr(ast_node, 'cait_node', self)
-
-        tid_count = tid
-
-        my_field_generator = ast.iter_fields(self.astNode)
-        for item in my_field_generator:
-            field, value = item
-            # if the field doesn't have a value, no child exists
-            if value is None:
-                continue
-
-            # If the children are not in an array, wrap it in an array for
-            # consistency in the code the follows
-            if not isinstance(value, list):
-                value = [value]
-
-            # Reference ast_node_visitor.js for the original behavior and keep note of it for the purposes of handling
-            # the children noting the special case when the nodes of the array are actually parameters of the node
-            # (e.g. a load function) instead of a child node
-            for sub_value in value:
-                if isinstance(sub_value, ast.AST):
-                    new_child = CaitNode(sub_value, my_field=field,
-                                         tid=tid_count + 1,
-                                         lin_tree=self.linear_tree,
-                                         ancestor=self,
-                                         report=self.report)
-                    self.children.append(new_child)
-                    tid_count = len(self.linear_tree) - 1
+            self._tree = ancestor._tree
+
+    @property
+    def children(self):
+        """ tuple[CaitNode]: The wrapped children of this node, in order. """
+        if self._children is None:
+            children = []
+            for field, value in ast.iter_fields(self.astNode):
+                # If the children are not in an array, wrap it in an array for
+                # consistency in the code the follows
+                if not isinstance(value, list):
+                    value = [value]
+                # Reference ast_node_visitor.js for the original behavior and keep note of it for the purposes of
+                # handling the children noting the special case when the nodes of the array are actually parameters
+                # of the node (e.g. a load function) instead of a child node
+                for sub_value in value:
+                    if isinstance(sub_value, ast.AST):
+                        children.append(CaitNode(sub_value, field, self))
+            self._children = tuple(children)
+        return self._children
+
+    @property
+    def report(self):
+        """ Report: The report associated with this node's tree. """
+        return self._tree.report
+
+    @property
+    def linear_tree(self):
+        """ list[CaitNode]: Every node in this node's tree, in order. """
+        return self._tree.number()
+
+    @property
+    def tree_id(self):
+        """ int: The position of this node within its tree. """
+        if self._tree_id is None:
+            self._tree.number()
+        return self._tree_id
+
+    @property
+    def ast_name(self):
+        """ str: The name of the type of the wrapped AST node. """
+        return type(self.astNode).__name__
+
+    def _wrap(self, ast_node):
+        """ Finds the child that wraps the given AST node. """
+        for child in self.children:
+            if child.astNode is ast_node:
+                return child
+        return None
+
+    def _wrap_all(self, ast_nodes):
+        """ Finds the children that wrap the given AST nodes. """
+        wrapped = {id(child.astNode): child for child in self.children}
+        return [wrapped[id(ast_node)] for ast_node in ast_nodes]
 
     def __str__(self):
         return ''.join([self.field, "\n", dump(self.astNode)])
 
+    def get_tree_index(self):
+        """
+        Gets the index for the entire tree this node belongs to, building it
+        the first time it is needed.
+
+        Returns:
+            TreeIndex: The index of the tree.
+        """
+        if self._tree.index is None:
+            self._tree.index = TreeIndex(self.linear_tree)
+        return self._tree.index
+
+    def get_tree_digest(self):
+        """
+        Gets a digest of the structure of the entire tree this node belongs to,
+        which ignores line numbers (and so whitespace and comments): trees with
+        the same digest have the same nodes in the same positions.
+
+        Returns:
+            str: The hex digest of the tree.
+        """
+        if self._tree.digest is None:
+            dumped = ast.dump(self._tree.root.astNode)
+            self._tree.digest = hashlib.sha256(dumped.encode('utf-8')).hexdigest()
+        return self._tree.digest
+
+    def get_subtree_range(self):
+        """
+        Returns:
+            tuple[int, int]: The first position of this node's subtree in the
+                ``linear_tree``, and the first position after it.
+        """
+        return self.tree_id, self.tree_id + self.get_tree_index().sizes[self.tree_id]
+
     def numeric_logic_check(self, mag, expr):
         """
         If this node is a Compare or BoolOp node, sees if the logic in expr (a javascript string being a logical
         statement) matches the logic of self. This assumes that we are only comparing numerical values to a single
-        variable
+        variable: both conditions are checked at every number in either of them, and at those numbers plus and minus
+        the given magnitude(s). Each condition is compiled into a single Python function of that variable, rather
+        than being interpreted node by node for every number.
         TODO: modify this to take multiple variables
         TODO: modify to support more than +, -, *, and / BinOps
         TODO: modify to support unary operators other than USub and Not
         TODO: This is very finicky and buggy, try not to use it
         Args:
-            mag (float): the order of magnitude that should be added to numbers to check logic, 1 is usually a good value,
-                    especially when working with the set of integers.
+            mag (float or list[float]): the order of magnitude that should be added to numbers to check logic, 1 is
+                    usually a good value, especially when working with the set of integers. Several magnitudes can be
+                    checked at once by giving a list of them.
             expr (Compare or BoolOp): the "Compare" or "BoolOp" tree to check self against
 
         Returns:
             bool: True if self (typically student node) and expr are equivalent boolean expressions
         """
-
-        def eval_unop(unop_num, unop_node):
-            """
-
-            Args:
-                unop_num:
-                unop_node:
-
-            Returns:
-
-            """
-            operand = eval_selector(unop_num, unop_node.operand)
-            op = unop_node.op_name
-
-            return {"USub": -operand,
-                    "Not": not operand}[op]
-
-        def eval_binop(binop_num, binop_node):
-            """
-
-            Args:
-                binop_num:
-                binop_node:
-
-            Returns:
-
-            """
-            left = eval_selector(binop_num, binop_node.left)
-            right = eval_selector(binop_num, binop_node.right)
-            op = binop_node.op_name
-
-            return {
-                "Add": left + right,
-                "Sub": left - right,
-                "Mult": left * right,
-                "Div": left / right}[op]
-
-        def eval_selector(op_num, op_expr):
-            """
-
-            Args:
-                op_num:
-                op_expr:
-
-            Returns:
-
-            """
-            op_expr = op_num if op_expr.ast_name == "Name" else op_expr
-            if isinstance(op_expr, (int, float)):
-                return op_expr
-            if op_expr.ast_name == "BinOp":
-                return eval_binop(op_num, op_expr)
-            if op_expr.ast_name == "UnaryOp":
-                return eval_unop(op_num, op_expr)
-            if op_expr.ast_name == "Num":
-                return op_expr.n
-            if op_expr.ast_name == "Constant":
-                return op_expr.value
-            raise NotImplementedError
-
-        def eval_bool_comp(num_list, comp_ast):
-            """
-
-            Args:
-                num_list:
-                comp_ast:
-
-            Returns:
-
-            """
-            ops = comp_ast.ops_names
-            comps = comp_ast.comparators
-            results = []
-            current = comp_ast.left
-            left = current
-
-            for num_i in num_list:
-                result = True
-                for op, comp in zip(ops, comps):
-                    current = eval_selector(num_i, current)
-                    comp_p = eval_selector(num_i, comp)
-
-                    res = {
-                        "Eq": current == comp_p,
-                        "NotEq": current != comp_p,
-                        "Lt": current < comp_p,
-                        "LtE": current <= comp_p,
-                        "Gt": current > comp_p,
-                        "GtE": current >= comp_p,
-                    }[op]
-                    current = comp
-                    result = result and res
-                    if not result:
-                        break
-                results.append(result)
-                current = left
-            return results
-
-        def eval_boolop(num_list, boolop_ast):
-            """
-
-            Args:
-                num_list:
-                boolop_ast:
-
-            Returns:
-
-            """
-            boolop = boolop_ast.op_name
-            values = boolop_ast.values
-            results_c = None
-            is_and = boolop == "And"
-            for value in values:
-                if value.ast_name == "Compare":
-                    results = eval_bool_comp(num_list, value)
-                else:  # should be boolop
-                    results = eval_boolop(num_list, value)
-                if results_c is None:
-                    results_c = results
-                else:  # compile results
-                    new_result = []
-                    for result1, result2 in zip(results_c, results):
-                        if is_and:
-                            new_result.append(result1 and result2)
-                        else:
-                            new_result.append(result1 or result2)
-                    results_c = new_result
-            return results_c
-
+        mags = mag if isinstance(mag, (list, tuple)) else [mag]
         try:
-            ins_expr = CaitNode(ast.parse(expr), report=self.report).body[0].value
-            ins_nums = ins_expr.find_all(["Num", "Constant"])
-            std_nums = self.find_all(["Num", "Constant"])
-            test_nums = []
-            for num in ins_nums:
-                if hasattr(num, "n"):
-                    raw_num = num.n
-                else:
-                    raw_num = num.value
-                test_nums.append(raw_num)
-                test_nums.append(raw_num + mag)
-                test_nums.append(raw_num - mag)
-            for num in std_nums:
-                if hasattr(num, "n"):
-                    raw_num = num.n
-                else:
-                    raw_num = num.value
-                test_nums.append(raw_num)
-                test_nums.append(raw_num + mag)
-                test_nums.append(raw_num - mag)
-
-            if self.ast_name == "Compare":
-                std_res = eval_bool_comp(test_nums, self)
-            elif self.ast_name == "BoolOp":
-                std_res = eval_boolop(test_nums, self)
-            else:
-                return False
-
-            if ins_expr.ast_name == "Compare":
-                ins_res = eval_bool_comp(test_nums, ins_expr)
-            elif ins_expr.ast_name == "BoolOp":
-                ins_res = eval_boolop(test_nums, ins_expr)
-            else:
-                raise TypeError
-            return ins_res == std_res
+            ins_expr = ast.parse(expr).body[0].value
+            std_condition = _compile_condition(self.astNode)
+            ins_condition = _compile_condition(ins_expr)
+            nums = [node for node in ast.walk(ins_expr) if type(node).__name__ in ("Num", "Constant")]
+            nums.extend(num.astNode for num in self.find_all(["Num", "Constant"]))
+            test_nums = set()
+            for num in nums:
+                raw_num = num.n if type(num).__name__ == "Num" else num.value
+                test_nums.add(raw_num)
+                for a_mag in mags:
+                    test_nums.add(raw_num + a_mag)
+                    test_nums.add(raw_num - a_mag)
+            return all(std_condition(num) == ins_condition(num) for num in test_nums)
         except Exception:
             return False
 
@@ -277,28 +369,10 @@ class CaitNode:
 
         """
 
-        # adding function to track tree ids
-        def visit_counter(self, node):
-            """
-
-            Args:
-                self:
-                node:
-            """
-            self.counter += 1
-            self.generic_visit(node)
-
-        node_counter = ast.NodeVisitor()
-        setattr(node_counter, 'counter', self.tree_id)
-        node_counter.visit = MethodType(visit_counter, node_counter)
-
-        # getting ids
-        node_counter.visit(self.astNode)
-        out_of_tree = node_counter.counter >= len(self.linear_tree)  # check if out of bounds
-        # len(self.children) > 0 and self.children[-1] == node_counter
-        if out_of_tree:
+        start, stop = self.get_subtree_range()
+        if stop >= len(self.linear_tree):  # check if out of bounds
             return None
-        return self.linear_tree[node_counter.counter]
+        return self.linear_tree[stop]
 
     def get_child(self, node):
         """
@@ -374,12 +448,9 @@ class CaitNode:
                     field = None
                 if node_name == "Assign" and item != key:
                     if item == "target":
-                        return field[0].cait_node  # Get's the relevant ast node
+                        return self._wrap(field[0])  # Get's the relevant ast node
                     elif item == "targets" and isinstance(field, list):
-                        easy_array = []
-                        for node in field:
-                            easy_array.append(node.cait_node)
-                        return easy_array
+                        return self._wrap_all(field)
                     else:
                         return field
                 elif item in AST_SINGLE_FUNCTIONS:
@@ -390,11 +461,11 @@ class CaitNode:
                         str_ops_list.append(type(op).__name__)
                         return str_ops_list
                 elif isinstance(field, ast.AST):
-                    return field.cait_node
+                    return self._wrap(field)
                 elif isinstance(field, list):
                     try:
-                        return [f.cait_node for f in field]
-                    except AttributeError:
+                        return self._wrap_all(field)
+                    except KeyError:
                         # This can only happen in NonLocals, which has a list
                         # of raw strings in the `names` property
                         return field
@@ -403,7 +474,7 @@ class CaitNode:
             else:  # get added field that may have existed for different node types
                 return self.get_clashing_attr(key)
 
-    def find_matches(self, pattern, is_mod=False, check_meta=True, use_previous=True):
+    def find_matches(self, pattern, is_mod=False, check_meta=True, use_previous=True, limit=None):
         """
         Retrieves any patterns that match against this CaitNode. Expected to be
         used for subpattern matching.
@@ -415,6 +486,7 @@ class CaitNode:
                             source
             use_previous (bool): If True, the match will be searched while inheriting the symbol table of the parent. This
                             means that variable consistency must be maintained between parent and child matches.
+            limit (int): If given, stop after finding this many matches.
 
         Returns:
             :obj: 'list' of :'obj': AstMap: a list of matches
@@ -422,14 +494,17 @@ class CaitNode:
         """
         # Avoid circular import
         import pedal.cait.stretchy_tree_matching as stm
+        from pedal.cait.cait_api import get_pattern_profile
         is_node = isinstance(pattern, CaitNode)
         if not isinstance(pattern, str) and not is_node:
             raise TypeError("pattern expected str or CaitNode, found {0}".format(type(pattern)))
+        pattern = pattern if is_node else stm.compile_pattern(pattern)
         matcher = stm.StretchyTreeMatcher(pattern, report=self.report)
+        matcher.profile = get_pattern_profile(pattern, self.report)
         if (not is_node and not is_mod) and len(matcher.root_node.children) != 1:
             raise ValueError("pattern does not evaluate to a singular statement")
         use_previous = self.map if use_previous else None
-        return matcher.find_matches(self, check_meta=check_meta, use_previous=use_previous)
+        return matcher.find_matches(self, check_meta=check_meta, use_previous=use_previous, limit=limit)
 
     def find_match(self, pattern, is_mod=False, check_meta=True, use_previous=True):
         """
@@ -443,7 +518,7 @@ class CaitNode:
         Returns:
 
         """
-        matches = self.find_matches(pattern, is_mod, check_meta=check_meta, use_previous=use_previous)
+        matches = self.find_matches(pattern, is_mod, check_meta=check_meta, use_previous=use_previous, limit=1)
         if len(matches) != 0:
             return matches[0]
         return None
@@ -458,51 +533,13 @@ class CaitNode:
             a list of Ast Nodes (cait_nodes) of self that are of the specified type (including self if self
                     meets that criteria)
         """
-        items = []
-        visitor = ast.NodeVisitor()
-        setattr(visitor, "items", items)
-
-        def main_visit(self, node):
-            """
-
-            Args:
-                self:
-                node:
-
-            Returns:
-
-            """
-            self.items.append(node.cait_node)
-            return self.generic_visit(node)
-
         if type(node_type) is not list:
             node_type_list = [node_type]
         else:
             node_type_list = node_type
-
-        for node_t in node_type_list:
-            if (IS_AT_LEAST_PYTHON_38 and not IS_SKULPT) and node_t in ('Num', 'Str', 'Bool'):
-                func_name = 'visit_Constant'
-                func_ref = self._handle_visit_constant(node_t, main_visit)
-            else:
-                func_name = 'visit_' + node_t
-                func_ref = main_visit
-            setattr(visitor, func_name, MethodType(func_ref, visitor))
-
-        visitor.visit(self.astNode)
-        return visitor.items
-
-    def _handle_visit_constant(self, actual_node, visitor_function):
-        def visit_Constant(self, node):
-            # TODO: Does this need to be extended for None, tuple, frozenset, anything else?
-            if actual_node == 'Bool' and isinstance(node.value, bool):
-                return visitor_function(self, node)
-            if actual_node == 'Num' and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
-                return visitor_function(self, node)
-            elif actual_node == 'Str' and isinstance(node.value, str):
-                return visitor_function(self, node)
-            return self.generic_visit(node)
-        return visit_Constant
+        start, stop = self.get_subtree_range()
+        return [self.linear_tree[position]
+                for position in self.get_tree_index().find(node_type_list, start, stop)]
 
     def has(self, node):
         """
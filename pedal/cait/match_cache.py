@@ -0,0 +1,104 @@
+"""
+A cache of pattern matching results, shared by all the Reports in a process.
+
+When grading many submissions, the same instructor patterns are matched
+against many programs that are identical apart from their whitespace and
+comments. Matching only depends on the structure of the student's tree, so
+results are remembered by the pattern and the tree's digest (see
+:py:meth:`~pedal.cait.cait_node.CaitNode.get_tree_digest`). They are kept as
+positions in the trees rather than as nodes, and rebuilt against whichever
+tree is being matched, so that matches always point at the student's own
+nodes (with their own line numbers).
+"""
+
+from collections import OrderedDict
+
+from pedal.cait.ast_map import AstMap, AstSymbol, AstSymbolList
+
+_SYMBOL_TABLES = ('symbol_table', 'func_table', 'class_table')
+
+
+def _store_map(mapping):
+    """ Turns the map into positions in the pattern's and student's trees. """
+    tables = tuple({key: ([(symbol.id, symbol.astNode.tree_id) for symbol in symbols.my_list],
+                          symbols.conflicted)
+                    for key, symbols in getattr(mapping, table_name).items()}
+                   for table_name in _SYMBOL_TABLES)
+    return (tuple((ins_node.tree_id, std_node.tree_id) for ins_node, std_node in mapping.mappings.items()),
+            tables,
+            {key: std_node.tree_id for key, std_node in mapping.exp_table.items()},
+            tuple(mapping.conflict_keys),
+            None if mapping.match_root is None else mapping.match_root.tree_id)
+
+
+def _load_map(stored, pattern_tree, student_tree):
+    """ Rebuilds a stored map, using the nodes of the given (linear) trees. """
+    mappings, tables, exp_table, conflict_keys, match_root = stored
+    mapping = AstMap()
+    mapping.mappings = {pattern_tree[ins_id]: student_tree[std_id] for ins_id, std_id in mappings}
+    for table_name, table in zip(_SYMBOL_TABLES, tables):
+        setattr(mapping, table_name, {
+            key: AstSymbolList([AstSymbol(symbol_id, student_tree[std_id]) for symbol_id, std_id in symbols],
+                               conflicted)
+            for key, (symbols, conflicted) in table.items()})
+    mapping.exp_table = {key: student_tree[std_id] for key, std_id in exp_table.items()}
+    mapping.conflict_keys = list(conflict_keys)
+    mapping.match_root = None if match_root is None else student_tree[match_root]
+    return mapping
+
+
+class MatchCache:
+    """
+    A least-recently-used cache mapping a key (which must include the
+    student tree's digest) to the matches that were found for it.
+
+    Args:
+        maximum_size (int): How many lists of matches to keep.
+    """
+
+    def __init__(self, maximum_size=4096):
+        self.maximum_size = maximum_size
+        self._matches = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._matches)
+
+    def get(self, key, pattern_root, student_root):
+        """
+        Rebuilds the matches previously stored for the key, if there are any.
+
+        Args:
+            key (tuple): The key the matches were stored with.
+            pattern_root (CaitNode): The root of the pattern that was matched.
+            student_root (CaitNode): The root of the student's tree to rebuild
+                the matches with.
+
+        Returns:
+            list[AstMap] or None: Fresh copies of the matches, or None if they
+                are not cached.
+        """
+        if key not in self._matches:
+            self.misses += 1
+            return None
+        self._matches.move_to_end(key)
+        self.hits += 1
+        pattern_tree, student_tree = pattern_root.linear_tree, student_root.linear_tree
+        return [_load_map(stored, pattern_tree, student_tree) for stored in self._matches[key]]
+
+    def put(self, key, matches):
+        """ Stores the given matches for the key, evicting old matches if needed. """
+        self._matches[key] = [_store_map(mapping) for mapping in matches]
+        self._matches.move_to_end(key)
+        while len(self._matches) > self.maximum_size:
+            self._matches.popitem(last=False)
+
+    def clear(self):
+        self._matches.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+#: MatchCache: The cache shared by all the Reports in this process.
+MATCH_CACHE = MatchCache()
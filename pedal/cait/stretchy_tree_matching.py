@@ -2,7 +2,12 @@
 The main Stretchy Tree Matching algorithm, implemented as a class.
 """
 import ast
+import functools
 import re
+from collections import OrderedDict
+from contextlib import closing
+from itertools import islice
+from time import perf_counter
 from pedal.cait.ast_map import AstMap
 from pedal.cait.cait_node import CaitNode
 from pedal.cait.ast_map import SymTables
@@ -27,13 +32,173 @@ def is_primitive(item):
     return isinstance(item, (int, float, str, bool)) or item is None
 
 
+_VAR_REGEX = re.compile('^_[^_].*_$')
+_EXP_REGEX = re.compile('^__.*__$')
+_WILD_REGEX = re.compile('^___$')
+_TRIM_SET = ("Expr", "Module")
+
+#: int: How many names to remember the classification of.
+NAME_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=NAME_CACHE_SIZE)
 def _name_regex(name_id):
-    var_match = re.compile('^_[^_].*_$')  # /regex
-    exp_match = re.compile('^__.*__$')  # /regex
-    wild_card = re.compile('^___$')  # /regex
-    return {_VAR: var_match.match(name_id),
-            _EXP: exp_match.match(name_id),
-            _WILD: wild_card.match(name_id)}
+    return {_VAR: _VAR_REGEX.match(name_id),
+            _EXP: _EXP_REGEX.match(name_id),
+            _WILD: _WILD_REGEX.match(name_id)}
+
+
+# The types of pattern nodes that can match student nodes of a different type
+_FLEXIBLE_TYPES = ("Name", "arg", "Module", "Pass", "Expr")
+
+
+def _pattern_bounds(ins_node):
+    """
+    Determines what a student node must look like to possibly match the given
+    pattern node: its AST type (or None, if it could be of any type), and the
+    fewest nodes and levels its subtree could have.
+
+    Each pattern node is matched to its own student node, and the children of
+    a rigid (non-flexible) pattern node are matched within the subtrees of
+    the student node's children, so these bounds are safe to prune with.
+    """
+    if ins_node.ast_name in _FLEXIBLE_TYPES:
+        return None, 1, 1
+    size, height = 1, 1
+    for child in ins_node.children:
+        child_type, child_size, child_height = _pattern_bounds(child)
+        size += child_size
+        height = max(height, child_height + 1)
+    return ins_node.ast_name, size, height
+
+
+def _trim(root):
+    """ Finds the node that matching should actually start from, skipping any lone Module or Expr. """
+    while len(root.children) == 1 and root.ast_name in _TRIM_SET:
+        root = root.children[0]
+    return root
+
+
+class CompiledPattern:
+    """
+    An instructor pattern that has been parsed and prepared for matching once,
+    so that it can be reused by any number of StretchyTreeMatchers. Get these
+    from :py:func:`compile_pattern`, rather than making them directly.
+
+    Args:
+        pattern (str): The pattern's code.
+        filename (str): The filename to parse with - only used for error
+            reporting.
+
+    Attributes:
+        root_node (CaitNode): The parsed pattern.
+        explore_root (CaitNode): The node within the pattern that matching starts from.
+        explore_bounds (tuple): The type, size, and height that a student node
+            must have to possibly match the ``explore_root``.
+    """
+    def __init__(self, pattern, filename="__main__"):
+        self.pattern = pattern
+        self.root_node = CaitNode(ast.parse(pattern, filename), _NONE_FIELD)
+        self.explore_root = _trim(self.root_node)
+        self.explore_bounds = _pattern_bounds(self.explore_root)
+        # Classify all the symbols now, rather than during matching
+        for node in self.root_node.linear_tree:
+            for field in ('id', 'attr', 'arg', 'name'):
+                name = getattr(node.astNode, field, None)
+                if isinstance(name, str):
+                    _name_regex(name)
+
+
+#: int: How many compiled patterns to keep in the pattern cache.
+PATTERN_CACHE_SIZE = 1024
+PATTERN_CACHE = OrderedDict()
+
+
+def compile_pattern(pattern, filename="__main__"):
+    """
+    Prepares the given pattern for matching, reusing a previous preparation of
+    it if possible (instructor scripts tend to check the same patterns against
+    every submission).
+
+    Args:
+        pattern (str): The pattern's code.
+        filename (str): The filename to parse with - only used for error
+            reporting.
+
+    Returns:
+        CompiledPattern: The prepared pattern, which should not be modified.
+
+    Raises:
+        SyntaxError: If the pattern is not valid Python (failures are not cached).
+    """
+    if pattern in PATTERN_CACHE:
+        PATTERN_CACHE.move_to_end(pattern)
+        return PATTERN_CACHE[pattern]
+    compiled = CompiledPattern(pattern, filename)
+    PATTERN_CACHE[pattern] = compiled
+    if len(PATTERN_CACHE) > PATTERN_CACHE_SIZE:
+        PATTERN_CACHE.popitem(last=False)
+    return compiled
+
+
+class PatternProfile:
+    """
+    Counts how much work went into searching for one pattern, to help find
+    the patterns that make an instructor script slow. A matcher only keeps
+    these counts if it is given one of these as its ``profile``.
+
+    Attributes:
+        searches (int): How many times the pattern was searched for.
+        cached (int): How many of those searches were answered by the
+            :py:data:`~pedal.cait.match_cache.MATCH_CACHE` instead.
+        deep_matches (int): How many deep matches were attempted.
+        merges (int): How many pairs of maps were merged while extending
+            matches (the sizes of map_merge's cartesian products).
+        peak_maps (int): The most maps that were produced by a single merge.
+        seconds (float): The total time spent searching.
+    """
+    __slots__ = ('searches', 'cached', 'deep_matches', 'merges', 'peak_maps', 'seconds')
+
+    def __init__(self):
+        self.searches = 0
+        self.cached = 0
+        self.deep_matches = 0
+        self.merges = 0
+        self.peak_maps = 0
+        self.seconds = 0.0
+
+    def to_json(self):
+        """
+        Returns:
+            dict: The counts, as plain data.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _LazyMatches:
+    """
+    Remembers the mappings produced by an iterator as they are asked for, so
+    that they can be iterated over again without finding them twice.
+    """
+    __slots__ = ('_source', '_found')
+
+    def __init__(self, source):
+        self._source = source
+        self._found = []
+
+    def __iter__(self):
+        index = 0
+        while True:
+            if index == len(self._found):
+                if self._source is None:
+                    return
+                try:
+                    self._found.append(next(self._source))
+                except StopIteration:
+                    self._source = None
+                    return
+            yield self._found[index]
+            index += 1
 
 
 class StretchyTreeMatcher:
@@ -42,15 +207,31 @@ class StretchyTreeMatcher:
     student code. It produces a set of potential mappings between them.
 
     Args:
-        ast_or_code (str or AstNode): The students' code or a valid AstNode from
-            `ast.parse`. If the code has invalid syntax, a SyntaxError
-            will be raised.
+        ast_or_code (str or AstNode or CompiledPattern): The pattern's code, a
+            valid AstNode from `ast.parse`, or a pattern from
+            :py:func:`compile_pattern`. If the code has invalid syntax, a
+            SyntaxError will be raised.
         filename (str): The filename to parse with - only used for error
             reporting.
         report (Report): A report to obtain data from.
+
+    Attributes:
+        table_hits (int): How many deep matches were answered from the match table.
+        table_misses (int): How many deep matches had to be computed.
+        profile (PatternProfile or None): If given, the counts of the work done
+            by this matcher are added to it.
     """
     def __init__(self, ast_or_code, report, filename="__main__"):
         self.report = report
+        self._match_table = None
+        self.table_hits = 0
+        self.table_misses = 0
+        self.profile = None
+        if isinstance(ast_or_code, CompiledPattern):
+            self.root_node = ast_or_code.root_node
+            self.explore_root = ast_or_code.explore_root
+            self.explore_bounds = ast_or_code.explore_bounds
+            return
         if isinstance(ast_or_code, str):
             ast_node = ast.parse(ast_or_code, filename)
         else:
@@ -62,8 +243,10 @@ class StretchyTreeMatcher:
             self.root_node = ast_node
         else:
             self.root_node = CaitNode(ast_node, _NONE_FIELD, report=self.report)
+        self.explore_root = None if self.root_node is None else _trim(self.root_node)
+        self.explore_bounds = None if self.root_node is None else _pattern_bounds(self.explore_root)
 
-    def find_matches(self, ast_or_code, filename="__main__", check_meta=True, use_previous=None):
+    def find_matches(self, ast_or_code, filename="__main__", check_meta=True, use_previous=None, limit=None):
         """
         Args:
             use_previous:
@@ -74,38 +257,73 @@ class StretchyTreeMatcher:
                 reporting.
             check_meta (bool): Determine if the nodes came from the same AST
                 field.
+            limit (int): If given, stop after finding this many matches
+                (rather than finding all of them).
         Returns:
             list[AstMap]: A list of AstMaps that are suitable matches.
         """
+        if limit is None:
+            return list(self._walk_matches(ast_or_code, filename, check_meta, use_previous))
+        with closing(self.iter_matches(ast_or_code, filename, check_meta, use_previous)) as matches:
+            return list(islice(matches, limit))
+
+    def iter_matches(self, ast_or_code, filename="__main__", check_meta=True, use_previous=None):
+        """
+        Lazily finds the same matches as :py:meth:`find_matches`, in the same
+        order. The pattern is modified while it is being matched, so the
+        iterator must be exhausted or closed once you are done with it.
+
+        Returns:
+            iterator of AstMap: The suitable matches.
+        """
+        yield from self._walk_matches(ast_or_code, filename, check_meta, use_previous, lazy=True)
+
+    def _walk_matches(self, ast_or_code, filename, check_meta, use_previous, lazy=False):
+        """
+        Walks the student's tree, producing each match in tree order. If
+        ``lazy``, each match is only found once it is asked for.
+        """
         if isinstance(ast_or_code, str):
             other_tree = CaitNode(ast.parse(ast_or_code, filename), report=self.report)
         elif isinstance(ast_or_code, CaitNode):
             other_tree = ast_or_code
         else:
             other_tree = CaitNode(ast_or_code, _NONE_FIELD, report=self.report)
-        explore_root = self.root_node
-        trim_set = ["Expr", "Module"]
+        # Roots that were trimmed down to a child lose that child's field while matching
+        explore_root = self.explore_root
         explore_root_old_field = explore_root.field
-        if self.root_node is not None:  # Trimming ins_node
-            while (len(explore_root.children) == 1 and
-                   explore_root.ast_name in trim_set):
-                explore_root.field = explore_root_old_field
-                explore_root = explore_root.children[0]
-                explore_root_old_field = explore_root.field
-                explore_root.field = _NONE_FIELD
-        other_root = other_tree
+        if explore_root is not self.root_node:
+            explore_root.field = _NONE_FIELD
+        other_root = _trim(other_tree)
         other_root_old_field = other_root.field
-        if other_root is not None:  # Trimming std_node
-            while len(other_root.children) == 1 and other_root.ast_name in trim_set:
-                other_root.field = other_root_old_field
-                other_root = other_root.children[0]
-                other_root_old_field = other_root.field
-                other_root.field = _NONE_FIELD
-        matches = self.any_node_match(explore_root, other_root,
-                                      check_meta=check_meta, use_previous=use_previous)
-        explore_root.field = explore_root_old_field
-        other_root.field = other_root_old_field
-        return matches
+        if other_root is not other_tree:
+            other_root.field = _NONE_FIELD
+        # The match table is only valid while both trees keep their current (trimmed) fields
+        self._match_table = {}
+        profile = self.profile
+        if profile is not None:
+            profile.searches += 1
+        try:
+            for candidate in self.find_candidates(explore_root, other_root):
+                started = 0 if profile is None else perf_counter()
+                if lazy:
+                    matches = self.iter_deep_find_match(explore_root, candidate, check_meta,
+                                                        use_previous=use_previous)
+                else:
+                    matches = self.deep_find_match(explore_root, candidate, check_meta,
+                                                   use_previous=use_previous)
+                for match in matches:
+                    match.match_root = match.mappings[explore_root]
+                    if profile is not None:
+                        profile.seconds += perf_counter() - started
+                    yield match
+                    started = 0 if profile is None else perf_counter()
+                if profile is not None:
+                    profile.seconds += perf_counter() - started
+        finally:
+            self._match_table = None
+            explore_root.field = explore_root_old_field
+            other_root.field = other_root_old_field
 
     def any_node_match(self, ins_node, std_node, check_meta=True, cut=False, use_previous=None):
         """
@@ -125,27 +343,40 @@ class StretchyTreeMatcher:
         """
         # @TODO: create a more public function that converts ins_node and std_node into CaitNodes
         # TODO: Create exhaustive any_node_match
-        # matching: an object representing the mapping and the symbol table
-        matching = self.deep_find_match(ins_node, std_node, check_meta, use_previous=use_previous)
-        # if a direct matching is found
-        if matching:
-            for match in matching:
+        # try to match ins_node to std_node and each of its descendants (in order), skipping any that cannot match
+        matching = []
+        for candidate in self.find_candidates(ins_node, std_node):
+            matching_c = self.deep_find_match(ins_node, candidate, check_meta, use_previous=use_previous)
+            for match in matching_c:
                 match.match_root = match.mappings[ins_node]
+            matching.extend(matching_c)
+        return matching
+
+    def find_candidates(self, ins_node, std_node):
+        """
+        Finds the nodes in the tree std_node (including std_node itself) that
+        ins_node could possibly match, using the tree's index to skip nodes of
+        the wrong type or that are too small to hold the pattern.
+
+        Args:
+            ins_node: The instructor ast that should be included in the student AST
+            std_node: The student AST to search
+
+        Returns:
+            list of CaitNode: The possible student nodes, in tree order.
+        """
+        if ins_node is self.explore_root:
+            ast_type, size, height = self.explore_bounds
         else:
-            matching = []
-        #    return matching  # return it
-        # if not matching or exhaust:  # otherwise
-        # try to matching ins_node to each child of std_node, recursively
-        for std_child in std_node.children:
-            matching_c = self.any_node_match(ins_node, std_child, check_meta=check_meta, cut=cut, use_previous=use_previous)
-            if matching_c:
-                for match in matching_c:
-                    match.match_root = match.mappings[ins_node]
-                # return matching
-                matching = matching + matching_c
-        if len(matching) > 0:
-            return matching
-        return []
+            ast_type, size, height = _pattern_bounds(ins_node)
+        index = std_node.get_tree_index()
+        start, stop = std_node.get_subtree_range()
+        if ast_type is None:
+            positions = range(start, stop)
+        else:
+            positions = index.find([ast_type], start, stop)
+        return [std_node.linear_tree[position] for position in positions
+                if index.sizes[position] >= size and index.heights[position] >= height]
 
     def deep_find_match(self, ins_node, std_node, check_meta=True,
                         use_previous=None):
@@ -161,6 +392,22 @@ class StretchyTreeMatcher:
         Returns:
             a mapping of nodes and a symbol table mapping ins_node to std_node, or [] if no mapping was found
         """
+        if self.profile is not None:
+            self.profile.deep_matches += 1
+        if self._match_table is None:
+            return self._deep_find_match(ins_node, std_node, check_meta, use_previous)
+        # The previous map is kept in the entry, so that its id cannot be reused during this call
+        key = (ins_node.tree_id, std_node.tree_id, check_meta, id(use_previous))
+        if key in self._match_table:
+            self.table_hits += 1
+            # Callers are free to modify the maps they are given, so hand out copies
+            return [mapping.copy() for mapping in self._match_table[key][0]]
+        self.table_misses += 1
+        matches = self._deep_find_match(ins_node, std_node, check_meta, use_previous)
+        self._match_table[key] = ([mapping.copy() for mapping in matches], use_previous)
+        return matches
+
+    def _deep_find_match(self, ins_node, std_node, check_meta, use_previous):
         method_name = "deep_find_match_" + type(ins_node.astNode).__name__
         target_func = getattr(self, method_name, self.deep_find_match_generic)
         return target_func(ins_node, std_node, check_meta, use_previous=use_previous)
@@ -240,6 +487,8 @@ class StretchyTreeMatcher:
             None
         """
         if case_left and case_right:
+            if self.profile is not None:
+                self.profile.merges += len(case_left) * len(case_right)
             for case_l in case_left:
                 new_map = base_mappings[0].new_merged_map(case_l).new_merged_map(use_previous)
                 for case_r in case_right:
@@ -307,15 +556,14 @@ class StretchyTreeMatcher:
         ast_type = type(value.astNode).__name__
         if ast_type == "Name":
             name_id = value.astNode.id
-            exp_match = re.compile('^__.*__$')  # /regex
-            wild_card = re.compile('^___$')  # /regex
+            match = _name_regex(name_id)
             matched = False
             meta_matched = self.metas_match(ins_node, std_node, check_meta)
-            if exp_match.match(name_id) and meta_matched:  # and meta_matched:  # if expression
+            if match[_EXP] and meta_matched:  # and meta_matched:  # if expression
                 # terminate recursion, the whole subtree should match since expression nodes match to anything
                 mapping.add_exp_to_sym_table(value, std_node)
                 matched = True
-            elif wild_card.match(name_id) and meta_matched:  # if wild card, don't care
+            elif match[_WILD] and meta_matched:  # if wild card, don't care
                 # terminate the recursion, the whole subtree should match since wild cards match to anything
                 matched = True
             if matched:
@@ -411,6 +659,9 @@ class StretchyTreeMatcher:
                         if not new_map.has_conflicts():  # if it's a valid mapping
                             new_maps.append(new_map)
                             new_sibs.append(runSib)
+        if self.profile is not None:
+            self.profile.merges += len(base_maps) * sum(len(run_map) for run_map in run_maps)
+            self.profile.peak_maps = max(self.profile.peak_maps, len(new_maps))
         if len(new_maps) == 0:
             return None
         return {
@@ -419,6 +670,91 @@ class StretchyTreeMatcher:
             'youngest_sib': youngest_sib
         }
 
+    def iter_deep_find_match(self, ins_node, std_node, check_meta=True, use_previous=None):
+        """
+        A lazy version of :py:meth:`deep_find_match`, which produces the same
+        mappings in the same order, but only does the work of finding each one
+        when it is asked for.
+
+        Returns:
+            iterator of AstMap: mappings of ins_node to std_node
+        """
+        if self.profile is not None:
+            self.profile.deep_matches += 1
+        method_name = "iter_deep_find_match_" + type(ins_node.astNode).__name__
+        target_func = getattr(self, method_name, None)
+        if target_func is not None:
+            return target_func(ins_node, std_node, check_meta, use_previous=use_previous)
+        if hasattr(self, "deep_find_match_" + type(ins_node.astNode).__name__):
+            return iter(self._deep_find_match(ins_node, std_node, check_meta, use_previous))
+        return self.iter_deep_find_match_generic(ins_node, std_node, check_meta, use_previous=use_previous)
+
+    def iter_deep_find_match_generic(self, ins_node, std_node, check_meta=True, ignores=None, use_previous=None):
+        """
+        A lazy version of :py:meth:`deep_find_match_generic`. Rather than
+        extending every base map with every match of each instructor child in
+        turn, each base map is extended depth first, one instructor child at a
+        time, so the first complete mapping is found without enumerating the
+        rest.
+
+        Args:
+            ins_node: Instructor ast to find in the student ast
+            std_node: Student AST to search for the instructor ast in
+            check_meta: flag to check whether the fields of the instructor node and the student node should match
+            ignores: List of fields to ignore in the field match
+            use_previous: a map from a previous match
+
+        Returns:
+            iterator of AstMap: mappings between the instructor and student asts
+        """
+        if ignores is None:
+            ignores = []
+        base_mappings = self.shallow_match(ins_node, std_node, check_meta)
+        if not base_mappings:
+            return
+        ins_children = [child for child in ins_node.children if child.field not in ignores]
+        # The matches of each (instructor child, student child) pair are shared by all the base maps
+        found = {}
+        for mapping in base_mappings:
+            mapping.merge_map_with(use_previous)
+            yield from self.iter_map_merge(mapping, -1, ins_children, 0, std_node, check_meta, found)
+
+    def iter_map_merge(self, base_map, base_sib, ins_children, ins_index, std_node, check_meta, found):
+        """
+        Extends base_map with each way of matching the remaining instructor
+        children (starting from ``ins_children[ins_index]``) to the children
+        of std_node after ``base_sib``, in order. Helper method to
+        iter_deep_find_match_generic, equivalent to repeated map_merges.
+
+        Args:
+            base_map: The mapping so far
+            base_sib: The student child that the previous instructor child was matched to
+            ins_children: The instructor children to match
+            ins_index: The instructor child to match next
+            std_node: The student node whose children are being matched
+            check_meta: flag to check whether the fields of the instructor node and the student node should match
+            found: The (lazily) found matches of each instructor child and student child pair
+
+        Returns:
+            iterator of AstMap: All valid extensions of base_map
+        """
+        if ins_index == len(ins_children):
+            yield base_map
+            return
+        ins_child = ins_children[ins_index]
+        std_children = std_node.children
+        for std_sib in range(base_sib + 1, len(std_children)):
+            key = (ins_index, std_sib)
+            if key not in found:
+                found[key] = _LazyMatches(self.iter_deep_find_match(ins_child, std_children[std_sib], check_meta))
+            for run_map in found[key]:
+                if self.profile is not None:
+                    self.profile.merges += 1
+                new_map = base_map.new_merged_map(run_map)
+                if not new_map.has_conflicts():  # if it's a valid mapping
+                    yield from self.iter_map_merge(new_map, std_sib, ins_children, ins_index + 1,
+                                                   std_node, check_meta, found)
+
     # noinspection PyMethodMayBeStatic,PyPep8Naming,PyUnusedLocal
     def shallow_match_Module(self, ins_node, std_node, check_meta=True):
         """
@@ -734,11 +1070,12 @@ class StretchyTreeMatcher:
         ignores.append("_id")  # special exception for symbols in lookup tables
         ins = ins_node.astNode
         std = std_node.astNode
+        # Most pairs of nodes differ in type, so check that before comparing their fields
+        if type(ins).__name__ != type(std).__name__ or not self.metas_match(ins_node, std_node, check_meta):
+            return []
         ins_field_list = list(ast.iter_fields(ins))
         std_field_list = list(ast.iter_fields(std))
-        meta_matched = self.metas_match(ins_node, std_node, check_meta)
-        is_match = len(ins_field_list) == len(std_field_list) and type(ins).__name__ == type(
-            std).__name__ and meta_matched
+        is_match = len(ins_field_list) == len(std_field_list)
         for insTup, stdTup in zip(ins_field_list, std_field_list):
             if not is_match:
                 break
@@ -810,3 +1147,4 @@ class StretchyTreeMatcher:
                 not check_meta
                 # or std_node.field == _NONE_FIELD
                 or ins_node.field == _NONE_FIELD)
+
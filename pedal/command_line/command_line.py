@@ -129,6 +129,12 @@ def build_parser(reduced_mode=False):
                         default=False, action='store_true')
     parser.add_argument('--skip_run', help="Skip automatically running student code in the environment",
                         default=False, action='store_true')
+    parser.add_argument('--skip_dedup', help="Run every ProgSnap2 event, even those that share a code state"
+                                             " and instructor control script with an earlier event.",
+                        default=False, action='store_true')
+    parser.add_argument('--profile_cait', help="Record how much work each CAIT pattern takes, and report the"
+                                               " most expensive patterns.",
+                        default=False, action='store_true')
     parser.add_argument('--progsnap_events', help="Choose what level of event"
                                                   " to capture from Progsnap event"
                                                   " logs.",
@@ -136,10 +142,18 @@ def build_parser(reduced_mode=False):
     parser.add_argument('--cache', help='Use the given directory to hold the cache.'
                                         ' You can use "./" to use the current directory.',
                         default=False)
-    # TODO: Want to allow for multiple threads too to parallel process data (faster!)
+    parser.add_argument('--cache_size', help='The most megabytes of bundle results to keep in the cache.',
+                        default=256, type=int)
     parser.add_argument('--threaded', help='Run the instructor script in a separate thread to avoid'
                                            ' timeout crashes.',
                         default=False)
+    parser.add_argument('--workers', help='Run the bundles in a pool of this many worker processes.',
+                        default=0, type=int)
+    parser.add_argument('--fork_server', help='Run each bundle in a freshly forked copy of an already'
+                                              ' warmed-up Pedal process.',
+                        default=False, action='store_true')
+    parser.add_argument('--stream', help='Load submissions lazily and report on each one as soon as it is finished.',
+                        default=False, action='store_true')
     parser.add_argument('--log_level', help="Set the logging level for Pedal.",
                         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         default="ERROR")
@@ -2,7 +2,9 @@
 Simple enumeration of the Modes available for Pedal's command line.
 """
 import json
+import multiprocessing
 import os
+import pickle
 import sys
 import traceback
 from contextlib import redirect_stdout
@@ -13,14 +15,18 @@ from unittest.mock import patch
 from pprint import pprint
 import warnings
 import argparse
-from collections import Counter
+import hashlib
+from collections import Counter, OrderedDict, deque
+from types import SimpleNamespace
 
 from pedal.command_line.report import StatReport
+from pedal.command_line.result_cache import ResultCache, make_result_key
 from pedal.command_line.verify import generate_report_out, ReportVerifier
+from pedal.core.final_feedback import FinalFeedback
 from pedal.core.report import MAIN_REPORT
 from pedal.core.submission import Submission
 from pedal.utilities.files import normalize_path, find_possible_filenames
-from pedal.utilities.progsnap import SqlProgSnap2
+from pedal.utilities.progsnap import SqlProgSnap2, ZipProgSnap2
 from pedal.utilities.text import chomp
 from pedal.resolvers.export import PedalJSONEncoder, clean_json
 
@@ -63,13 +69,15 @@ class BundleResult:
     """
     Represents the result of running an instructor control script on a submission.
     This includes not only the output and error, but also the resolution of the feedback (aka
-    the final feedback). Also includes the data that was generated during the execution.
+    the final feedback). Also includes the data that was generated during the execution,
+    and some statistics about the execution itself (e.g., how many times code was parsed).
     """
-    def __init__(self, data, output, error, resolution):
+    def __init__(self, data, output, error, resolution, statistics=None):
         self.data = data
         self.output = output
         self.error = error
         self.resolution = resolution
+        self.statistics = statistics if statistics is not None else {}
 
     def to_json(self):
         resolution = self.resolution.copy() if self.resolution else {}
@@ -82,9 +90,42 @@ class BundleResult:
         return dict(
             output=self.output,
             error=self.error,
+            statistics=self.statistics,
             **resolution
         )
 
+    def to_portable(self):
+        """
+        Reduces this result to plain, picklable data so that it can be sent
+        back from a worker process. The execution ``data`` (which holds modules,
+        sandboxes, and the live report) cannot cross a process boundary, so it
+        is dropped.
+        """
+        resolution = self.resolution
+        scored = None
+        if isinstance(resolution, FinalFeedback):
+            scored = [dict(category=feedback.category, label=feedback.label)
+                      for feedback in resolution._scores_feedback]
+            resolution = make_portable(resolution.to_json())
+        elif resolution is not None:
+            resolution = make_portable(resolution)
+        return dict(output=self.output,
+                    error=make_portable_error(self.error),
+                    resolution=resolution,
+                    scored=scored,
+                    statistics=dict(self.statistics))
+
+    @classmethod
+    def from_portable(cls, portable):
+        """ Rebuilds a :py:class:`BundleResult` from :py:meth:`to_portable` data. """
+        resolution = portable['resolution']
+        if portable['scored'] is not None:
+            scored = [SimpleNamespace(**feedback) for feedback in portable['scored']]
+            resolution = FinalFeedback(**resolution, scores_feedback=scored)
+        return cls({}, portable['output'], portable['error'], resolution,
+                   portable['statistics'])
+
+
 class Bundle:
     """
     Represents the combination of an instructor control script and a submission that it is
@@ -98,6 +139,7 @@ class Bundle:
         self.submission = submission
         self.environment = None
         self.result = None
+        self.cached = False
 
     def to_json(self):
         return dict(
@@ -129,6 +171,9 @@ class Bundle:
             MAIN_REPORT.contextualize(self.submission)
         if self.config.points:
             MAIN_REPORT.set_max_points(self.config.points)
+        if getattr(self.config, 'profile_cait', False):
+            from pedal.cait.cait_api import profile_patterns
+            profile_patterns(MAIN_REPORT)
         with redirect_stdout(captured_output):
             with patch.object(sys, 'argv', ics_args):
                 try:
@@ -148,7 +193,97 @@ class Bundle:
                 except Exception as e:
                     error = e
         actual_output = captured_output.getvalue()
-        self.result = BundleResult(global_data, actual_output, error, resolution)
+        statistics = dict(parse_count=MAIN_REPORT.parsed.parse_count,
+                          timed_out=any(map(is_timeout, MAIN_REPORT.feedback)))
+        if getattr(self.config, 'profile_cait', False):
+            profiles = MAIN_REPORT['cait']['profile'] or {}
+            statistics['cait_profile'] = {pattern: profile.to_json() for pattern, profile in profiles.items()}
+        self.result = BundleResult(global_data, actual_output, error, resolution, statistics)
+
+
+def make_portable(value):
+    """ Reduces a value (e.g., a resolution) to plain JSON-compatible data. """
+    return json.loads(PedalJSONEncoder(skipkeys=True).encode(clean_json(value)))
+
+
+def make_portable_error(error):
+    """
+    Makes sure that the given exception can be pickled; otherwise, replaces it
+    with a RuntimeError that has the same message.
+    """
+    if error is None:
+        return None
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def is_timeout(feedback):
+    """
+    Determines whether the feedback reports code that ran out of time. When the
+    threaded timeout kills the student's code, the SystemExit that it uses can
+    be caught before the TimeoutError, so those count as timeouts too.
+    """
+    if feedback.label == 'timeout_error':
+        return True
+    return isinstance(feedback.fields.get('exception'), SystemExit)
+
+
+def is_repeatable(result):
+    """
+    Determines whether running the bundle again is certain to give the same
+    result. Errors and timeouts might have been caused by the machine (e.g.,
+    by it being busy), so results with them are not worth caching.
+    """
+    return result.error is None and not result.statistics.get('timed_out', False)
+
+
+def run_bundle_in_worker(task):
+    """
+    Entry point for worker processes: runs a single bundle against a freshly
+    cleared MAIN_REPORT and sends back its portable result.
+    """
+    bundle, resolver, skip_tifa, skip_run = task
+    MAIN_REPORT.clear()
+    bundle.run_ics_bundle(resolver=resolver, skip_tifa=skip_tifa, skip_run=skip_run)
+    return bundle.result.to_portable()
+
+
+class ForkedBundle:
+    """
+    Runs a single bundle in a freshly forked copy of the current process, which
+    has already imported Pedal (and anything else the parent has loaded). The
+    child sends back its portable result through a pipe and then exits, so none
+    of its state (including its MAIN_REPORT) can leak into later bundles.
+    Mirrors the ``get`` method of :py:class:`multiprocessing.pool.AsyncResult`.
+    """
+    def __init__(self, task):
+        read_end, write_end = os.pipe()
+        self._pid = os.fork()
+        if self._pid == 0:
+            os.close(read_end)
+            try:
+                portable = run_bundle_in_worker(task)
+            except BaseException as error:
+                portable = BundleResult({}, "", error, None).to_portable()
+            with os.fdopen(write_end, 'wb') as result_pipe:
+                pickle.dump(portable, result_pipe)
+            # Skip all cleanup, which belongs to the parent
+            os._exit(0)
+        os.close(write_end)
+        self._read_end = read_end
+
+    def get(self):
+        """ Waits for the child to finish and returns its portable result. """
+        with os.fdopen(self._read_end, 'rb') as result_pipe:
+            payload = result_pipe.read()
+        _, status = os.waitpid(self._pid, 0)
+        if not payload:
+            error = RuntimeError(f"The process running this bundle exited without a result (status {status}).")
+            return BundleResult({}, "", error, None).to_portable()
+        return pickle.loads(payload)
 
 
 class AbstractPipeline:
@@ -156,8 +291,25 @@ class AbstractPipeline:
     Generic pipeline for handling all the phases of executing instructor
     control scripts on submissions, and reformating the output.
     Should be subclassed instead of used directly.
+
+    Pipelines that only need the output, error, and resolution of each bundle
+    can fan their bundles out to worker processes (see ``--workers``), fork
+    a fresh process per bundle (see ``--fork_server``), or reuse the results
+    of identical bundles from the cache (see ``--cache``); those
+    that need the full execution data (e.g., the report) set
+    ``SUPPORTS_WORKERS`` to False and always run every bundle serially.
+
+    Similarly, pipelines that can report on each bundle as soon as it is
+    finished (via :py:meth:`process_stream`) can consume a lazy stream of
+    bundles (see ``--stream``), instead of loading every submission up front.
     """
 
+    SUPPORTS_WORKERS = True
+    SUPPORTS_STREAMING = True
+    WORKER_QUEUE_DEPTH = 4
+    #: int: How many of the most recent distinct code states to share results between.
+    DUPLICATES_REMEMBERED = 1024
+
     def __init__(self, config):
         if isinstance(config, dict):
             # TODO: Include default argument automatically
@@ -165,14 +317,23 @@ class AbstractPipeline:
         self.config = config
         self.submissions = []
         self.result = None
+        self.result_cache = None
 
     def execute(self):
+        if self.SUPPORTS_STREAMING and getattr(self.config, 'stream', False):
+            bundles = map(self.setup_bundle, self.generate_bundles())
+            return self.process_stream(self.stream_control_scripts(bundles))
         self.load_submissions()
         self.setup_execution()
         self.run_control_scripts()
         return self.process_output()
 
-    def load_file_submissions(self, scripts):
+    def generate_file_submissions(self, scripts):
+        """
+        Yields a bundle for each submission file that each of the given scripts
+        should be run against. The generator's return value is the load error
+        (if any) of a single submission file.
+        """
         # Get instructor control scripts
         all_scripts = []
         for script in scripts:
@@ -192,18 +353,22 @@ class AbstractPipeline:
                     os.path.join(submission_dir, sub)
                     for sub in os.listdir(submission_dir)
                 ]
-                subs = get_python_files(submission_files)
-                for main_file, main_code in subs.items():
+                for main_file in submission_files:
+                    name, ext = os.path.splitext(main_file)
+                    if ext != ".py":
+                        continue
+                    with open(main_file, 'r') as submission_file:
+                        main_code = submission_file.read()
                     new_submission = Submission(
                         main_file=main_file, main_code=main_code,
                         instructor_file=script
                     )
-                    self.submissions.append(Bundle(self.config, scripts_contents, new_submission))
+                    yield Bundle(self.config, scripts_contents, new_submission)
         # Otherwise, if the submission is a single file:
-        # Maybe it's a Progsnap DB file?
-        elif given_submissions.endswith('.db'):
+        # Maybe it's a Progsnap DB or Zip file?
+        elif given_submissions.endswith(('.db', '.zip')):
             for script, scripts_contents in all_scripts:
-                self.load_progsnap(given_submissions, instructor_code=scripts_contents)
+                yield from self.generate_progsnap(given_submissions, instructor_code=scripts_contents)
         # Otherwise, must just be a single python file.
         else:
             main_file = given_submissions
@@ -232,9 +397,17 @@ class AbstractPipeline:
                     main_file=main_file, main_code=main_code,
                     instructor_file=script, load_error=load_error
                 )
-                self.submissions.append(Bundle(self.config, scripts_contents, new_submission))
+                yield Bundle(self.config, scripts_contents, new_submission)
             return load_error
 
+    def load_file_submissions(self, scripts):
+        bundles = self.generate_file_submissions(scripts)
+        try:
+            while True:
+                self.submissions.append(next(bundles))
+        except StopIteration as finished:
+            return finished.value
+
     progsnap_events_map = {
         'run': 'Run.Program',
         'compile': 'Compile',
@@ -242,10 +415,17 @@ class AbstractPipeline:
         'last': 'File.Edit'
     }
 
-    def load_progsnap(self, path, instructor_code=None):
+    def generate_progsnap(self, path, instructor_code=None):
+        """
+        Yields a bundle for each of the events in the given ProgSnap2 dataset
+        (either a SQLite database or a Zip of CSV files). Unless the query is
+        being cached (or only the last events are wanted), events are streamed
+        out of the dataset as the bundles are consumed.
+        """
         script_file_name, script_file_extension = os.path.splitext(path)
-        if script_file_extension in ('.db',):
-            with SqlProgSnap2(path, cache=self.config.cache) as progsnap:
+        if script_file_extension in ('.db', '.zip'):
+            progsnap_format = SqlProgSnap2 if script_file_extension == '.db' else ZipProgSnap2
+            with progsnap_format(path, cache=self.config.cache) as progsnap:
                 if self.config.progsnap_profile:
                     progsnap.set_profile(self.config.progsnap_profile)
                 link_filters = {}
@@ -261,86 +441,265 @@ class AbstractPipeline:
                     else:
                         link_filters['Assignment']['X-URL'] = include_scripts
                 event_type = self.progsnap_events_map[self.config.progsnap_events]
-                events = progsnap.get_events(event_filter={'EventType': event_type},
-                                             link_filters=link_filters, limit=self.config.limit)
-            if self.config.progsnap_events == 'last':
-                runs_by_user_assign = {}
-                for event in sorted(events, key=lambda e: e['event_id']):
-                    key = (event[progsnap.PROFILES[progsnap.profile]['link_primary']['user']], event['assignment_name'])
-                    runs_by_user_assign[key] = event
-                events = list(runs_by_user_assign.values())
-            for event in events:
-                if instructor_code is None:
-                    instructor_code_for_this_run = event['on_run']
+                if self.config.cache:
+                    events = progsnap.get_events(event_filter={'EventType': event_type},
+                                                 link_filters=link_filters, limit=self.config.limit)
                 else:
-                    instructor_code_for_this_run = instructor_code
+                    events = progsnap.iterate_events(event_filter={'EventType': event_type},
+                                                     link_filters=link_filters, limit=self.config.limit)
+                if self.config.progsnap_events == 'last':
+                    runs_by_user_assign = {}
+                    for event in sorted(events, key=lambda e: e['event_id']):
+                        key = (event[progsnap.PROFILES[progsnap.profile]['link_primary']['user']], event['assignment_name'])
+                        runs_by_user_assign[key] = event
+                    events = list(runs_by_user_assign.values())
                 link_selections = progsnap._merge('link_selections', {})
-                new_submission = Submission(
-                    main_file='answer.py',
-                    main_code=event['submission_code'] if isinstance(event['submission_code'], str) else
-                        event['submission_code'].decode('utf-8'),
-                    instructor_file='instructor.py',
-                    #files={'cisc106.py': 'from bakery import *'},
-                    execution=dict(client_timestamp=event['client_timestamp'],
-                                   event_id=event['event_id']),
-                    #user=dict(email=event['student_email'],
-                    #          first=event['student_first'],
-                    #          last=event['student_last']),
-                    user={key: event[key] for key in link_selections['Subject'].values()}
-                    if 'Subject' in link_selections else {'id': event['subject_id']},
-                    assignment=dict(name=event['assignment_name'],
-                                    url=event['assignment_url']),
-                )
-                self.submissions.append(Bundle(self.config, instructor_code_for_this_run, new_submission))
-            # raise ValueError("TODO: ProgSnap DB files not yet supported")
-            # Progsnap Zip
-        elif script_file_extension in ('.zip',):
-            raise ValueError("TODO: Zip files not yet supported")
+                for event in events:
+                    if instructor_code is None:
+                        instructor_code_for_this_run = event['on_run']
+                    else:
+                        instructor_code_for_this_run = instructor_code
+                    new_submission = Submission(
+                        main_file='answer.py',
+                        main_code=event['submission_code'] if isinstance(event['submission_code'], str) else
+                            event['submission_code'].decode('utf-8'),
+                        instructor_file='instructor.py',
+                        #files={'cisc106.py': 'from bakery import *'},
+                        execution=dict(client_timestamp=event['client_timestamp'],
+                                       event_id=event['event_id'],
+                                       code_state_id=event['code_state_id']),
+                        #user=dict(email=event['student_email'],
+                        #          first=event['student_first'],
+                        #          last=event['student_last']),
+                        user={key: event[key] for key in link_selections['Subject'].values()}
+                        if 'Subject' in link_selections else {'id': event['subject_id']},
+                        assignment=dict(name=event['assignment_name'],
+                                        url=event['assignment_url']),
+                    )
+                    yield Bundle(self.config, instructor_code_for_this_run, new_submission)
 
-    def load_file_directly(self, config):
+    def load_progsnap(self, path, instructor_code=None):
+        self.submissions.extend(self.generate_progsnap(path, instructor_code))
+
+    def generate_file_directly(self):
         new_submission = Submission(
             main_file="answer.py",
             main_code=self.config.submissions,
             instructor_file=self.config.instructor
         )
-        self.submissions.append(Bundle(self.config, self.config.instructor, new_submission))
+        yield Bundle(self.config, self.config.instructor, new_submission)
 
-    def load_submissions(self):
+    def load_file_directly(self, config):
+        self.submissions.extend(self.generate_file_directly())
+
+    def generate_bundles(self):
+        """
+        Lazily yields all of the bundles that this pipeline should run, without
+        holding onto them. Subclasses with other sources of submissions should
+        override this.
+        """
         given_script = self.config.instructor
         if self.config.instructor_direct:
             # TODO: Allow non-progsnap ics_direct
             if self.config.submission_direct:
-                self.load_file_directly(self.config)
+                yield from self.generate_file_directly()
             else:
-                self.load_progsnap(self.config.submissions, instructor_code=given_script)
+                yield from self.generate_progsnap(self.config.submissions, instructor_code=given_script)
         elif is_progsnap(given_script):
-            self.load_progsnap(given_script)
+            yield from self.generate_progsnap(given_script)
         elif os.path.isfile(given_script):
-            self.load_file_submissions([given_script])
+            yield from self.generate_file_submissions([given_script])
         elif os.path.isdir(given_script):
             python_files = os.listdir(given_script)
-            self.load_file_submissions(python_files)
+            yield from self.generate_file_submissions(python_files)
         else:
             potential_filenames = list(find_possible_filenames(given_script))
             for filename in potential_filenames:
-                load_error = self.load_file_submissions([filename])
+                load_error = yield from self.generate_file_submissions([filename])
                 if load_error is None:
                     return
             from pedal.source.feedbacks import source_file_not_found
             source_file_not_found(potential_filenames[0], False)
 
+    def load_submissions(self):
+        self.submissions.extend(self.generate_bundles())
+
+    def setup_bundle(self, bundle):
+        bundle.environment = self.config.environment
+        return bundle
+
     def setup_execution(self):
         for bundle in self.submissions:
-            bundle.environment = self.config.environment
+            self.setup_bundle(bundle)
+
+    def stream_control_scripts(self, bundles):
+        """ Lazily runs the instructor control scripts on the given bundles. """
+        return self.run_bundles(bundles, self.config.resolver)
 
     def run_control_scripts(self):
-        for bundle in self.submissions:
-            bundle.run_ics_bundle(resolver=self.config.resolver,
-                                  skip_tifa=self.config.skip_tifa,
-                                  skip_run=self.config.skip_run)
+        for bundle in self.stream_control_scripts(self.submissions):
+            pass
+
+    def get_worker_count(self):
+        """ Determines how many worker processes to use; 0 means run serially. """
+        if not self.SUPPORTS_WORKERS:
+            return 0
+        workers = int(getattr(self.config, 'workers', 0) or 0)
+        return workers if workers > 1 else 0
+
+    def uses_fork_server(self):
+        """ Whether each bundle should be run in a freshly forked process. """
+        return (self.SUPPORTS_WORKERS and hasattr(os, 'fork') and
+                bool(getattr(self.config, 'fork_server', False)))
+
+    def warm_up(self):
+        """
+        Imports everything that bundles will need, once, so that forked
+        children start with it already loaded.
+        """
+        import pedal
+        import pedal.resolvers
+        import pedal.resolvers.statistics
+        if self.config.environment:
+            __import__('pedal.environments.' + self.config.environment, fromlist=[''])
+
+    def get_result_cache(self):
+        """ Opens the cache of bundle results, if there is a cache directory to keep it in. """
+        if not self.SUPPORTS_WORKERS or not isinstance(getattr(self.config, 'cache', None), str):
+            return None
+        if self.result_cache is None:
+            max_size = int(getattr(self.config, 'cache_size', 256)) * 1024 * 1024
+            self.result_cache = ResultCache(os.path.join(self.config.cache, 'pedal_results'), max_size)
+        return self.result_cache
+
+    def get_duplicate_key(self, bundle):
+        """
+        Identifies bundles that are certain to have the same result as each
+        other: ProgSnap2 events with the same code state and instructor control
+        script. Returns None if the bundle should not be deduplicated.
+        """
+        if not self.SUPPORTS_WORKERS or getattr(self.config, 'skip_dedup', False):
+            return None
+        execution = bundle.submission.execution or {}
+        if execution.get('code_state_id') is None:
+            return None
+        content = json.dumps([execution['code_state_id'], bundle.submission.main_code, bundle.script],
+                             default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def run_bundles(self, bundles, resolver):
+        """
+        Runs each of the given bundles, yielding them back (in their original
+        order) as their results become available. Only the first of each group
+        of duplicate bundles (see :py:meth:`get_duplicate_key`) is run, and its
+        result is shared with the rest. Only the most recent
+        ``DUPLICATES_REMEMBERED`` groups are remembered, so that a long stream
+        of bundles does not fill up memory. Bundles whose results are already
+        in the result cache are not run again either.
+        """
+        cache = self.get_result_cache()
+        # Bundles come back in order, so we can plan what to do with each one
+        plan = deque()
+        # Each group's first bundle puts its result into the group's list, once it is finished
+        groups = OrderedDict()
+
+        def check_bundles(bundles):
+            for bundle in bundles:
+                duplicate_key = self.get_duplicate_key(bundle)
+                cache_key = None
+                group = groups.get(duplicate_key)
+                bundle.cached = group is not None
+                if bundle.cached:
+                    groups.move_to_end(duplicate_key)
+                elif duplicate_key is not None:
+                    group = groups[duplicate_key] = []
+                    if len(groups) > self.DUPLICATES_REMEMBERED:
+                        groups.popitem(last=False)
+                if cache is not None and not bundle.cached:
+                    cache_key = make_result_key(bundle, resolver)
+                    portable = cache.get(cache_key)
+                    if portable is not None:
+                        bundle.result = BundleResult.from_portable(portable)
+                        bundle.cached, cache_key = True, None
+                plan.append((group, cache_key))
+                yield bundle
+
+        for bundle in self.execute_bundles(check_bundles(bundles), resolver):
+            group, cache_key = plan.popleft()
+            if group:
+                bundle.result = group[0]
+            elif group is not None:
+                result = bundle.result
+                group.append(BundleResult({}, result.output, result.error,
+                                          result.resolution, result.statistics))
+            if cache_key is not None and is_repeatable(bundle.result):
+                cache.put(cache_key, bundle.result.to_portable())
+            yield bundle
+
+    def execute_bundles(self, bundles, resolver):
+        """
+        Runs each of the given bundles that does not already have a result,
+        yielding them back in their original order. If multiple workers were
+        requested, the bundles are spread across a process pool. If the fork
+        server was requested, each bundle runs in its own forked process
+        (with up to ``workers`` of them at a time).
+        """
+        workers = self.get_worker_count()
+        if self.uses_fork_server():
+            yield from self.run_forked_bundles(bundles, resolver, max(workers, 1))
+            return
+        if not workers:
+            for bundle in bundles:
+                if not bundle.cached:
+                    bundle.run_ics_bundle(resolver=resolver,
+                                          skip_tifa=self.config.skip_tifa,
+                                          skip_run=self.config.skip_run)
+                yield bundle
+            return
+        # Only keep a few bundles in flight per worker, so that a lazy stream
+        # of bundles is not pulled into memory all at once.
+        window = workers * self.WORKER_QUEUE_DEPTH
+        pending = deque()
+        with multiprocessing.Pool(workers) as pool:
+            for bundle in bundles:
+                task = (bundle, resolver, self.config.skip_tifa, self.config.skip_run)
+                pending.append((bundle, None if bundle.cached else
+                                pool.apply_async(run_bundle_in_worker, (task,))))
+                if len(pending) >= window:
+                    yield self.finish_bundle(*pending.popleft())
+            while pending:
+                yield self.finish_bundle(*pending.popleft())
+
+    def run_forked_bundles(self, bundles, resolver, workers):
+        """ Runs each bundle in a forked child, keeping ``workers`` children going. """
+        self.warm_up()
+        pending = deque()
+        for bundle in bundles:
+            task = (bundle, resolver, self.config.skip_tifa, self.config.skip_run)
+            pending.append((bundle, None if bundle.cached else ForkedBundle(task)))
+            if len(pending) >= workers:
+                yield self.finish_bundle(*pending.popleft())
+        while pending:
+            yield self.finish_bundle(*pending.popleft())
+
+    def finish_bundle(self, bundle, portable_result):
+        """
+        Attaches the result sent back by a worker to our copy of the bundle
+        (unless it was already cached, in which case there is no ``portable_result``).
+        """
+        if portable_result is not None:
+            bundle.result = BundleResult.from_portable(portable_result.get())
+        return bundle
 
     def process_output(self):
-        for bundle in self.submissions:
+        return self.process_stream(self.submissions)
+
+    def process_stream(self, bundles):
+        """
+        Reports on each bundle as soon as it is finished. The ``bundles`` might
+        be a lazy stream, so they should only be iterated over once.
+        """
+        for bundle in bundles:
             print(bundle.submission.instructor_file,
                   bundle.submission.main_file,
                   bool(bundle.result.error))
@@ -352,8 +711,8 @@ class FeedbackPipeline(AbstractPipeline):
     then printing the resolver output to the console. Often the most useful
     if you are trying to deliver the feedback without a grade.
     """
-    def process_output(self):
-        for bundle in self.submissions:
+    def process_stream(self, bundles):
+        for bundle in bundles:
             #print(bundle.submission.instructor_file,
             #      bundle.submission.main_file)
             if bundle.result.error:
@@ -374,8 +733,10 @@ class RunPipeline(AbstractPipeline):
     fields. The file is not actually dumped to the filesystem, but instead printed directly.
     So this is a good way to run students' code in a sandbox and see what comes out.
     """
-    def process_output(self):
-        for bundle in self.submissions:
+    SUPPORTS_WORKERS = False
+
+    def process_stream(self, bundles):
+        for bundle in bundles:
             #print(bundle.submission.instructor_file,
             #      bundle.submission.main_file)
             if bundle.result.error:
@@ -393,35 +754,65 @@ class StatsPipeline(AbstractPipeline):
     dumping a JSON report with all the feedback objects. This is useful for
     analyzing the feedback objects in a more programmatic way.
     """
-    def run_control_scripts(self):
-        for bundle in tqdm(self.submissions):
-            bundle.run_ics_bundle(resolver='stats_resolve', skip_tifa=self.config.skip_tifa,
-                                  skip_run=self.config.skip_run)
+    #: int: How many of the most expensive CAIT patterns to list, when profiling them.
+    PROFILED_PATTERNS = 10
 
-    def process_output(self):
+    def stream_control_scripts(self, bundles):
+        return tqdm(self.run_bundles(bundles, 'stats_resolve'))
+
+    def process_stream(self, bundles):
+        """
+        Tallies the feedback given to each bundle. When streaming, each bundle's
+        report is written to the output file (or stdout) as a line of JSON as
+        soon as it is finished, rather than being kept for the returned StatReport.
+        """
+        streaming = getattr(self.config, 'stream', False)
+        if not streaming:
+            return self.tally_bundles(bundles, [])
+        if self.config.output == 'stdout':
+            return self.tally_bundles(bundles, sys.stdout)
+        if self.config.output is not None:
+            with open(self.config.output, 'w') as output_file:
+                return self.tally_bundles(bundles, output_file)
+        return self.tally_bundles(bundles, None)
+
+    def tally_bundles(self, bundles, final):
+        """
+        Args:
+            bundles: The finished bundles to report on.
+            final (list or file or None): Where to put each bundle's report; a
+                list keeps them, a file gets them written out, and None drops them.
+        """
         total = 0
         errors = 0
-        final = []
-        for bundle in self.submissions:
+        pedal_json_encoder = PedalJSONEncoder(skipkeys=True)
+        feedback_by_label_category = Counter()
+        scored_feedback_by_label_category = Counter()
+        pattern_profiles = {}
+        for bundle in bundles:
             if bundle.result.error:
                 print(bundle.result.error)
                 errors += 1
-            else:
-                final.append(bundle.to_json())
+            elif isinstance(final, list):
+                final.append(clean_json(bundle.to_json()))
+            elif final is not None:
+                print(pedal_json_encoder.encode(clean_json(bundle.to_json())), file=final, flush=True)
             total += 1
-        final = clean_json(final)
+            resolution = bundle.result.resolution
+            if resolution is not None:
+                feedback_by_label_category[(resolution.category, resolution.label)] += 1
+                for feedback in resolution._scores_feedback:
+                    scored_feedback_by_label_category[(feedback.category, feedback.label)] += 1
+            for pattern, profile in bundle.result.statistics.get('cait_profile', {}).items():
+                total_profile = pattern_profiles.setdefault(pattern, Counter())
+                peak_maps = max(total_profile['peak_maps'], profile['peak_maps'])
+                total_profile.update(profile)
+                total_profile['peak_maps'] = peak_maps
         if self.config.output is not None:
             #print(final)
             print("Total Processed:", total)
             print("Errors:", errors)
 
-            feedback_by_label_category = Counter()
-            scored_feedback_by_label_category = Counter()
-            for bundle in self.submissions:
-                final = bundle.result.resolution
-                feedback_by_label_category[(final.category, final.label)] += 1
-                for feedback in final._scores_feedback:
-                    scored_feedback_by_label_category[(feedback.category, feedback.label)] += 1
             print("Final Feedback by label/category:")
             for (category, label), count in feedback_by_label_category.items():
                 print(f"  {category} - {label}: {count}")
@@ -430,6 +821,14 @@ class StatsPipeline(AbstractPipeline):
             for (category, label), count in scored_feedback_by_label_category.items():
                 print(f"  {category} - {label}: {count}")
 
+            if pattern_profiles:
+                print("Most expensive CAIT patterns:")
+                ranked = sorted(pattern_profiles.items(), key=lambda item: item[1]['seconds'], reverse=True)
+                for pattern, profile in ranked[:self.PROFILED_PATTERNS]:
+                    print(f"  {profile['seconds'] * 1000:.1f}ms for {profile['searches']} searches"
+                          f" ({profile['cached']} cached), {profile['deep_matches']} deep matches,"
+                          f" {profile['merges']} merges, at most {profile['peak_maps']} maps: {pattern!r}")
+
 
             # pedal_json_encoder = PedalJSONEncoder(indent=2, skipkeys=True)
             # if self.config.output == 'stdout':
@@ -437,7 +836,7 @@ class StatsPipeline(AbstractPipeline):
             # else:
             #     with open(self.config.output, 'w') as output_file:
             #         print(pedal_json_encoder.encode(final), file=output_file)
-        return StatReport(final)
+        return StatReport(final if isinstance(final, list) else [])
 
 
 
@@ -450,6 +849,9 @@ class VerifyPipeline(AbstractPipeline):
     You can also use this pipeline to generate the output files, to quickly create
     regression "tests" of your feedback scripts.
     """
+    SUPPORTS_WORKERS = False
+    SUPPORTS_STREAMING = False
+
     def process_output(self):
         for bundle in self.submissions:
             bundle.run_ics_bundle(resolver=self.config.resolver, skip_tifa=self.config.skip_tifa,
@@ -552,17 +954,19 @@ class GradePipeline(AbstractPipeline):
 
     instructor_file, student_file, student_email, assignment_name, score, correct
     """
-    def process_output(self):
+    def process_stream(self, bundles):
         if self.config.output == 'stdout':
-            self.print_bundles(sys.stdout)
+            self.print_bundles(sys.stdout, bundles)
         else:
             with open(self.config.output, 'w') as output_file:
-                self.print_bundles(output_file)
+                self.print_bundles(output_file, bundles)
 
-    def print_bundles(self, target):
+    def print_bundles(self, target, bundles=None):
         #print(len(self.submissions))
-        for bundle in self.submissions:
-            print(bundle.result.output, file=target)
+        if bundles is None:
+            bundles = self.submissions
+        for bundle in bundles:
+            print(bundle.result.output, file=target, flush=True)
             if bundle.result.error:
                 raise bundle.result.error
             # This info is not sent to the output target, just to stdout
@@ -582,12 +986,13 @@ class SandboxPipeline(AbstractPipeline):
     student's code is syntactically correct. Otherwise, the students' code is run in a Sandbox mode.
     This is useful if you just want to safely execute student code and observe their output.
     """
+    SUPPORTS_WORKERS = False
 
     ICS = """from pedal import *
 verify()
 run()"""
 
-    def load_submissions(self):
+    def generate_bundles(self):
         # Use first argument as student submissions
         given_script = self.config.instructor
         # ... either a single file
@@ -610,12 +1015,12 @@ run()"""
                     main_file="answer.py", main_code=scripts_contents,
                     instructor_file=script, load_error=load_error
                 )
-                self.submissions.append(Bundle(self.config, self.ICS, new_submission))
+                yield Bundle(self.config, self.ICS, new_submission)
 
-    def process_output(self):
+    def process_stream(self, bundles):
         # Print output
         # Print runtime exceptions, if any
-        for bundle in self.submissions:
+        for bundle in bundles:
             if bundle.result.error:
                 traceback.print_tb(bundle.result.error.__traceback__)
                 print(bundle.result.error)
@@ -634,8 +1039,10 @@ class DebugPipeline(AbstractPipeline):
     script, as it will show the full output, error, all of the feedback objects considered,
     and the final feedback.
     """
-    def process_output(self):
-        for bundle in self.submissions:
+    SUPPORTS_WORKERS = False
+
+    def process_stream(self, bundles):
+        for bundle in bundles:
             print(bundle.submission.instructor_file,
                   bundle.submission.main_file)
             print("****** Student Code:")
@@ -0,0 +1,114 @@
+"""
+An on-disk cache of bundle results, so that identical submissions (e.g., a
+student re-running the same code, or the same solution turned in by several
+students) only need to be graded once.
+
+Results are content-addressed: the key is a hash of everything that can
+change the outcome of running a bundle (the instructor control script, the
+submission's files, the environment, and the relevant configuration). Note
+that the submission's ``user``, ``assignment``, and ``execution`` metadata are
+not part of the key, so control scripts whose feedback depends on them should
+not be run with a cache.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+
+#: int: Bump this whenever the format of the cached results changes.
+CACHE_FORMAT = 2
+
+#: tuple[str]: The configuration settings that can change the result of a bundle.
+RESULT_SETTINGS = ('resolver', 'skip_tifa', 'skip_run', 'threaded', 'points', 'tool', 'profile_cait')
+
+
+def make_result_key(bundle, resolver):
+    """
+    Determines the content-addressed key for the result of running the given
+    bundle with the given resolver.
+    """
+    submission = bundle.submission
+    settings = {name: getattr(bundle.config, name, None) for name in RESULT_SETTINGS}
+    content = json.dumps([CACHE_FORMAT, bundle.script, bundle.environment, resolver,
+                          submission.instructor_file, submission.main_file,
+                          submission.main_code, submission.files, settings],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Keeps the portable results of bundles (see
+    :py:meth:`~pedal.command_line.modes.BundleResult.to_portable`) in a
+    directory, one file per result. When the directory grows beyond
+    ``max_size`` bytes, the least recently used results are evicted.
+
+    Args:
+        directory (str): Where to keep the results.
+        max_size (int): The most bytes of results to keep.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._entries = {}
+        for name in os.listdir(directory):
+            key, extension = os.path.splitext(name)
+            if extension == '.pickle':
+                status = os.stat(os.path.join(directory, name))
+                self._entries[key] = [status.st_size, status.st_mtime]
+        self.size = sum(size for size, used in self._entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get(self, key):
+        """ Loads the portable result for the given key, or None if it is not cached. """
+        if key in self._entries:
+            try:
+                with open(self._path(key), 'rb') as result_file:
+                    portable = pickle.load(result_file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                self._forget(key)
+            else:
+                self.hits += 1
+                self._entries[key][1] = time.time()
+                os.utime(self._path(key))
+                return portable
+        self.misses += 1
+        return None
+
+    def put(self, key, portable):
+        """ Stores the portable result for the given key, evicting old results if needed. """
+        path = self._path(key)
+        with open(path + '.tmp', 'wb') as result_file:
+            pickle.dump(portable, result_file)
+        os.replace(path + '.tmp', path)
+        if key in self._entries:
+            self.size -= self._entries[key][0]
+        size = os.path.getsize(path)
+        self._entries[key] = [size, time.time()]
+        self.size += size
+        self.evict()
+
+    def evict(self):
+        """ Removes the least recently used results until we fit within our ``max_size``. """
+        if self.size <= self.max_size:
+            return
+        for key in sorted(self._entries, key=lambda key: self._entries[key][1]):
+            if self.size <= self.max_size:
+                break
+            self._forget(key)
+
+    def _forget(self, key):
+        size, used = self._entries.pop(key)
+        self.size -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
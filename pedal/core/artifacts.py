@@ -0,0 +1,63 @@
+"""
+A per-submission store of parsed code, shared between the tools that need to
+analyze the students' code (Source, TIFA, and CAIT), so that the same code is
+only ever parsed once.
+"""
+
+__all__ = ['ParsedArtifacts']
+
+import ast
+
+
+class ParsedArtifacts:
+    """
+    Holds everything that has been derived from parsing code for the current
+    submission: the AST (or the SyntaxError) and the CAIT representation. Each
+    is keyed by the code itself, so substitutions and instructor-provided
+    snippets are handled the same way as the students' main file. Tools should
+    treat the results as read-only, since they are shared.
+
+    Attributes:
+        parse_count (int): How many times code has actually been parsed.
+    """
+
+    def __init__(self):
+        self.parse_count = 0
+        self.trees = {}
+        self.errors = {}
+        self.cait_nodes = {}
+
+    def clear(self):
+        """ Forgets everything that was parsed (e.g., when moving on to a new submission). """
+        self.parse_count = 0
+        self.trees.clear()
+        self.errors.clear()
+        self.cait_nodes.clear()
+
+    def parse(self, code, filename='<unknown>'):
+        """
+        Parses the given code, or reuses the result of a previous parse.
+
+        Args:
+            code (str): The Python code to parse.
+            filename (str): The filename to report in any SyntaxError.
+
+        Returns:
+            ast.Module: The parsed tree.
+
+        Raises:
+            SyntaxError: If the code could not be parsed (the same error is
+                raised again for later requests with the same filename).
+        """
+        if code in self.trees:
+            return self.trees[code]
+        if (code, filename) in self.errors:
+            raise self.errors[code, filename]
+        self.parse_count += 1
+        try:
+            tree = ast.parse(code, filename)
+        except SyntaxError as error:
+            self.errors[code, filename] = error
+            raise
+        self.trees[code] = tree
+        return tree
@@ -175,6 +175,23 @@ class JobConfig:
             action="store_true"
         )
     )
+    skip_dedup: bool = field(
+        default=False,
+        metadata=metadata(
+            help="Run every ProgSnap2 event, instead of only running each distinct pair of"
+                 " code state and instructor control script once and sharing the results.",
+            action="store_true"
+        )
+    )
+    profile_cait: bool = field(
+        default=False,
+        metadata=metadata(
+            help="Record how much work each CAIT pattern takes (see pedal.cait.profile_patterns),"
+                 " in each result's statistics. The stats mode also lists the most expensive"
+                 " patterns across all the submissions.",
+            action="store_true"
+        )
+    )
     progsnap_events: str = field(
         default="run",
         metadata=metadata(
@@ -185,10 +202,18 @@ class JobConfig:
     cache: Optional[str] = field(
         default=None,
         metadata=metadata(
-            help="Use the given directory to hold the cache."
+            help="Use the given directory to hold the cache of ProgSnap2 queries and"
+                 " bundle results (identical submissions are only graded once)."
                  " You can use './' to use the current directory.",
         )
     )
+    cache_size: int = field(
+        default=256,
+        metadata=metadata(
+            help="The most megabytes of bundle results to keep in the cache; the least"
+                 " recently used results are evicted first.",
+        )
+    )
     threaded: bool = field(
         default=False,
         metadata=metadata(
@@ -197,6 +222,34 @@ class JobConfig:
             action="store_true"
         )
     )
+    workers: int = field(
+        default=0,
+        metadata=metadata(
+            help="Run the bundles in a pool of this many worker processes, instead of"
+                 " one after another. Results are still reported in the original order."
+                 " Modes that need the full report (run, verify, sandbox, debug) always"
+                 " run serially.",
+        )
+    )
+    fork_server: bool = field(
+        default=False,
+        metadata=metadata(
+            help="Import Pedal once, and then run each bundle in its own freshly forked copy of"
+                 " that process, so that no state leaks between submissions. Combine with"
+                 " --workers to run several forked bundles at a time. Only available where"
+                 " os.fork is, and not in the run, verify, sandbox, or debug modes.",
+            action="store_true"
+        )
+    )
+    stream: bool = field(
+        default=False,
+        metadata=metadata(
+            help="Load the submissions lazily and report on each one as soon as it is"
+                 " finished, instead of loading every submission before running any of"
+                 " them. Keeps memory bounded on large datasets (not supported in verify mode).",
+            action="store_true"
+        )
+    )
     log_level: str = field(
         default="ERROR",
         metadata=metadata(
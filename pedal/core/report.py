@@ -9,6 +9,7 @@ __all__ = ['Report', 'MAIN_REPORT']
 import logging
 import random
 
+from pedal.core.artifacts import ParsedArtifacts
 from pedal.core.errors import PedalToolNotRegistered, PedalToolAlreadyRegistered
 from pedal.core.feedback_category import FeedbackCategory
 
@@ -57,6 +58,9 @@ class Report:
         result (FinalFeedback): The FinalFeedback (distinct from a Feedback) that was
             generated as a result of resolving this Report, or None if the Report is
             not yet resolved.
+        parsed (:py:class:`~pedal.core.artifacts.ParsedArtifacts`): The parsed
+            versions of the code for this submission, shared by all the tools
+            so that each piece of code is only parsed once.
     """
     #: dict[str, dict]: The
     #: tools registered for this report, available via their names.
@@ -85,6 +89,7 @@ class Report:
         self.chosen_pool = None
         self.overridden_feedbacks = set()
         self.max_points = '1'
+        self.parsed = ParsedArtifacts()
         log.debug("New Pedal Report created.")
 
     def clear(self):
@@ -108,6 +113,7 @@ class Report:
         self.result = None
         self.max_points = '1'
         self.resolves.clear()
+        self.parsed.clear()
         self.format = Formatter()
         self.clear_overridden_feedback()
 
@@ -0,0 +1,61 @@
+"""
+A cache of compiled code objects, shared by all the Sandboxes in a process.
+
+The same snippets of code are compiled over and over again: every
+``call``/``evaluate`` builds a small string of code (and ``unit_test`` builds
+many nearly identical ones), and the same instructor code is run against
+every submission. Code objects are immutable, so they can be safely reused
+for any execution of the same source.
+"""
+
+from collections import OrderedDict
+
+
+class CodeCache:
+    """
+    A least-recently-used cache mapping ``(source, filename, mode)`` to the
+    result of :py:func:`compile`.
+
+    Args:
+        maximum_size (int): How many code objects to keep.
+    """
+
+    def __init__(self, maximum_size=1024):
+        self.maximum_size = maximum_size
+        self._code = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._code)
+
+    def compile(self, source, filename, mode='exec'):
+        """
+        Compiles the given source, or reuses a previous compilation of it.
+
+        Returns:
+            tuple[code, bool]: The code object, and whether it came from the cache.
+
+        Raises:
+            SyntaxError: If the source cannot be compiled (failures are not cached).
+        """
+        key = (source, filename, mode)
+        if key in self._code:
+            self._code.move_to_end(key)
+            self.hits += 1
+            return self._code[key], True
+        compiled = compile(source, filename, mode)
+        self.misses += 1
+        self._code[key] = compiled
+        if len(self._code) > self.maximum_size:
+            self._code.popitem(last=False)
+        return compiled, False
+
+    def clear(self):
+        self._code.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+#: CodeCache: The cache shared by all the Sandboxes in this process.
+CODE_CACHE = CodeCache()
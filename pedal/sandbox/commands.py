@@ -355,6 +355,24 @@ def stop_trace(report=MAIN_REPORT):
     sandbox.clear_tracer()
 
 
+def set_isolation(isolated=True, allowed_memory=None, report=MAIN_REPORT):
+    """
+    Check each execution in a separate, resource-limited worker process before
+    running it, so that code which runs out of time (even inside of C code) or
+    memory is stopped without affecting the grading process.
+
+    Args:
+        isolated (bool): Whether to turn isolation on or off.
+        allowed_memory (int or None): How many megabytes the student code may
+            use, or None for no limit.
+        report (:py:class:`pedal.core.report.Report`): The report with the
+            sandbox instance.
+    """
+    sandbox: Sandbox = report[TOOL_NAME]['sandbox']
+    sandbox.isolated = isolated
+    sandbox.allowed_memory = allowed_memory
+
+
 def check_coverage(report=MAIN_REPORT):
     """
     Checks that all the statements in the program have been executed.
@@ -0,0 +1,331 @@
+"""
+Support for checking student code inside of separate, resource-limited worker
+processes before it is executed inside of the Sandbox.
+
+The thread-based :py:func:`pedal.sandbox.timeout.timeout` can only interrupt
+code between bytecodes, so a loop stuck inside of C code (``sum(range(10**12))``)
+cannot be stopped, the interrupted thread is leaked, and there is no cap on
+memory. A :py:class:`SandboxWorker` is a long-lived process (forked after Pedal
+has already been imported, when possible) that executes a mirrored copy of each
+execution under ``RLIMIT_CPU``/``RLIMIT_AS`` limits and a wall-clock deadline.
+If the worker runs out of time or memory, it is killed and the execution is
+reported as a :py:class:`TimeoutError` or :py:class:`MemoryError` without ever
+being run in the grading process. Otherwise, the Sandbox runs the code itself
+(still under its threaded time limit), and that run's result is the one that
+counts; how the code finished in the worker is not reported.
+
+The live Sandbox namespace (student functions, mocks, tracers) cannot cross a
+process boundary, so the worker keeps its own parallel namespace: every
+execution of a Sandbox is sent to the same worker, in order, until the
+Sandbox's data is cleared, along with any temporary arguments of a call and
+the submission's files (for ``open`` and ``import``). The Sandbox does not
+check executions that the worker cannot mirror (e.g., when the instructor has
+changed the mocks), or any executions at all when the current process is not
+allowed to start workers. Workers are recycled through the
+:py:data:`WORKER_POOL` between Sandboxes (and therefore between submissions).
+"""
+
+import atexit
+import io
+import math
+import multiprocessing
+import pickle
+import signal
+import sys
+import types
+from types import SimpleNamespace
+from unittest.mock import patch
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from pedal.sandbox import mocked
+
+#: float: Extra seconds given to a worker (beyond its allowed time) to report back.
+GRACE_PERIOD = .5
+
+
+def can_start_workers():
+    """
+    Determines whether this process is allowed to start worker processes. The
+    daemonic processes of a :py:class:`multiprocessing.pool.Pool` (e.g., the
+    ``--workers`` of the command line) cannot have children.
+    """
+    return not multiprocessing.current_process().daemon
+
+
+def _get_context():
+    """ Prefer forking, so that workers start with Pedal already imported. """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _current_address_space():
+    """ Size of this process's virtual memory in bytes, or 0 if unknown. """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _limit_memory(allowed_memory):
+    """ Cap the address space to ``allowed_memory`` megabytes beyond what we have now. """
+    if resource is None or allowed_memory is None:
+        return
+    limit = _current_address_space() + int(allowed_memory * 1024 * 1024)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    except (ValueError, OSError):
+        pass
+
+
+def _limit_cpu(allowed_time):
+    """ Allow ``allowed_time`` more seconds of CPU time, after which SIGXCPU kills us. """
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    soft = int(math.ceil(used + allowed_time))
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _fresh_namespace():
+    """ Builds a namespace with roughly the same builtins a Sandbox provides. """
+    namespace_builtins = dict(mocked._default_builtins)
+    for name in ('compile', 'eval', 'exec', 'globals', 'exit', 'quit'):
+        namespace_builtins[name] = mocked.disabled_builtin(name)
+    return {'__builtins__': namespace_builtins, '__name__': '__main__'}
+
+
+def _make_import(files, namespace_builtins):
+    """ Like the Sandbox's own import, which loads the submission's other files as modules. """
+    def _import(module_name, globals=None, locals=None, fromlist=(), level=0):
+        filename = module_name.replace(".", "/") + ".py"
+        if module_name == 'pedal' or module_name.startswith('pedal.'):
+            raise RuntimeError("You cannot import pedal!")
+        elif filename in files and module_name not in sys.modules:
+            module = types.ModuleType(module_name)
+            module.__dict__['__builtins__'] = namespace_builtins
+            exec(compile(files[filename], filename, 'exec'), module.__dict__)
+            return module
+        return mocked.ORIGINAL_BUILTINS['__import__'](module_name, globals, locals, fromlist, level)
+    return _import
+
+
+def _make_input(inputs, maximum_inputs):
+    """ Replays the queued inputs, like the Sandbox's own input tracker. """
+    inputs = list(inputs) if inputs is not None else []
+    called = [0]
+
+    def _input(prompt=""):
+        print(prompt)
+        called[0] += 1
+        if maximum_inputs is not None and maximum_inputs <= called[0]:
+            raise IOError(f"Asked for user input too many times ({called[0]} times).")
+        return inputs.pop(0) if inputs else '0'
+
+    return _input
+
+
+def _serve(connection, allowed_memory):
+    """
+    The main loop of a worker process: executes each request in a persistent
+    namespace, and reports back how it went.
+    """
+    _limit_memory(allowed_memory)
+    namespace = _fresh_namespace()
+    mocked_modules = {'pedal': None,
+                      'turtle': mocked.MockTurtle(),
+                      'matplotlib.pyplot': mocked.MockPlt(),
+                      'designer': mocked.MockDesigner(),
+                      'drafter': mocked.MockDrafter(),
+                      'microbit': mocked.MockMicrobit()}
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, OSError):
+            return
+        if request[0] == 'stop':
+            return
+        if request[0] == 'reset':
+            namespace = _fresh_namespace()
+            continue
+        _, code, filename, inputs, allowed_time, maximum_inputs, temporaries, files = request
+        namespace_builtins = namespace['__builtins__']
+        namespace_builtins['input'] = _make_input(inputs, maximum_inputs)
+        namespace_builtins['open'] = mocked.create_open_function(SimpleNamespace(
+            submission=SimpleNamespace(files=files)))
+        namespace_builtins['__import__'] = _make_import(files, namespace_builtins)
+        # Temporary arguments only last for this execution, like in the Sandbox
+        backups = {name: namespace[name] for name in temporaries if name in namespace}
+        namespace.update(temporaries)
+        output = io.StringIO()
+        _limit_cpu(allowed_time)
+        try:
+            with patch.dict('sys.modules', mocked_modules), \
+                    patch('sys.stdout', output), \
+                    patch('time.sleep', return_value=None):
+                exec(compile(code, filename, 'exec'), namespace)
+        except MemoryError:
+            # Our state is no longer trustworthy, so report and then give up
+            connection.send(('memory', None))
+            return
+        except BaseException:
+            # Only whether the code finished matters; the Sandbox finds out how
+            pass
+        connection.send(('done', None))
+        for name in temporaries:
+            namespace.pop(name, None)
+        namespace.update(backups)
+
+
+class SandboxWorker:
+    """
+    A single worker process, along with the pipe used to talk to it.
+
+    Args:
+        allowed_memory (int or None): How many megabytes the worker may use
+            beyond its starting size, or None for no limit.
+    """
+
+    def __init__(self, allowed_memory=None):
+        self.allowed_memory = allowed_memory
+        self._connection, child_connection = _get_context().Pipe()
+        self._process = _get_context().Process(target=_serve,
+                                                args=(child_connection, allowed_memory),
+                                                daemon=True)
+        self._process.start()
+        child_connection.close()
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def reset(self):
+        """ Throws away the worker's namespace, so that it can be reused. """
+        if self.is_alive():
+            self._connection.send(('reset',))
+
+    def stop(self):
+        """ Shuts down the worker, killing it if it does not stop promptly. """
+        if self.is_alive():
+            try:
+                self._connection.send(('stop',))
+            except OSError:
+                pass
+            self._process.join(GRACE_PERIOD)
+        self.kill()
+
+    def kill(self):
+        if self._process.is_alive():
+            self._process.kill()
+        self._process.join()
+        self._connection.close()
+
+    def check(self, code, filename, inputs, allowed_time, maximum_inputs=None,
+              temporaries=None, files=None):
+        """
+        Executes the code in the worker, to find out whether it finishes
+        within its limits.
+
+        Args:
+            temporaries (dict[str, Any]): Variables that only exist for this
+                execution (e.g., the long arguments of a call).
+            files (dict[str, str]): The submission's files, for ``open`` and
+                ``import``.
+
+        Returns:
+            Exception or None: A TimeoutError or MemoryError if the code
+                exceeded its limits (in which case the worker is dead), or
+                None if it finished (however it finished) or could not be
+                checked at all.
+        """
+        try:
+            self._connection.send(('execute', code, filename, inputs, allowed_time,
+                                   maximum_inputs, temporaries or {}, files or {}))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # The arguments cannot be sent, so only the Sandbox's own time limit applies
+            return None
+        except OSError:
+            status = None
+        else:
+            status = 'timeout'
+            if self._connection.poll(allowed_time + GRACE_PERIOD):
+                try:
+                    status, result = self._connection.recv()
+                except (EOFError, OSError):
+                    status = None
+                if status == 'done':
+                    return None
+        self.kill()
+        if status == 'memory':
+            return MemoryError(f"Your code used too much memory (it was given {self.allowed_memory} "
+                               f"megabytes); maybe you are making a very large list?")
+        if status == 'timeout' or self._process.exitcode == -getattr(signal, 'SIGXCPU', -1):
+            return TimeoutError('Your code took too long to run '
+                                '(it was given {} seconds); '
+                                'maybe you have an infinite loop?'.format(allowed_time))
+        return None
+
+
+class SandboxWorkerPool:
+    """
+    Keeps idle :py:class:`SandboxWorker` processes around, so that they can
+    be reused across Sandboxes instead of starting a new process each time.
+
+    Args:
+        maximum_idle (int): How many idle workers to keep per memory limit.
+    """
+
+    def __init__(self, maximum_idle=4):
+        self.maximum_idle = maximum_idle
+        self._idle = {}
+
+    def prestart(self, count, allowed_memory=None):
+        """ Starts ``count`` workers ahead of time, to take that cost up front. """
+        idle = self._idle.setdefault(allowed_memory, [])
+        while len(idle) < count:
+            idle.append(SandboxWorker(allowed_memory))
+
+    def acquire(self, allowed_memory=None):
+        """ Gets an idle worker with the given memory limit, or starts a new one. """
+        idle = self._idle.setdefault(allowed_memory, [])
+        while idle:
+            worker = idle.pop()
+            if worker.is_alive():
+                return worker
+            worker.kill()
+        return SandboxWorker(allowed_memory)
+
+    def release(self, worker):
+        """ Returns a worker to the pool, with a freshly reset namespace. """
+        if not worker.is_alive():
+            worker.kill()
+            return
+        idle = self._idle.setdefault(worker.allowed_memory, [])
+        if len(idle) >= self.maximum_idle:
+            worker.stop()
+            return
+        worker.reset()
+        idle.append(worker)
+
+    def shutdown(self):
+        """ Stops all of the idle workers. """
+        for idle in self._idle.values():
+            for worker in idle:
+                worker.stop()
+            idle.clear()
+
+
+#: SandboxWorkerPool: The pool shared by all the Sandboxes in this process.
+WORKER_POOL = SandboxWorkerPool()
+atexit.register(WORKER_POOL.shutdown)
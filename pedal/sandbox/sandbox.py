@@ -8,6 +8,7 @@ TODO: Handle sys.argv
 import sys
 import io
 import types
+import weakref
 from itertools import zip_longest
 from unittest.mock import patch
 
@@ -22,6 +23,8 @@ from pedal.sandbox.constants import TOOL_NAME
 from pedal.sandbox.feedbacks import runtime_error, EXCEPTION_FF_MAP
 from pedal.sandbox.exceptions import SandboxHasNoFunction, SandboxHasNoVariable
 from pedal.sandbox.timeout import timeout
+from pedal.sandbox.isolation import WORKER_POOL, can_start_workers
+from pedal.sandbox.code_cache import CODE_CACHE
 from pedal.sandbox.result import SandboxResult
 from pedal.sandbox.tracer import TRACER_STYLES
 
@@ -50,6 +53,14 @@ class Sandbox:
         modules.turtles: TODO
         target: TODO
         allowed_time (int): How long to allow before stopping execution.
+        isolated (bool): Whether to first check each execution in a separate,
+            resource-limited worker process (see :py:mod:`pedal.sandbox.isolation`).
+            Code that exceeds its limits there is never run in this process.
+        allowed_memory (int or None): How many megabytes an isolated execution
+            may use, or None for no limit.
+        compile_hits (int): How many times this Sandbox reused a compiled code
+            object from the shared :py:data:`~pedal.sandbox.code_cache.CODE_CACHE`.
+        compile_misses (int): How many times this Sandbox had to actually compile code.
         tracer_style (str): TODO
         _context (list[SandboxContext]): The history of executions made in
             this sandbox.
@@ -84,6 +95,9 @@ class Sandbox:
         # Modules
         self._module_overrides = {}
         self.modules = SandboxModules()
+        # Isolation
+        self._worker = None
+        self._input_tracker = None
         self.clear_mocks()
         self.clear_data()
         # Inputs
@@ -101,12 +115,30 @@ class Sandbox:
         # Use threading?
         self.threaded = False
         self.allowed_time = 3
+        # Use a resource-limited worker process?
+        self.isolated = False
+        self.allowed_memory = None
+        # Compiled code caching
+        self.compile_hits = 0
+        self.compile_misses = 0
         # Tracer Styles
         self.tracer_style = 'none'
 
     ############################################################################
     # Execution (run/call/eval)
 
+    def _compile(self, code, filename, mode='exec'):
+        """
+        Compiles the given code, reusing the code object from any previous
+        compilation of the same code (by any Sandbox in this process).
+        """
+        compiled_code, cached = CODE_CACHE.compile(code, filename, mode)
+        if cached:
+            self.compile_hits += 1
+        else:
+            self.compile_misses += 1
+        return compiled_code
+
     def _import(self, code, module_name, filename, threaded, **meta):
         """
         Import the code as a new module. Requires prior `_execute` of some
@@ -135,7 +167,7 @@ class Sandbox:
         builtins = self._module_overrides.get('__builtins__', {})
         self._mock_builtins(imported_module_data, builtins)
         # Compile and execute code
-        compiled_code = compile(code, filename, 'exec')
+        compiled_code = self._compile(code, filename)
         with self.trace.as_filename(filename, code):
             exec(compiled_code, imported_module_data)
         # Copy over data to module
@@ -156,25 +188,66 @@ class Sandbox:
             :py:class:`pedal.sandbox.sandbox.Sandbox`
         """
         try:
-            return timeout(self.allowed_time, self._execute,
-                           code, filename, kind, False, **meta)
+            return timeout(self.allowed_time, self._execute_in_process,
+                           code, filename, kind, **meta)
         except TimeoutError as timeout_exception:
             self._stop_patches()
             self._capture_exception(timeout_exception, sys.exc_info(),
                                     code, filename)
             return self
 
-    def _execute(self, code, filename, kind, threaded, **meta):
-        # Handle any threading if necessary
-        if threaded:
-            return self._execute_with_timeout(code, filename, kind, **meta)
+    def _check_isolated(self, code, filename, kind, **meta):
+        """
+        Runs the code in this Sandbox's worker process first, to make sure that
+        it finishes within the allowed time and memory. If it does not, then
+        that is reported instead of running the code here. Executions that the
+        worker cannot mirror (inputs from a function, or mocks other than the
+        defaults) are not checked, and neither is anything in a process that
+        cannot start workers; those only get the threaded time limit.
 
-        self.clear_exception()
+        Returns:
+            bool: Whether the code should now be run in this process.
+        """
+        if not can_start_workers() or callable(self.inputs) or not self._has_default_mocks():
+            return True
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = WORKER_POOL.acquire(self.allowed_memory)
+            weakref.finalize(self, WORKER_POOL.release, self._worker)
+        temporaries = {name: self.data[name] for name in self._temporary_variables}
+        files = self.report.submission.files if self.report.submission else {}
+        isolation_error = self._worker.check(code, filename, self.inputs, self.allowed_time,
+                                             self.MAXIMUM_INPUTS, temporaries, files)
+        if isolation_error is None:
+            return True
+        self._start_context(code, filename, kind, **meta)
+        try:
+            raise isolation_error
+        except (TimeoutError, MemoryError) as exceeded_limits:
+            self._capture_exception(exceeded_limits, sys.exc_info(),
+                                    code, filename)
+        self._next_context_id += 1
+        return False
 
+    def _start_context(self, code, filename, kind, **meta):
+        """ Records the start of a new execution, forgetting the last exception. """
+        self.clear_exception()
         context = SandboxContext(self._next_context_id, code, filename, kind,
                                  self.target, [], "",
                                  self.exception, self.report.submission, **meta)
         self._context.append(context)
+        return context
+
+    def _execute(self, code, filename, kind, threaded, **meta):
+        # Isolated code is run in its worker first, and only run here if it stayed within its limits there
+        if self.isolated and not self._check_isolated(code, filename, kind, **meta):
+            return self
+        # Handle any threading if necessary (isolated code is always given the time limit here too)
+        if threaded or self.isolated:
+            return self._execute_with_timeout(code, filename, kind, **meta)
+        return self._execute_in_process(code, filename, kind, **meta)
+
+    def _execute_in_process(self, code, filename, kind, **meta):
+        context = self._start_context(code, filename, kind, **meta)
 
         # Patch in dangerous built-ins
         # Override builtins and mock stuff out
@@ -182,7 +255,7 @@ class Sandbox:
         self.data['__name__'] = "__main__"
         try:
             # TODO: Support CaitNode and Ast (needs skulpt to support compile better)
-            compiled_code = compile(code, filename, 'exec')
+            compiled_code = self._compile(code, filename)
             with self.trace.as_filename(filename, code):
                 exec(compiled_code, self.data)
         except Exception as user_exception:
@@ -524,7 +597,8 @@ class Sandbox:
     def _start_mocking(self, context: SandboxContext):
         """ Mock input, output, builtins, and modules """
         # Handle input tracking
-        self.mock_function('input', self._track_inputs(context.inputs))
+        self._input_tracker = self._track_inputs(context.inputs)
+        self.mock_function('input', self._input_tracker)
         # Override builtin functions
         self._reset_builtins(self.data)
         builtins = self._module_overrides.pop('__builtins__', {})
@@ -601,6 +675,19 @@ class Sandbox:
         self.mock_module('designer', mocked.MockDesigner(), 'designer')
         self.mock_module('drafter', mocked.MockDrafter(), 'drafter')
         self.mock_module('microbit', mocked.MockMicrobit(), 'microbit')
+        self._default_overrides = self._copy_overrides()
+
+    def _copy_overrides(self):
+        overrides = dict(self._module_overrides)
+        builtins = overrides['__builtins__'] = dict(overrides.get('__builtins__', {}))
+        # Our own input tracker is left behind by each execution, and the worker has its own
+        if 'input' in builtins and builtins['input'] is self._input_tracker:
+            del builtins['input']
+        return overrides
+
+    def _has_default_mocks(self):
+        """ Whether the mocks are still exactly the ones that every Sandbox starts with. """
+        return self._copy_overrides() == self._default_overrides
 
     def mock_function(self, function_name, new_version):
         self._module_overrides['__builtins__'][function_name] = new_version
@@ -761,6 +848,8 @@ class Sandbox:
     def clear_data(self):
         # Temporary data
         self.data.clear()
+        if self._worker is not None:
+            self._worker.reset()
         self._temporary_variables.clear()
         self._backup_variables.clear()
         self._reset_builtins(self.data)
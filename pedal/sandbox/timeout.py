@@ -88,6 +88,9 @@ def timeout(duration, func, *args, **kwargs):
 
     if target_thread.is_alive():
         target_thread.terminate()
+        # Let the thread finish handling its SystemExit first, so that it
+        # does not get reported after (and instead of) the TimeoutError
+        target_thread.join(duration)
         timeout_exception = TimeoutError('Your code took too long to run '
                                          '(it was given {} seconds); '
                                          'maybe you have an infinite loop?'.format(duration))
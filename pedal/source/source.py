@@ -10,7 +10,6 @@
 
 """
 import sys
-import ast
 
 from pedal.core.feedback import CompositeFeedbackFunction
 from pedal.core.report import Report, MAIN_REPORT
@@ -134,18 +133,18 @@ def verify(code=None, filename=DEFAULT_STUDENT_FILENAME, report=MAIN_REPORT,
         blank_source(enhance=enhance, report=report, muted=muted)
         report[TOOL_NAME]['success'] = False
     try:
-        parsed = ast.parse(code, filename)
+        parsed = report.parsed.parse(code, filename)
         report[TOOL_NAME]['ast'] = parsed
     except IndentationError as e:
         indentation_error(e.lineno, e.filename, code, e.offset, e,
                           sys.exc_info(), report=report, muted=muted, enhance=enhance)
         report[TOOL_NAME]['success'] = False
-        report[TOOL_NAME]['ast'] = ast.parse("")
+        report[TOOL_NAME]['ast'] = report.parsed.parse("")
     except SyntaxError as e:
         syntax_error(e.lineno, e.filename, code, e.offset, e,
                      sys.exc_info(), report=report, muted=muted, enhance=enhance)
         report[TOOL_NAME]['success'] = False
-        report[TOOL_NAME]['ast'] = ast.parse("")
+        report[TOOL_NAME]['ast'] = report.parsed.parse("")
     else:
         report[TOOL_NAME]['success'] = True
     return report[TOOL_NAME]['success']
@@ -17,13 +17,13 @@ class Identifier:
                          scope. Used to detect the presence of certain kinds
                          of errors where the user is using a variable from
                          a different scope.
-        scoped_name (str): The fully qualified name of the variable, including
-                           its scope chain.
+        scoped_name (tuple[int, str]): The fully qualified name of the
+                           variable, as the ID of its scope and its name.
         state (State): The current state of the variable.
     """
 
     def __init__(self, exists: bool, in_scope: bool = False,
-                 scoped_name: str = "UNKNOWN", state=""):
+                 scoped_name: tuple = None, state=""):
         self.exists = exists
         self.in_scope = in_scope
         self.scoped_name = scoped_name
@@ -7,6 +7,8 @@ from pedal.types.new_types import is_subtype
 def check_trace(state):
     """
     Create a list of all the types that this given state ever took on.
+    States merged from diverging paths share their earlier history, so each
+    State in the trace is only visited once.
 
     Args:
         state (:py:class:`pedal.tifa.state.State`): The state to check the trace
@@ -16,9 +18,16 @@ def check_trace(state):
         list[:py:class:`pedal.types.new_types.Type`]: The list of all types
             that this State ever took on.
     """
-    past_types = [state.type]
-    for past_state in state.trace:
-        past_types.extend(check_trace(past_state))
+    past_types = []
+    visited = set()
+    pending = [state]
+    while pending:
+        state = pending.pop()
+        if id(state) in visited:
+            continue
+        visited.add(id(state))
+        past_types.append(state.type)
+        pending.extend(reversed(state.trace))
     return past_types
 
 
@@ -47,6 +56,8 @@ class State:
         over_position (dict): A Position indicating where the State was
                               previously set versus when it was overwritten.
     """
+    __slots__ = ('name', 'trace', 'type', 'method', 'position',
+                 'over_position', 'read', 'set', 'over')
 
     def __init__(self, name, trace, type, method, position,
                  read='maybe', set='maybe', over='maybe', over_position=None):
@@ -9,7 +9,7 @@ from pedal.core.report import MAIN_REPORT
 from pedal.core.location import Location
 from pedal.tifa.contexts import NewScope
 from pedal.types.normalize import (get_pedal_type_from_json)
-from pedal.types.builtin import (get_builtin_module)
+from pedal.types.builtin import (build_builtin_module)
 from pedal.types.new_types import (is_subtype, Type, AnyType, ImpossibleType, NoneType,
                                    ListType, TupleType, ModuleType,
                                    LiteralStr, LiteralInt, LiteralFloat, LiteralBool)
@@ -40,8 +40,8 @@ class TifaAnalysis:
 
     Attributes:
         success (bool): Whether or not the analysis was able to finish.
-        variables (dict): 2D Dictionary mapping (Scope Names x Variable Names)
-            to their calculated types. This captures ALL the variables in
+        variables (dict): 2D Dictionary mapping (Path IDs x (Scope ID,
+            Variable Name)) to their calculated types. This captures ALL the variables in
             the code (in all scopes), as opposed to just the top level
             variables.
         top_level_variables (dict): Maps variable names to their calculated
@@ -83,8 +83,10 @@ class TifaCore:
     definition_chain: list
     loop_chain: list
 
-    # dict[paths, dict[names, State]]
+    # dict[paths, dict[(scope, name), State]]
     name_map: dict
+    # dict[names, dict[scopes, paths]]
+    name_scopes: dict
     class_scopes: dict
     path_parents: dict
     loop_usages: dict
@@ -134,11 +136,10 @@ class TifaCore:
         """
         top_level_variables = self.analysis.top_level_variables
         main_path_vars = self.name_map[self.path_chain[0]]
-        for full_name in main_path_vars:
-            split_name = full_name.split("/")
-            if len(split_name) == 2 and split_name[0] == str(self.scope_chain[0]):
-                name = split_name[1]
-                top_level_variables[name] = main_path_vars[full_name]
+        module_scope = self.scope_chain[0]
+        for scope, name in main_path_vars:
+            if scope == module_scope:
+                top_level_variables[name] = main_path_vars[scope, name]
 
     def reset(self):
         """
@@ -158,6 +159,7 @@ class TifaCore:
         self.scope_chain = [self.scope_id]
         self.path_chain = [self.path_id]
         self.name_map = {self.path_id: {}}
+        self.name_scopes = {}
         self.loop_usages = {}
         self.definition_chain = []
         self.path_parents = {}
@@ -179,10 +181,15 @@ class TifaCore:
             Identifier: An Identifier for the variable, which could potentially
                         not exist.
         """
+        scopes = self.name_scopes.get(name)
+        if scopes is None:
+            return Identifier(False)
         for scope_level, scope in enumerate(self.scope_chain):
+            if scope not in scopes:
+                continue
+            full_name = (scope, name)
             for path_id in self.path_chain:
                 path = self.name_map[path_id]
-                full_name = "/".join(map(str, self.scope_chain[scope_level:])) + "/" + name
                 if full_name in path:
                     is_root_scope = (scope_level == 0)
                     return Identifier(True, is_root_scope,
@@ -201,12 +208,11 @@ class TifaCore:
             Identifier: An Identifier for the variable, which could potentially
                         not exist.
         """
-        for path in self.name_map.values():
-            for full_name in path:
-                unscoped_name = full_name.split("/")[-1]
-                if name == unscoped_name:
-                    return Identifier(True, False, unscoped_name, path[full_name])
-        return Identifier(False)
+        scopes = self.name_scopes.get(name)
+        if not scopes:
+            return Identifier(False)
+        scope, path_id = next(iter(scopes.items()))
+        return Identifier(True, False, name, self.name_map[path_id][scope, name])
 
     def find_path_parent(self, path_id, name):
         """
@@ -250,27 +256,40 @@ class TifaCore:
                 state = self.name_map[path_id][name]
                 if self._read_in_loop(path_id, name):
                     state.read = 'maybe'
-                    self._track_history(path_id, name, state.copy('looped', self.locate()))
+                    if self.TRACK_HISTORY:
+                        self._track_history(path_id, name, state.copy('looped', self.locate()))
 
     def _track_history(self, current_path, full_name, state):
+        """
+        Record a snapshot of the variable's state. Callers should only build
+        the snapshot when TRACK_HISTORY is enabled, since it is otherwise
+        thrown away.
+        """
         if self.TRACK_HISTORY:
             self.history.append((current_path, full_name, state))
 
     def _read_in_loop(self, path_id, name):
         return name in self.loop_usages.get(path_id, [])
 
-    def _scope_chain_str(self, name=None):
+    def _scoped_name(self, name):
         """
-        Convert the current scope chain to a string representation (divided 
-        by "/").
+        Qualify the name with the current scope. Every scope is entered with
+        a fresh ID, so the innermost scope is enough to identify the entire
+        scope chain.
 
         Returns:
-            str: String representation of the scope chain.
+            tuple[int, str]: The current scope's ID and the given name.
         """
-        if name:
-            return "/".join(map(str, self.scope_chain)) + "/" + name
-        else:
-            return "/".join(map(str, self.scope_chain))
+        return self.scope_chain[0], name
+
+    def _record_variable(self, path_id, full_name, state):
+        """
+        Store the state of the fully qualified variable on the given path,
+        remembering which scopes the unqualified name has been seen in.
+        """
+        self.name_map[path_id][full_name] = state
+        scope, name = full_name
+        self.name_scopes.setdefault(name, {}).setdefault(scope, path_id)
 
     def identify_caller(self, node):
         """
@@ -329,7 +348,8 @@ class TifaCore:
         """
         state = self.store_variable(name, new_type, position)
         state.read = 'yes'
-        self._track_history(self.path_chain[0], self._scope_chain_str(name), state.copy('store_read', position))
+        if self.TRACK_HISTORY:
+            self._track_history(self.path_chain[0], self._scoped_name(name), state.copy('store_read', position))
         return state
 
     def return_variable(self, return_type):
@@ -376,7 +396,7 @@ class TifaCore:
         """
         if position is None:
             position = self.locate()
-        full_name = self._scope_chain_str(name)
+        full_name = self._scoped_name(name)
         current_path = self.path_chain[0]
         variable = self.find_variable_scope(name)
         if not variable.exists or force_create:
@@ -398,12 +418,13 @@ class TifaCore:
             else:
                 new_state.set = 'yes'
                 new_state.read = 'no'
-        self.name_map[current_path][full_name] = new_state
+        self._record_variable(current_path, full_name, new_state)
         # If this is a class scope...
         current_scope = self.scope_chain[0]
         if current_scope in self.class_scopes:
             self.class_scopes[current_scope].add_attr(name, new_state.type)
-        self._track_history(current_path, full_name, new_state.perfect_copy())
+        if self.TRACK_HISTORY:
+            self._track_history(current_path, full_name, new_state.perfect_copy())
         return new_state
 
     def load_variable(self, name, position=None):
@@ -424,7 +445,7 @@ class TifaCore:
         # may subsequently need to know that this variable has been READ within the loop.
         # So the finalization can check whether a variable has been read within a loop,
         # if the regular check doesn't seem to indicate that it's been read.
-        full_name = self._scope_chain_str(name)
+        full_name = self._scoped_name(name)
         current_path = self.path_chain[0]
         variable = self.find_variable_scope(name)
         if position is None:
@@ -449,8 +470,9 @@ class TifaCore:
             self.loop_usages.setdefault(current_path, []).append(full_name)
             if not variable.in_scope:
                 full_name = variable.scoped_name
-        self.name_map[current_path][full_name] = new_state
-        self._track_history(current_path, full_name, new_state.perfect_copy())
+        self._record_variable(current_path, full_name, new_state)
+        if self.TRACK_HISTORY:
+            self._track_history(current_path, full_name, new_state.perfect_copy())
         return new_state
 
     def load_module(self, chain):
@@ -464,18 +486,23 @@ class TifaCore:
                         module type.
         """
         module_names = chain.split('.')
-        for potential_module in [self.report[TOOL_NAME]['types']['modules'].get(module_names[0]),
-                                 get_builtin_module(module_names[0])]:
+        modules = self.report[TOOL_NAME]['types']['modules']
+        potential_module = modules.get(module_names[0])
+        if potential_module is None:
+            potential_module = build_builtin_module(module_names[0])
             if potential_module is not None:
-                base_module = potential_module
-                for module in module_names[1:]:
-                    if (isinstance(base_module, ModuleType) and
-                            module in base_module.submodules):
-                        base_module = base_module.submodules[module]
-                    else:
-                        # TODO: What if the module is partially overriding a builtin?
-                        self._issue(module_not_found(self.locate(), chain, False, None, report=self.report))
-                return base_module
+                # Builtin modules are shared, so keep a copy for this report
+                modules[module_names[0]] = potential_module
+        if potential_module is not None:
+            base_module = potential_module
+            for module in module_names[1:]:
+                if (isinstance(base_module, ModuleType) and
+                        module in base_module.submodules):
+                    base_module = base_module.submodules[module]
+                else:
+                    # TODO: What if the module is partially overriding a builtin?
+                    self._issue(module_not_found(self.locate(), chain, False, None, report=self.report))
+            return base_module
 
         # Non-student file, maybe it has _tifa_definitions?
         try:
@@ -500,7 +527,7 @@ class TifaCore:
         return ModuleType(module_names[-1], {}, {})
 
     def _visit_module(self, module_name, filename, code):
-        ast_tree = ast.parse(code, filename)
+        ast_tree = self.report.parsed.parse(code, filename)
         # TODO: Properly handle submodules
         new_module = ModuleType(module_name, {}, {})
         #self.store_variable(class_name, new_class_type)
@@ -565,10 +592,11 @@ class TifaCore:
                 # right_state = self.name_map[parent_path_id].get(left_name)
             combined = self.combine_states(left_state, right_state)
             self.name_map[parent_path_id][left_name] = combined
-            self._track_history(parent_path_id, left_name,
-                {"left": left_state.perfect_copy() if left_state else None,
-                 "right": right_state.perfect_copy() if right_state else None,
-                 "out": combined.perfect_copy()})
+            if self.TRACK_HISTORY:
+                self._track_history(parent_path_id, left_name,
+                    {"left": left_state.perfect_copy() if left_state else None,
+                     "right": right_state.perfect_copy() if right_state else None,
+                     "out": combined.perfect_copy()})
         # Check for names that are on the ELSE path but not the IF path
         for right_name in self.name_map[right_path_id]:
             if right_name not in self.name_map[left_path_id]:
@@ -578,10 +606,11 @@ class TifaCore:
                 parent_state = self.search_parents(parent_path_id, right_name)
                 combined = self.combine_states(right_state, parent_state)
                 self.name_map[parent_path_id][right_name] = combined
-                self._track_history(parent_path_id, right_name,
-                                    {"left": right_state.perfect_copy() if right_state else None,
-                                     "right": parent_state.perfect_copy() if parent_state else None,
-                                     "out": combined.perfect_copy()})
+                if self.TRACK_HISTORY:
+                    self._track_history(parent_path_id, right_name,
+                                        {"left": right_state.perfect_copy() if right_state else None,
+                                         "right": parent_state.perfect_copy() if parent_state else None,
+                                         "out": combined.perfect_copy()})
 
     def search_parents(self, parent_id, seeking_name):
         possible = self.name_map[parent_id]
@@ -614,16 +643,13 @@ class TifaCore:
         chain.
 
         Args:
-            full_name (str): A fully qualified variable name
+            full_name (tuple[int, str]): A fully qualified variable name
             scope_chain (list): A representation of a scope chain.
         Returns:
             bool: Whether the variable lives in this scope
         """
-        # Get this entity's full scope chain
-        name_scopes = full_name.split("/")[:-1]
-        # against the reverse scope chain
-        checking_scopes = [str(s) for s in scope_chain]
-        return name_scopes == checking_scopes
+        # Scope IDs are unique, so only the innermost scopes need comparing
+        return full_name[0] == scope_chain[0]
 
     @staticmethod
     def match_rso(left, right):
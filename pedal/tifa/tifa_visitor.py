@@ -65,7 +65,7 @@ class Tifa(TifaCore, ast.NodeVisitor):
 
         # Attempt parsing - might fail!
         try:
-            ast_tree = ast.parse(code, filename)
+            ast_tree = self.report.parsed.parse(code, filename)
         except Exception as error:
             self.analysis.fail(error)
             system_error(TOOL_NAME, "Could not parse code: " + str(error),
@@ -6,7 +6,7 @@ from pedal.types.new_types import (make_dataclass, FunctionType, AnyType,
                                    ImpossibleType, NumType, IntType, FloatType, NoneType, BoolType,
                                    TupleType, ListType, StrType, FileType, DictType,
                                    ModuleType, SetType, LiteralInt, LiteralFloat, LiteralStr, LiteralBool,
-                                   register_builtin_module,
+                                   register_builtin_module, build_builtin_module,
                                    BUILTIN_MODULES, BUILTIN_NAMES,
                                    int_function, float_function, num_function,
                                    bool_function, void_function, TYPE_TYPE, exception_function,
@@ -235,9 +235,10 @@ BUILTIN_NAMES['__name__'] = StrType()
 
 def get_builtin_module(name):
     """
-    Given the name of the module, retrieve its TIFA representation.
+    Given the name of the module, retrieve a new copy of its TIFA
+    representation.
     """
-    return BUILTIN_MODULES.get(name)
+    return build_builtin_module(name)
 
 
 def get_builtin_name(name):
@@ -52,6 +52,21 @@ def register_builtin_module(name, module_function):
     _MODULE_LOADERS[name] = module_function
 
 
+def build_builtin_module(name):
+    """
+    Builds a new copy of the builtin module with the given name. Analyzing
+    student code can change the types reached through a module (e.g., by
+    assigning to a class's attribute or appending to a list), so each analysis
+    that imports a module gets its own copy.
+
+    Returns:
+        ModuleType: The module, or None if there is no such builtin module.
+    """
+    if name not in _MODULE_LOADERS:
+        return None
+    return _MODULE_LOADERS[name]()
+
+
 # TODO: Should tie type system into Report
 def reset_builtin_modules():
     BUILTIN_MODULES.clear()
@@ -98,6 +113,7 @@ class Type:
     # Default Universal Fields
     is_empty = False
     orderable = frozenset()
+    interned = False
 
     def __init__(self):
         self.fields = self.fields.copy()
@@ -218,6 +234,51 @@ class Type:
         return is_subtype(self, normalize.normalize_type(other).as_type())
 
 
+#: dict[tuple[type, any], InternedType]: Every instance of the interned types
+INTERNED_TYPES = {}
+#: dict[tuple[InternedType, InternedType], bool]: Remembered subtype checks
+_INTERNED_SUBTYPES = {}
+
+
+class InternedType(Type):
+    """
+    An immutable Type with no state besides its constructor's arguments, so
+    that only one instance is ever made for each set of arguments (the rest
+    are just references to it). Comparing interned types is therefore an
+    identity check, and their subtype checks can be remembered.
+
+    Subclasses with arguments should normalize them in their own `__new__`,
+    and then pass them along to this one. Interned types cannot be given
+    attributes.
+    """
+    interned = True
+
+    def __new__(cls, *arguments):
+        instance = INTERNED_TYPES.get((cls, arguments))
+        if instance is None:
+            instance = INTERNED_TYPES[cls, arguments] = super().__new__(cls)
+        return instance
+
+    def __init__(self):
+        # Only the first construction needs to set up the shared instance
+        if 'fields' not in self.__dict__:
+            super().__init__()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def add_attr(self, field: str, value):
+        """ Shared instances cannot have their fields changed. """
+
+    def is_subtype(self, other, seen, indent=0):
+        # Interned types are shared between unrelated comparisons, so they
+        # may already be in `seen`; but they cannot be recursively defined.
+        return super().is_subtype(other, set(), indent)
+
+
 class AnyType(Type):
     """
     A special type used to indicate an unknown type.
@@ -269,7 +330,7 @@ class ImpossibleType(Type):
     parents = []
 
 
-class NoneType(Type):
+class NoneType(InternedType):
     name = "NoneType"
     singular_name = "a None"
     plural_name = "None"
@@ -337,7 +398,7 @@ class FunctionType(Type):
         return FunctionType(name=self.name, definition=self.definition, returns=self.returns, the_self=the_self)
 
 
-class NumType(Type):
+class NumType(InternedType):
     name = "Num"
     singular_name = "a number"
     plural_name = "numbers"
@@ -346,7 +407,7 @@ class NumType(Type):
     parents = []
 
 
-class IntType(Type):
+class IntType(InternedType):
     name = "Integer"
     singular_name = "an integer"
     plural_name = "integers"
@@ -360,7 +421,7 @@ class IntType(Type):
         return super().is_subtype(other, seen, indent)
 
 
-class FloatType(Type):
+class FloatType(InternedType):
     name = "Float"
     singular_name = "a float"
     plural_name = "floats"
@@ -374,7 +435,7 @@ class FloatType(Type):
         return super().is_subtype(other, seen, indent)
 
 
-class BoolType(Type):
+class BoolType(InternedType):
     name = "Boolean"
     singular_name = "a boolean"
     plural_name = "booleans"
@@ -397,7 +458,7 @@ class ExceptionType(Type):
     parents = []
 
 
-class StrType(Type):
+class StrType(InternedType):
     name = "String"
     singular_name = "a string"
     plural_name = "strings"
@@ -407,9 +468,13 @@ class StrType(Type):
     fields = {}
     parents = []
 
+    def __new__(cls, is_empty=False):
+        return InternedType.__new__(cls, bool(is_empty))
+
     def __init__(self, is_empty=False):
-        super().__init__()
-        self.is_empty = is_empty
+        if 'fields' not in self.__dict__:
+            super().__init__()
+            self.is_empty = bool(is_empty)
 
     def index(self, key):
         # TODO: Support a flag for whether Numbers are allowed for Integers
@@ -1310,6 +1375,11 @@ class LiteralValue:
     """
     value: any
     parents: list
+    interned = False
+
+    def __new__(cls, *args, **kwargs):
+        # Literals each have their own value, so they are never interned
+        return object.__new__(cls)
 
     def __init__(self, value):
         self.value = value
@@ -1444,6 +1514,13 @@ def str_function(name):
 def is_subtype(left, right):
     if left is None or right is None:
         return False
+    elif left is right:
+        return True
+    elif left.interned and right.interned:
+        pair = (left, right)
+        if pair not in _INTERNED_SUBTYPES:
+            _INTERNED_SUBTYPES[pair] = left.is_subtype(right, seen=set())
+        return _INTERNED_SUBTYPES[pair]
     else:
         return left.is_subtype(right, seen=set())
 
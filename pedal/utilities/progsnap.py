@@ -1,6 +1,6 @@
 """
 Utilities for interfacing with ProgSnap2 data files, both in SQL format and
-in Zipped-CSV format.
+in Zipped-CSV format (:py:class:`SqlProgSnap2` and :py:class:`ZipProgSnap2`).
 
 Filters can be: Exact string match, regex, or function
     TODO: So far only really support exact string match
@@ -32,32 +32,34 @@ fun_student_edits = progsnap.get_events(
     }
 )
 """
+import csv
+import functools
 import hashlib
+import io
+import json
+import mmap
 import os
 import pickle
 import sqlite3
 import re
+import struct
+import tempfile
+import zipfile
 
 
-class BaseProgSnap2:
-    def __init__(self, path: str):
-        self.path = path
-
-    def get_events(self, event_filter=None, link_filters=None,
-                   link_selections=None, with_code=True):
-        raise NotImplemented("Cannot execute get_events on base ProgSnap2 Format")
-
-    def close(self):
-        pass
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+@functools.lru_cache(maxsize=256)
+def compile_like_pattern(pattern):
+    """
+    Compiles a SQL ``LIKE`` pattern (without an ``ESCAPE`` clause) into a regular
+    expression, where ``%`` matches any run of characters, ``_`` matches any one
+    character, and letters match regardless of (ASCII) case, as in SQLite.
+    """
+    parts = ['.*' if character == '%' else '.' if character == '_' else re.escape(character)
+             for character in pattern]
+    return re.compile("".join(parts), re.IGNORECASE | re.ASCII | re.DOTALL)
 
 
-class SqlProgSnap2(BaseProgSnap2):
+class BaseProgSnap2:
     PROFILES = {
         'blockpy': dict(
             link_filters={
@@ -111,9 +113,147 @@ class SqlProgSnap2(BaseProgSnap2):
             raise ValueError(f"Unknown ProgSnap Profile specified: {profile}")
         self.profile = profile
 
+    def __init__(self, path: str):
+        self.path = path
+        self.profile = None
+
+    def _merge(self, key, overrides):
+        result = {}
+        for k, v in self.PROFILES.get(self.profile, {}).get(key, {}).items():
+            result[k] = v
+        if overrides is not None:
+            for k, v in overrides.items():
+                result[k] = v
+        return result
+
+    def get_events(self, event_filter=None, link_filters=None,
+                   link_selections=None, with_code=True):
+        raise NotImplemented("Cannot execute get_events on base ProgSnap2 Format")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ColumnarEventCache:
+    """
+    An append-only, on-disk store for the results of a single query, with one
+    file per column. Each append writes a new pickled chunk to the end of every
+    column file, and the metadata file records how far each column file is
+    valid (so a crashed append is simply truncated away next time). The cache
+    also remembers the highest MainTable rowid it has seen, so only newer
+    events need to be read later.
+
+    Args:
+        directory (str): The folder to keep this query's column files in.
+        fields (list[str]): The names of the columns.
+    """
+    METADATA_FILE = "metadata.json"
+
+    def __init__(self, directory, fields):
+        self.directory = directory
+        self.fields = list(fields)
+        os.makedirs(directory, exist_ok=True)
+        metadata = self._load_metadata()
+        if metadata is None or metadata['fields'] != self.fields:
+            metadata = {'fields': self.fields, 'high_water': 0, 'count': 0,
+                        'sizes': [0] * len(self.fields)}
+        self.high_water = metadata['high_water']
+        self.count = metadata['count']
+        self.sizes = metadata['sizes']
+
+    def __len__(self):
+        return self.count
+
+    def _load_metadata(self):
+        try:
+            with open(os.path.join(self.directory, self.METADATA_FILE)) as metadata_file:
+                return json.load(metadata_file)
+        except (OSError, ValueError):
+            return None
+
+    def _save_metadata(self):
+        path = os.path.join(self.directory, self.METADATA_FILE)
+        with open(path + ".tmp", 'w') as metadata_file:
+            json.dump({'fields': self.fields, 'high_water': self.high_water,
+                       'count': self.count, 'sizes': self.sizes}, metadata_file)
+        os.replace(path + ".tmp", path)
+
+    def _column_path(self, index):
+        return os.path.join(self.directory, f"column_{index}.pickle")
+
+    def _read_column(self, index):
+        values = []
+        if not self.sizes[index]:
+            return values
+        with open(self._column_path(index), 'rb') as column_file:
+            while column_file.tell() < self.sizes[index]:
+                values.extend(pickle.load(column_file))
+        return values
+
+    def read(self):
+        """ Loads all of the cached rows, as dictionaries. """
+        columns = [self._read_column(index) for index in range(len(self.fields))]
+        return [dict(zip(self.fields, row)) for row in zip(*columns)]
+
+    def append(self, rows, batch_size=1000):
+        """
+        Adds the given rows (dictionaries that also have a ``_row`` key with
+        their MainTable rowid, in rowid order) to the end of the cache.
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self._append_batch(batch)
+                batch = []
+        if batch:
+            self._append_batch(batch)
+
+    def _append_batch(self, batch):
+        for index, field in enumerate(self.fields):
+            with open(self._column_path(index), 'ab') as column_file:
+                column_file.truncate(self.sizes[index])
+                pickle.dump([row[field] for row in batch], column_file)
+                self.sizes[index] = column_file.tell()
+        self.count += len(batch)
+        self.high_water = max(self.high_water, batch[-1]['_row'])
+        self._save_metadata()
+
+
+class SqlProgSnap2(BaseProgSnap2):
+    """
+    A ProgSnap2 dataset stored in a SQLite database.
+
+    If a ``cache`` directory is given, the database is first ingested into a
+    local copy inside of that directory (only new rows are copied on later
+    runs), which is indexed on the columns that queries filter and join on.
+    Query results are then kept in a :py:class:`ColumnarEventCache`, so that
+    re-running a query only reads the events that arrived since last time.
+    """
+    #: int: How many rows to fetch from the database at a time when streaming events.
+    BATCH_SIZE = 1000
+    #: tuple[str]: Tables that only ever have rows added to them, so they can be copied incrementally.
+    APPEND_ONLY_TABLES = ('MainTable', 'CodeState')
+    #: dict[str, list[str]]: The columns to index in the local copy, by table.
+    INDEXES = {
+        'MainTable': ['EventType', 'CodeStateID', 'SubjectID', 'AssignmentID'],
+        'CodeState': ['ID'],
+        'LinkSubject': ['SubjectID'],
+        'LinkAssignment': ['AssignmentID'],
+    }
+
     def __init__(self, path: str, cache=False, status_update=None):
         super().__init__(path)
-        self._connection = sqlite3.connect(self.path)
+        if isinstance(cache, str):
+            self._connection = sqlite3.connect(self.ingest(cache))
+        else:
+            self._connection = sqlite3.connect(self.path)
         self._cursor = self._connection.cursor()
         self.profile = None
         self.cache = cache
@@ -125,26 +265,71 @@ class SqlProgSnap2(BaseProgSnap2):
     def close(self):
         self._connection.close()
 
-    def _merge(self, key, overrides):
-        result = {}
-        for k, v in self.PROFILES.get(self.profile, {}).get(key, {}).items():
-            result[k] = v
-        if overrides is not None:
-            for k, v in overrides.items():
-                result[k] = v
-        return result
+    def ingest(self, cache):
+        """
+        Copies any new rows from the original database into an indexed local
+        copy within the ``cache`` directory.
+
+        Returns:
+            str: The path to the local copy.
+        """
+        os.makedirs(cache, exist_ok=True)
+        name = hashlib.md5(os.path.abspath(self.path).encode('utf-8')).hexdigest()
+        local_path = os.path.join(cache, f"pedal_progsnap_{name}.db")
+        local = sqlite3.connect(local_path)
+        try:
+            local.execute("ATTACH DATABASE ? AS source", (self.path,))
+            tables = local.execute("SELECT name, sql FROM source.sqlite_master "
+                                   "WHERE type='table'").fetchall()
+            for table, create in tables:
+                exists = local.execute("SELECT 1 FROM main.sqlite_master WHERE type='table' AND name=?",
+                                       (table,)).fetchone()
+                if not exists:
+                    local.execute(create)
+                columns = ", ".join(f'"{column[1]}"' for column in
+                                    local.execute(f'PRAGMA source.table_info("{table}")'))
+                if table in self.APPEND_ONLY_TABLES:
+                    last_row, = local.execute(f'SELECT IFNULL(MAX(rowid), 0) FROM main."{table}"').fetchone()
+                    local.execute(f'INSERT INTO main."{table}" (rowid, {columns}) '
+                                  f'SELECT rowid, {columns} FROM source."{table}" WHERE rowid > ?',
+                                  (last_row,))
+                else:
+                    local.execute(f'DELETE FROM main."{table}"')
+                    local.execute(f'INSERT INTO main."{table}" ({columns}) SELECT {columns} FROM source."{table}"')
+            local.commit()
+            local.execute("DETACH DATABASE source")
+            self._create_indexes(local)
+        finally:
+            local.close()
+        return local_path
+
+    def _create_indexes(self, connection):
+        for table, columns in self.INDEXES.items():
+            existing = {column[1].lower() for column in connection.execute(f'PRAGMA table_info("{table}")')}
+            for column in columns:
+                if column.lower() in existing:
+                    connection.execute(f'CREATE INDEX IF NOT EXISTS "pedal_{table}_{column}" '
+                                       f'ON "{table}" ("{column}")')
+        connection.commit()
 
-    def get_code(self, query):
-        #flat_filters = {k + k2: v
-        #                for k, vs in link_filters.items()
-        #                for k2, v in vs
-        #                }
-        #codes = tuple(sorted(event_filter.items() | flat_filters))
-        encoded = "pedal_cache_"+hashlib.md5(query.encode('utf-8')).hexdigest()+".pickle"
+    def get_code(self, query, data=()):
+        """ Names the cache for the given query, including the values bound to its parameters. """
+        key = query + json.dumps(list(data), default=str)
+        encoded = "pedal_cache_"+hashlib.md5(key.encode('utf-8')).hexdigest()
         return encoded
 
-    def get_events(self, event_filter=None, link_filters=None,
-                   link_selections=None, with_code=True, limit=None):
+    def build_query(self, event_filter=None, link_filters=None,
+                    link_selections=None, with_code=True, limit=None,
+                    after_row=None):
+        """
+        Builds up the SQL query for the given filters and selections. If
+        ``after_row`` is given, then only events after that MainTable rowid are
+        selected (in rowid order), and each will also have a ``_row`` field.
+
+        Returns:
+            tuple[str, list, list[str]]: The query, its parameters, and the names
+                of the fields that each resulting row will have.
+        """
         # Load in profile defaults
         link_selections = self._merge('link_selections', link_selections)
         link_filters = self._merge('link_filters', link_filters)
@@ -157,6 +342,12 @@ class SqlProgSnap2(BaseProgSnap2):
             selections.append('MainTable.SubjectID')
             fields.append('subject_id')
         data = []
+        # Only get events newer than the given row
+        if after_row is not None:
+            selections.append('MainTable.rowid')
+            fields.append('_row')
+            filters.append("MainTable.rowid > ?")
+            data.append(after_row)
         # Add in event filters
         for column, value_filter in event_filter.items():
             if isinstance(value_filter, str):
@@ -168,6 +359,8 @@ class SqlProgSnap2(BaseProgSnap2):
             filters.append(f"MainTable.CodeStateID=CodeState.ID")
             selections.append("CodeState.Contents as submission_code")
             fields.append("submission_code")
+            selections.append("MainTable.CodeStateID")
+            fields.append("code_state_id")
         # Add in all needed link tables
         for table in (link_filters.keys() | link_selections.keys()):
             if table:
@@ -206,31 +399,285 @@ class SqlProgSnap2(BaseProgSnap2):
         query_limit = ""
         if limit:
             query_limit = f"LIMIT {limit}"
-        # And execute
+        if after_row is not None:
+            query_limit = "ORDER BY MainTable.rowid " + query_limit
         query = f"""
             SELECT {', '.join(selections)}
             FROM {', '.join(tables)}
             {filters}
             {query_limit}
         """
+        return query, data, fields
+
+    def iterate_events(self, event_filter=None, link_filters=None,
+                       link_selections=None, with_code=True, limit=None,
+                       batch_size=BATCH_SIZE, after_row=None):
+        """
+        Lazily yields the events matching the given filters (see
+        :py:meth:`get_events`), paging through the results ``batch_size`` rows
+        at a time instead of loading them all into memory. Does not use the cache.
+        """
+        query, data, fields = self.build_query(event_filter, link_filters,
+                                               link_selections, with_code, limit,
+                                               after_row)
+        # Use a dedicated cursor, so that other queries can run in the meantime
+        cursor = self._connection.cursor()
+        try:
+            cursor.execute(query, data)
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    yield dict(zip(fields, row))
+                rows = cursor.fetchmany(batch_size)
+        finally:
+            cursor.close()
+
+    def get_events(self, event_filter=None, link_filters=None,
+                   link_selections=None, with_code=True, limit=None):
         # Is it is in our cache?
         if isinstance(self.cache, str):
-            key = self.get_code(query)
-            cache_path = os.path.join(self.cache, key)
-            if os.path.exists(cache_path):
-                with open(cache_path, 'rb') as cache_file:
-                    return pickle.load(cache_file)
-        result = self._cursor.execute(query, data)
-        result = [dict(zip(fields, row)) for row in result.fetchall()]
-        # Store it in our cache for the future
-        if isinstance(self.cache, str):
-            key = self.get_code(query)
-            cache_path = os.path.join(self.cache, key)
-            with open(cache_path, 'wb') as cache_file:
-                pickle.dump(result, cache_file)
-        # Process result
-        return result
+            return self.get_cached_events(event_filter, link_filters,
+                                          link_selections, with_code, limit)
+        return list(self.iterate_events(event_filter, link_filters,
+                                        link_selections, with_code, limit))
+
+    def get_cached_events(self, event_filter=None, link_filters=None,
+                          link_selections=None, with_code=True, limit=None):
+        """
+        Retrieves the events (see :py:meth:`get_events`) through this query's
+        :py:class:`ColumnarEventCache`, first reading in any events that arrived
+        since the cache was last updated.
+        """
+        query, data, fields = self.build_query(event_filter, link_filters,
+                                               link_selections, with_code, limit)
+        store = ColumnarEventCache(os.path.join(self.cache, self.get_code(query, data)), fields)
+        remaining = int(limit) - len(store) if limit else None
+        if remaining is None or remaining > 0:
+            store.append(self.iterate_events(event_filter, link_filters,
+                                             link_selections, with_code, remaining,
+                                             after_row=store.high_water))
+        return store.read()
 
 
 class ZipProgSnap2(BaseProgSnap2):
-    pass
+    """
+    A ProgSnap2 dataset stored as CSV files inside of a Zip archive, read
+    without extracting it. ``MainTable.csv`` is streamed row by row, the
+    (small) link tables are loaded into memory, and code states are only
+    read when an event needs them.
+
+    Code states can either be a ``CodeStates/<CodeStateID>/<filename>``
+    folder of files (one event is produced for each file, as with the SQL
+    format's ``CodeState`` table), or a single ``CodeStates/CodeStates.csv``
+    with ``CodeStateID`` and ``Code`` columns. In the latter case, the file
+    is scanned once to find where each code state starts; stored (uncompressed)
+    files are then memory-mapped, and compressed ones are decompressed into a
+    temporary file during that scan (which is memory-mapped instead).
+
+    Supports the same filters as :py:meth:`SqlProgSnap2.get_events`, except
+    the generic (raw SQL) link filters.
+    """
+    #: struct.Struct: The layout of a Zip file's local header (before the filename and extra fields).
+    LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+    def __init__(self, path: str, cache=False, status_update=None):
+        super().__init__(path)
+        self.cache = cache
+        self._zip = zipfile.ZipFile(path)
+        names = self._zip.namelist()
+        main_table = min((name for name in names if os.path.basename(name) == 'MainTable.csv'),
+                         key=len, default=None)
+        if main_table is None:
+            raise ValueError(f"No MainTable.csv found in ProgSnap2 archive: {path}")
+        self._root = main_table[:-len('MainTable.csv')]
+        self._names = set(names)
+        self._code_state_files = None
+        self._code_state_offsets = None
+        self._code_state_map = None
+        self._code_state_buffer = None
+        self._link_tables = {}
+
+    def close(self):
+        if self._code_state_map is not None:
+            self._code_state_map.close()
+        if self._code_state_buffer is not None:
+            self._code_state_buffer.close()
+        self._zip.close()
+
+    def _open_csv(self, name):
+        return csv.DictReader(io.TextIOWrapper(self._zip.open(self._root + name),
+                                               encoding='utf-8', newline=''))
+
+    def _find_column(self, columns, name):
+        """ Finds the given column, ignoring case (as SQLite does). """
+        for column in columns:
+            if column.lower() == name.lower():
+                return column
+        raise ValueError(f"Unknown ProgSnap2 column: {name}")
+
+    def _load_link_table(self, table):
+        """ Loads a link table, grouping its rows by their ID. """
+        if table not in self._link_tables:
+            for candidate in (f"LinkTables/{table}.csv", f"LinkTables/Link{table}.csv",
+                              f"Link{table}.csv"):
+                if self._root + candidate in self._names:
+                    break
+            else:
+                raise ValueError(f"Unknown ProgSnap2 link table: {table}")
+            reader = self._open_csv(candidate)
+            key = self._find_column(reader.fieldnames, table + 'Id')
+            rows = {}
+            for row in reader:
+                rows.setdefault(row[key], []).append(row)
+            self._link_tables[table] = rows
+        return self._link_tables[table]
+
+    def _index_code_state_files(self):
+        """ Maps each code state ID to its files, for the folder layout. """
+        prefix = self._root + "CodeStates/"
+        self._code_state_files = {}
+        for name in sorted(self._names):
+            if name.startswith(prefix) and not name.endswith('/'):
+                parts = name[len(prefix):].split('/', 1)
+                if len(parts) == 2:
+                    self._code_state_files.setdefault(parts[0], []).append(name)
+
+    def _index_code_state_table(self, name):
+        """
+        Scans ``CodeStates.csv`` once, remembering where each row starts. A
+        compressed file is also decompressed into a temporary file as it is
+        scanned, since seeking backwards in it would decompress it all again.
+        """
+        position = 0
+        offsets = {}
+        info = self._zip.getinfo(name)
+        if info.compress_type != zipfile.ZIP_STORED:
+            self._code_state_buffer = tempfile.TemporaryFile()
+
+        def lines(stream):
+            nonlocal position
+            for line in stream:
+                position += len(line)
+                if self._code_state_buffer is not None:
+                    self._code_state_buffer.write(line)
+                yield line.decode('utf-8')
+
+        with self._zip.open(name) as stream:
+            reader = csv.reader(lines(stream))
+            header = next(reader)
+            id_column = header.index(self._find_column(header, 'CodeStateID'))
+            while True:
+                start = position
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    break
+                offsets[row[id_column]] = start
+        self._code_state_offsets = offsets
+        self._code_state_header = header
+        if self._code_state_buffer is None:
+            with open(self.path, 'rb') as archive:
+                self._code_state_map = mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ)
+            header_fields = self.LOCAL_HEADER.unpack_from(self._code_state_map, info.header_offset)
+            self._code_state_start = (info.header_offset + self.LOCAL_HEADER.size +
+                                      header_fields[-2] + header_fields[-1])
+        else:
+            self._code_state_buffer.flush()
+            self._code_state_map = mmap.mmap(self._code_state_buffer.fileno(), 0, access=mmap.ACCESS_READ)
+            self._code_state_start = 0
+        self._code_state_end = self._code_state_start + info.file_size
+
+    def _mapped_lines(self, start):
+        """ Yields lines out of the memory-mapped code states, without copying the rest. """
+        while start < self._code_state_end:
+            end = self._code_state_map.find(b"\n", start, self._code_state_end) + 1 or self._code_state_end
+            yield self._code_state_map[start:end]
+            start = end
+
+    def _read_code_state_row(self, offset):
+        lines = self._mapped_lines(self._code_state_start + offset)
+        row = next(csv.reader(line.decode('utf-8') for line in lines))
+        return dict(zip(self._code_state_header, row))
+
+    def get_code_states(self, code_state_id):
+        """
+        Reads the code for the given code state.
+
+        Returns:
+            list[str]: The contents of each file in the code state (empty if
+                the code state is unknown).
+        """
+        if self._code_state_files is None and self._code_state_offsets is None:
+            table = self._root + "CodeStates/CodeStates.csv"
+            if table in self._names:
+                self._index_code_state_table(table)
+            else:
+                self._index_code_state_files()
+        if self._code_state_offsets is not None:
+            if code_state_id not in self._code_state_offsets:
+                return []
+            row = self._read_code_state_row(self._code_state_offsets[code_state_id])
+            return [row[self._find_column(self._code_state_header, 'Code')]]
+        return [self._zip.read(name).decode('utf-8')
+                for name in self._code_state_files.get(code_state_id, [])]
+
+    def _matches(self, value, value_filter):
+        if "%" in value_filter:
+            return value is not None and compile_like_pattern(value_filter).fullmatch(value) is not None
+        return value == value_filter
+
+    def iterate_events(self, event_filter=None, link_filters=None,
+                       link_selections=None, with_code=True, limit=None):
+        """
+        Lazily yields the events matching the given filters (see
+        :py:meth:`SqlProgSnap2.get_events`), streaming them out of the archive.
+        """
+        link_selections = self._merge('link_selections', link_selections)
+        link_filters = self._merge('link_filters', link_filters)
+        if '' in link_filters:
+            raise ValueError("Generic link filters are only supported for SQL ProgSnap2 datasets.")
+        tables = [table for table in (link_filters.keys() | link_selections.keys()) if table]
+        links = {table: self._load_link_table(table) for table in tables}
+        limit = int(limit) if limit else None
+        reader = self._open_csv("MainTable.csv")
+        columns = {name: self._find_column(reader.fieldnames, name)
+                   for name in ['EventID', 'ClientTimestamp', 'SubjectID', 'CodeStateID']}
+        for table in tables:
+            columns[table + 'ID'] = self._find_column(reader.fieldnames, table + 'ID')
+        event_filter = {self._find_column(reader.fieldnames, column): value_filter
+                        for column, value_filter in (event_filter or {}).items()
+                        if isinstance(value_filter, str)}
+        count = 0
+        for event in reader:
+            if any(event[column] != value_filter for column, value_filter in event_filter.items()):
+                continue
+            base = {'event_id': event[columns['EventID']],
+                    'client_timestamp': event[columns['ClientTimestamp']]}
+            if 'Subject' not in link_selections:
+                base['subject_id'] = event[columns['SubjectID']]
+            rows = [base]
+            if with_code:
+                code_state_id = event[columns['CodeStateID']]
+                rows = [dict(base, submission_code=code, code_state_id=code_state_id)
+                        for code in self.get_code_states(code_state_id)]
+            # Join against each link table
+            for table in tables:
+                table_filters = {column: value_filter
+                                 for column, value_filter in link_filters.get(table, {}).items()
+                                 if isinstance(value_filter, str)}
+                matches = [link for link in links[table].get(event[columns[table + 'ID']], [])
+                           if all(self._matches(link.get(column), value_filter)
+                                  for column, value_filter in table_filters.items())]
+                rows = [dict(row, **{alias: link.get(column)
+                                     for column, alias in link_selections.get(table, {}).items()})
+                        for row in rows for link in matches]
+            for row in rows:
+                yield row
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+
+    def get_events(self, event_filter=None, link_filters=None,
+                   link_selections=None, with_code=True, limit=None):
+        return list(self.iterate_events(event_filter, link_filters,
+                                        link_selections, with_code, limit))
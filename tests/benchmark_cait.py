@@ -0,0 +1,109 @@
+"""
+A rough benchmark of CAIT's stretchy tree matching, searching for a handful of
+typical instructor patterns in a large submission, and of wrapping large
+submissions in CaitNodes.
+
+    python tests/benchmark_cait.py [repetitions]
+"""
+import ast
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pedal.cait.cait_node import CaitNode
+from pedal.cait.stretchy_tree_matching import StretchyTreeMatcher, compile_pattern
+from pedal.cait.cait_api import find_matches
+from pedal.cait.match_cache import MATCH_CACHE
+from pedal.core.commands import contextualize_report
+from pedal.core.report import MAIN_REPORT
+
+STUDENT_CODE = "\n".join(f"""
+def f{index}(xs):
+    total = 0
+    for x in xs:
+        if x > {index}:
+            total = total + x * 2
+        else:
+            total = total + 1
+    return total
+""" for index in range(35))
+
+PATTERNS = [
+    "for ___ in ___:\n    ___",
+    "_sum_ = 0\nfor _item_ in ___:\n    _sum_ = _sum_ + _item_",
+    "__expr__ + __other__",
+    "___ = ___ + ___",
+    "def ___(___):\n    ___\n    return ___",
+]
+
+
+def benchmark(repetitions=5):
+    std = CaitNode(ast.parse(STUDENT_CODE), report=MAIN_REPORT)
+    for pattern in PATTERNS:
+        hits, misses, matches = 0, 0, 0
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            matcher = StretchyTreeMatcher(compile_pattern(pattern), report=MAIN_REPORT)
+            matches = len(matcher.find_matches(std))
+            hits, misses = hits + matcher.table_hits, misses + matcher.table_misses
+        duration = (time.perf_counter() - start) / repetitions
+        print(f"{duration * 1000:8.2f}ms  {matches:5} matches  {hits:6} hits  {misses:6} misses  {pattern!r}")
+
+
+def benchmark_first(repetitions=5):
+    std = CaitNode(ast.parse(STUDENT_CODE), report=MAIN_REPORT)
+    for pattern in PATTERNS:
+        durations = []
+        for limit in (None, 1):
+            start = time.perf_counter()
+            for _ in range(repetitions):
+                StretchyTreeMatcher(compile_pattern(pattern), report=MAIN_REPORT).find_matches(std, limit=limit)
+            durations.append((time.perf_counter() - start) / repetitions)
+        print(f"{durations[0] * 1000:8.2f}ms  all  {durations[1] * 1000:8.2f}ms  first  {pattern!r}")
+
+
+def benchmark_cache(repetitions=5):
+    durations = []
+    for maximum_size in (0, MATCH_CACHE.maximum_size):
+        MATCH_CACHE.maximum_size = maximum_size
+        MATCH_CACHE.clear()
+        start = time.perf_counter()
+        for index in range(repetitions):
+            # Each "submission" only differs by its trailing whitespace
+            contextualize_report(STUDENT_CODE + "\n" * index)
+            for pattern in PATTERNS:
+                find_matches(pattern)
+        durations.append((time.perf_counter() - start) / repetitions)
+    print(f"{durations[0] * 1000:8.2f}ms  uncached  {durations[1] * 1000:8.2f}ms  cached  "
+          f"({MATCH_CACHE.hits} hits)")
+
+
+def benchmark_construction(repetitions=5, copies=10):
+    code = STUDENT_CODE * copies
+    trees = [ast.parse(code) for _ in range(repetitions)]
+    start = time.perf_counter()
+    for tree in trees:
+        CaitNode(tree, report=MAIN_REPORT).body
+    lazy = (time.perf_counter() - start) / repetitions
+    trees = [ast.parse(code) for _ in range(repetitions)]
+    start = time.perf_counter()
+    for tree in trees:
+        CaitNode(tree, report=MAIN_REPORT).linear_tree
+    eager = (time.perf_counter() - start) / repetitions
+    tree = ast.parse(code)
+    tracemalloc.start()
+    nodes = len(CaitNode(tree, report=MAIN_REPORT).linear_tree)
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{lazy * 1000:8.2f}ms  top level only  {eager * 1000:8.2f}ms  whole tree  "
+          f"{memory / 1024:8.0f}KiB  for {nodes} nodes ({code.count(chr(10))} lines)")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+    benchmark_first(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+    benchmark_cache(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+    benchmark_construction(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
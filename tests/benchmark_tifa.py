@@ -0,0 +1,72 @@
+"""
+A rough benchmark of TIFA's type and flow analysis on large submissions, with
+many functions, branches, and variables in nested scopes.
+
+    python tests/benchmark_tifa.py [repetitions]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pedal.core.report import MAIN_REPORT
+from pedal.tifa.tifa_visitor import Tifa
+
+STUDENT_CODE = "\n".join(f"""
+limit{index} = {index}
+def f{index}(xs, scale):
+    total = 0
+    count = 0
+    for x in xs:
+        if x > limit{index}:
+            total = total + x * scale
+            count = count + 1
+        elif x < 0:
+            total = total - x
+        else:
+            total = total + 1
+    def helper(value):
+        return value + count
+    if count:
+        return helper(total) / count
+    return 0.0
+result{index} = f{index}([1, 2, 3], limit{index})
+print(result{index})
+""" for index in range(40))
+
+BRANCHY_CODE = "\n".join(["values = [1, 2, 3]"] + [f"v{index} = 0" for index in range(10)] + [
+    f"if len(values) > {step}:\n" + "\n".join(f"    v{index} = v{index} + {step}" for index in range(10))
+    for step in range(25)] + [f"print(v{index})" for index in range(10)])
+
+
+def benchmark(repetitions=5, sizes=(1, 5, 10)):
+    for copies in sizes:
+        code = STUDENT_CODE * copies
+        variables = 0
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            MAIN_REPORT.clear()
+            analysis = Tifa(MAIN_REPORT).process_code(code)
+            variables = sum(len(path) for path in analysis.variables.values())
+        duration = (time.perf_counter() - start) / repetitions
+        lines = code.count("\n")
+        print(f"{duration * 1000:8.2f}ms  {lines:6} lines  {variables:6} variables")
+
+
+def benchmark_branches(repetitions=5):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        MAIN_REPORT.clear()
+        analysis = Tifa(MAIN_REPORT).process_code(BRANCHY_CODE)
+    analyzed = (time.perf_counter() - start) / repetitions
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        analysis.top_level_variables['v0'].was_type(str)
+    traced = (time.perf_counter() - start) / repetitions
+    print(f"{analyzed * 1000:8.2f}ms  analysis  {traced * 1000:8.2f}ms  was_type  (25 branches)")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+    benchmark_branches(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
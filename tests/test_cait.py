@@ -878,6 +878,166 @@ class CaitTests(unittest.TestCase):
         self.assertTrue(match03)
         self.assertTrue(match04)
 
+    def test_match_table(self):
+        contextualize_report("for item in item_list:\n"
+                             "    n = n + item\n"
+                             "n = 0")
+        matcher = StretchyTreeMatcher("_var_ = _var_ + ___", report=MAIN_REPORT)
+        std = parse_code(MAIN_REPORT.submission.main_code)
+        matches = matcher.find_matches(std)
+        self.assertEqual(len(matches), 1)
+        self.assertGreater(matcher.table_misses, 0)
+        # Repeated deep matches within one search should be answered with fresh copies
+        matcher._match_table = {}
+        ins, target = matcher.root_node.children[0], std.children[0].children[2]
+        first = matcher.deep_find_match(ins, target)
+        second = matcher.deep_find_match(ins, target)
+        self.assertEqual(matcher.table_hits, 1)
+        self.assertIsNot(first[0], second[0])
+        self.assertEqual(first[0].names(), second[0].names())
+        # Changing the maps from the first (missed) search must not change later hits
+        original_root = first[0].match_root
+        first[0].match_root = target
+        self.assertIsNot(original_root, target)
+        self.assertIs(matcher.deep_find_match(ins, target)[0].match_root, original_root)
+
+    def test_compile_pattern(self):
+        contextualize_report("for item in item_list:\n"
+                             "    n = n + item\n"
+                             "n = 0")
+        pattern = "_var_ = _var_ + _item_"
+        compiled = compile_pattern(pattern)
+        self.assertIs(compiled, compile_pattern(pattern))
+        self.assertEqual(compiled.explore_root.ast_name, "Assign")
+        first = find_match(pattern)
+        second = find_match(pattern)
+        self.assertEqual(first.names(), {'_var_': 'n', '_item_': 'item'})
+        self.assertEqual(first.names(), second.names())
+        self.assertEqual(first.match_root.tree_id, second.match_root.tree_id)
+        # Subpatterns are compiled too, and sharing the pattern should not change the results
+        loop = find_match("for _item_ in ___:\n    __body__")
+        self.assertTrue(loop["__body__"].find_match(pattern))
+        self.assertEqual(compiled.root_node.field, "none")
+        self.assertEqual(compiled.explore_root.field, "body")
+
+    def test_find_candidates(self):
+        std = parse_code("def f(a):\n    return a + 1\nb = f(2) + f(3)\nprint(b)")
+        matcher = StretchyTreeMatcher("_f_(___) + ___", report=MAIN_REPORT)
+        candidates = matcher.find_candidates(matcher.explore_root, std)
+        # Only the second addition has room for a call
+        self.assertEqual([node.ast_name for node in candidates], ["BinOp"])
+        self.assertEqual(candidates[0].lineno, 3)
+        self.assertEqual(len(matcher.find_matches(std)), 2)
+        wildcard = StretchyTreeMatcher("___", report=MAIN_REPORT)
+        self.assertEqual(len(wildcard.find_candidates(wildcard.explore_root, std)), len(std.linear_tree))
+
+    def test_find_matches_many(self):
+        contextualize_report("def f(a):\n"
+                             "    total = 0\n"
+                             "    for item in a:\n"
+                             "        total = total + item\n"
+                             "    return total\n"
+                             "print(f([1, 2]) + f([3]))")
+        patterns = ["for ___ in ___:\n    ___", "_var_ = _var_ + _item_", "__expr__ + __other__",
+                    "print(___)", "while ___:\n    pass", "_var_ = _var_ + _item_"]
+        many = find_matches_many(patterns)
+        self.assertEqual(len(many), len(patterns))
+        for pattern, matches in zip(patterns, many):
+            expected = find_matches(pattern)
+            self.assertEqual([match.names() for match in matches], [match.names() for match in expected])
+            self.assertEqual([match.match_root.tree_id for match in matches],
+                             [match.match_root.tree_id for match in expected])
+        self.assertEqual(many[4], [])
+        self.assertIsNot(many[1][0], many[5][0])
+
+    def test_lazy_matching(self):
+        std = parse_code("a = 1\n"
+                         "b = a + 2\n"
+                         "for x in [a, b]:\n"
+                         "    print(x)\n"
+                         "c = b + a")
+        for pattern in ["___\n___", "_x_ = ___\n_y_ = _x_ + ___", "__expr__ + __other__", "print(___)"]:
+            matcher = StretchyTreeMatcher(compile_pattern(pattern), report=MAIN_REPORT)
+            expected = matcher.find_matches(std)
+            lazy = list(matcher.iter_matches(std))
+            self.assertEqual([match.names() for match in lazy], [match.names() for match in expected])
+            self.assertEqual([sorted(node.tree_id for node in match.mappings.values()) for match in lazy],
+                             [sorted(node.tree_id for node in match.mappings.values()) for match in expected])
+            first = matcher.find_matches(std, limit=1)
+            self.assertEqual([match.names() for match in first], [expected[0].names()])
+        # Stopping early should still restore the pattern
+        compiled = compile_pattern("___ + ___")
+        self.assertEqual(len(StretchyTreeMatcher(compiled, report=MAIN_REPORT).find_matches(std, limit=1)), 1)
+        self.assertEqual(compiled.explore_root.field, "value")
+        contextualize_report("total = 0\nfor item in items:\n    total = total + item")
+        self.assertEqual(find_match("_t_ = _t_ + _i_").names(), {'_t_': 'total', '_i_': 'item'})
+        self.assertEqual(len(find_matches("___", limit=3)), 3)
+
+    def test_match_cache(self):
+        from pedal.cait.match_cache import MATCH_CACHE
+        MATCH_CACHE.clear()
+        pattern = "for _item_ in ___:\n    _total_ = _total_ + _item_"
+        contextualize_report("total = 0\nfor item in items:\n    total = total + item")
+        first = find_matches(pattern)
+        self.assertEqual((MATCH_CACHE.hits, MATCH_CACHE.misses), (0, 1))
+        # The same structure, but with different whitespace and comments
+        contextualize_report("# Sum it up\ntotal = 0\n\nfor item in items:  # each item\n"
+                             "    total = total + item\n")
+        second = find_matches(pattern)
+        self.assertEqual((MATCH_CACHE.hits, MATCH_CACHE.misses), (1, 1))
+        self.assertEqual([match.names() for match in first], [match.names() for match in second])
+        self.assertEqual(first[0].match_root.lineno, 2)
+        self.assertEqual(second[0].match_root.lineno, 4)
+        self.assertEqual(second[0]["_total_"][0].lineno, 5)
+        self.assertIs(second[0].match_root, MAIN_REPORT['cait']['ast'].find_all("For")[0])
+        # Different structures are matched separately
+        contextualize_report("total = 0\nfor item in items:\n    total = total - item")
+        self.assertEqual(find_matches(pattern), [])
+        self.assertEqual(MATCH_CACHE.misses, 2)
+
+    def test_profile_patterns(self):
+        from pedal.cait.match_cache import MATCH_CACHE
+        MATCH_CACHE.clear()
+        contextualize_report("total = 0\nfor item in items:\n    total = total + item\nprint(total)")
+        self.assertIsNone(MAIN_REPORT['cait']['profile'])
+        profiles = profile_patterns()
+        pattern = "_sum_ = 0\nfor _item_ in ___:\n    _sum_ = _sum_ + _item_"
+        self.assertTrue(find_matches(pattern))
+        self.assertTrue(find_matches(pattern))
+        self.assertFalse(find_match("while ___:\n    pass"))
+        profile = profiles[pattern]
+        self.assertEqual((profile.searches, profile.cached), (2, 1))
+        self.assertGreater(profile.deep_matches, 0)
+        self.assertGreater(profile.merges, 0)
+        self.assertGreater(profile.peak_maps, 0)
+        self.assertGreater(profile.seconds, 0)
+        self.assertEqual(profiles["while ___:\n    pass"].searches, 1)
+        self.assertEqual(set(profile.to_json()), {'searches', 'cached', 'deep_matches', 'merges',
+                                                  'peak_maps', 'seconds'})
+
+    def test_merged_maps_are_independent(self):
+        std = parse_code("a = b + c")
+        assign, target = std.children[0], std.children[0].children[0]
+        for name in std.find_all("Name"):
+            name.astNode._id = name.astNode.id
+        first, second = AstMap(), AstMap()
+        first.add_var_to_sym_table("_x_", target)
+        first.add_node_pairing(assign, assign)
+        second.add_var_to_sym_table("_y_", assign.children[1].children[0])
+        merged = first.new_merged_map(second)
+        merged.add_var_to_sym_table("_x_", assign.children[1].children[2])
+        merged.add_node_pairing(target, target)
+        self.assertEqual(merged.names(), {'_x_': 'a', '_y_': 'b'})
+        self.assertEqual(merged.conflict_keys, ['_x_'])
+        self.assertEqual(len(merged.symbol_table['_x_']), 2)
+        self.assertEqual(len(merged.mappings), 2)
+        # Neither of the original maps should have been changed
+        self.assertEqual(first.names(), {'_x_': 'a'})
+        self.assertEqual(len(first.symbol_table['_x_']), 1)
+        self.assertEqual(len(first.mappings), 1)
+        self.assertFalse(first.has_conflicts())
+        self.assertEqual(second.names(), {'_y_': 'b'})
+
     def test_cait_get_match_names(self):
         contextualize_report("for item in item_list:\n"
                              "    if item < 0:\n"
@@ -51,6 +51,33 @@ class CaitNodeTest(unittest.TestCase):
         if_set_if0 = if0_node.find_all("If")
         self.assertTrue(len(if_set_if0) == 1, "Found {} ifs, when 1 should be found".format(len(if_set_if0)))
 
+    def test_tree_index(self):
+        program = CaitNode(ast.parse("x = [1, 'a', True]\nif x:\n    print(x + 2)"))
+        index = program.get_tree_index()
+        self.assertIs(index, program.children[1].get_tree_index())
+        self.assertEqual(index.sizes[0], len(program.linear_tree))
+        self.assertEqual(program.children[0].get_subtree_range(), (1, 9))
+        self.assertEqual([node.value for node in program.find_all(["Str", "Num"])], [1, 'a', 2])
+        self.assertEqual([node.value for node in program.children[1].find_all("Constant")], [2])
+        self.assertEqual(len(program.find_all("Bool")), 1)
+        self.assertEqual(program.find_all("While"), [])
+
+    def test_lazy_children(self):
+        program = CaitNode(ast.parse("x = 1\nif x:\n    print(x)"))
+        self.assertIsNone(program._children)
+        if_node = program.body[1]
+        self.assertEqual(if_node.ast_name, "If")
+        self.assertIsNone(if_node._children)
+        self.assertIs(if_node.test.parent, if_node)
+        self.assertIs(if_node.report, program.report)
+        # Numbering the tree wraps everything that is left
+        self.assertEqual(if_node.tree_id, 5)
+        self.assertEqual(len(program.linear_tree), 14)
+        self.assertIs(program.linear_tree[5], if_node)
+        self.assertFalse(hasattr(program.astNode, "cait_node"))
+        if_node.map = "anything"
+        self.assertEqual(if_node.map, "anything")
+
     def test_has(self):
         program = ast.parse("x\n"
                             "y\n"
@@ -95,7 +122,6 @@ class CaitNodeTest(unittest.TestCase):
                         "Expected ast.cmpop, got {} instead".format(type(binops_funcs[0])))
         self.assertTrue(type(binops_names[0]) == str, "Expected ast.cmpop")
 
-    @unittest.skip("Not implemented yet")
     def test_numeric_logic_check(self):
         program = CaitNode(ast.parse("if 24 < x < 35:\n"
                                      "    pass"))
@@ -120,6 +146,14 @@ class CaitNodeTest(unittest.TestCase):
         compare = program.body[0].value
         self.assertTrue(compare.numeric_logic_check(1, "32 <= temp <= 50"))
 
+        program = CaitNode(ast.parse("0 < 2*x < 10"))
+        compare = program.body[0].value
+        self.assertTrue(compare.numeric_logic_check(1, "0 < x < 5"))
+        self.assertTrue(compare.numeric_logic_check([1, .5], "0 < x < 5"))
+        self.assertTrue(compare.numeric_logic_check(1, "0 < x <= 4"))
+        self.assertFalse(compare.numeric_logic_check([1, .5], "0 < x <= 4"))
+        self.assertFalse(compare.numeric_logic_check(1, "print(x)"))
+
     def test_get_value(self):
         x_val = 0
         program = ast.parse("x = {x_val}".format(x_val=x_val))
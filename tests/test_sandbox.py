@@ -537,6 +537,85 @@ def to_pig_latin(str):
         commands.call('to_pig_latin', 'test', threaded=True)
         self.assertNotIsInstance(commands.get_exception(), RecursionError)
 
+    def test_isolated_stops_c_level_loop(self):
+        contextualize_report("x = sum(range(10**12))")
+        commands.set_isolation()
+        commands.get_sandbox().allowed_time = 1
+        commands.run()
+        self.assertIsInstance(commands.get_exception(), TimeoutError)
+        self.assertNotIn('x', commands.get_student_data())
+
+    def test_isolated_memory_limit(self):
+        contextualize_report("x = [0] * (10**9)")
+        commands.set_isolation(allowed_memory=50)
+        commands.run()
+        self.assertIsInstance(commands.get_exception(), MemoryError)
+
+    def test_isolated_normal_run_and_call(self):
+        contextualize_report("def double(a):\n    return a * 2\nprint(input('Value:'))")
+        commands.set_isolation()
+        commands.queue_input("7")
+        commands.run()
+        self.assertIsNone(commands.get_exception())
+        self.assertEqual(["Value:", "7"], commands.get_output())
+        self.assertEqual(8, commands.call('double', 4))
+
+    def test_isolated_call_with_long_arguments(self):
+        contextualize_report("def f(values):\n    while True:\n        pass")
+        commands.set_isolation()
+        commands.get_sandbox().allowed_time = 1
+        commands.run()
+        commands.call('f', list(range(1000)), threaded=True)
+        self.assertIsInstance(commands.get_exception(), TimeoutError)
+
+    def test_isolated_reports_error(self):
+        contextualize_report(Submission({
+            'answer.py': "print('Before')\nopen('data.txt').read()\n1 + ''",
+            'data.txt': 'Hello'
+        }))
+        commands.set_isolation()
+        commands.run()
+        self.assertIsInstance(commands.get_exception(), TypeError)
+        self.assertEqual(["Before"], commands.get_output())
+        self.assertEqual(3, commands.get_sandbox().feedback.location.line)
+
+    def test_isolated_uses_instructor_mocks(self):
+        contextualize_report("import helper\nprint(secret(), helper.value)")
+        commands.set_isolation()
+        commands.mock_function('secret', lambda: 42)
+        commands.mock_module('helper', {'value': 7})
+        commands.run()
+        self.assertIsNone(commands.get_exception())
+        self.assertEqual(["42 7"], commands.get_output())
+
+    def test_isolated_input_function(self):
+        contextualize_report("while input('Command:') != 'quit':\n    pass\nprint('Done')")
+        commands.set_isolation()
+        commands.get_sandbox().allowed_time = 1
+        commands.set_input(lambda prompt: 'quit')
+        commands.run()
+        self.assertIsNone(commands.get_exception())
+        self.assertEqual(["Done"], commands.get_output())
+
+    def test_isolated_unchecked_code_is_still_limited(self):
+        contextualize_report("while secret():\n    pass")
+        commands.set_isolation()
+        commands.get_sandbox().allowed_time = .5
+        commands.mock_function('secret', lambda: True)
+        commands.run()
+        self.assertIsInstance(commands.get_exception(), TimeoutError)
+
+    def test_compiled_code_is_cached(self):
+        contextualize_report('def triple(a):\n    return 3 * a')
+        first, second = Sandbox(), Sandbox()
+        first.run()
+        second.run()
+        self.assertEqual(1, second.compile_hits)
+        for value in range(5):
+            self.assertEqual(12, second.call('triple', 4))
+        self.assertGreaterEqual(second.compile_hits, 5)
+        self.assertLessEqual(second.compile_misses, 1)
+
     def test_duplicate_parameters(self):
         contextualize_report("def x(y,y): pass")
         commands.run()
@@ -9,6 +9,8 @@ from pedal.core import *
 from pedal.core.commands import clear_report, get_all_feedback, contextualize_report
 from pedal.source import *
 from pedal.tifa import tifa_analysis
+from pedal.cait import parse_program
+from pedal.core.report import MAIN_REPORT
 from tests.execution_helper import Execution
 import pedal.resolvers.sectional as sectional
 from pedal.utilities.system import IS_AT_LEAST_PYTHON_311, IS_AT_LEAST_PYTHON_39, IS_AT_LEAST_PYTHON_38, IS_AT_LEAST_PYTHON_310
@@ -154,5 +156,14 @@ The variable b was used on line 7, but it was not given a value on a previous li
                          "\n".join(f.title+"\n"+f.message for f in finals.values()))
 
 
+    def test_parses_once(self):
+        contextualize_report('def add(a, b):\n    return a + b\nprint(add(1, 2))')
+        verify()
+        tifa_analysis()
+        parse_program()
+        self.assertEqual(1, MAIN_REPORT.parsed.parse_count)
+        self.assertIs(MAIN_REPORT['source']['ast'], parse_program().astNode)
+
+
 if __name__ == '__main__':
     unittest.main(buffer=False)
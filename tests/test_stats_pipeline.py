@@ -1,7 +1,13 @@
 
 
-from pedal.command_line.modes import StatsPipeline, MODES
+import json
+import os
+import pytest
+
+from pedal.command_line.modes import StatsPipeline, Bundle, MODES, make_portable
+from pedal.command_line.result_cache import ResultCache
 from pedal.core.config_job import JobConfig
+from pedal.core.submission import Submission
 
 
 def test_stats_pipeline():
@@ -25,4 +31,282 @@ def test_stats_pipeline():
         assert False, f"StatsPipeline run failed with exception: {e}"
 
     # Check if the report is generated
-    assert pipeline.submissions[0].result.resolution.score == .5, "Expected score to be 1.5"
\ No newline at end of file
+    assert pipeline.submissions[0].result.resolution.score == .5, "Expected score to be 1.5"
+    # The submission should have only been parsed once, despite being checked by several tools
+    assert pipeline.submissions[0].result.statistics['parse_count'] == 1
+
+
+def run_repeated_stats_pipeline(**settings):
+    pipeline = StatsPipeline(JobConfig(
+        mode=MODES.STATS,
+        submissions="def main():\n    return 'Hello, World!'",
+        instructor="from pedal import *\nensure_function('main', score='+60%')\nensure_function('other')",
+        instructor_direct=True,
+        submission_direct=True,
+        **settings
+    ))
+    pipeline.load_submissions()
+    pipeline.submissions *= 3
+    pipeline.setup_execution()
+    pipeline.run_control_scripts()
+    return pipeline
+
+
+DISTINCT_SUBMISSIONS = ["# First\ndef main():\n    return 'Hello, World!'",
+                        "# Second\ndef other():\n    return 0",
+                        "# Third\ndef main():\n    return 1\ndef other():\n    return 2",
+                        "# Fourth\nx = 0"]
+
+
+def run_distinct_stats_pipeline(**settings):
+    pipeline = StatsPipeline(JobConfig(
+        mode=MODES.STATS,
+        submissions="",
+        instructor="from pedal import *\nprint(get_program().splitlines()[0])\n"
+                   "ensure_function('main', score='+60%')\nensure_function('other')",
+        instructor_direct=True,
+        submission_direct=True,
+        **settings
+    ))
+    pipeline.submissions = [Bundle(pipeline.config, pipeline.config.instructor,
+                                   Submission(main_file="answer.py", main_code=code,
+                                              instructor_file=pipeline.config.instructor))
+                            for code in DISTINCT_SUBMISSIONS]
+    pipeline.setup_execution()
+    pipeline.run_control_scripts()
+    return pipeline
+
+
+def assert_distinct_results(pipeline):
+    """ Each bundle should have gotten its own result back, in its original order. """
+    assert [bundle.result.output.splitlines()[0] for bundle in pipeline.submissions] == \
+        [code.splitlines()[0] for code in DISTINCT_SUBMISSIONS]
+    assert [bundle.result.resolution.score for bundle in pipeline.submissions] == [.6, 0, .6, 0]
+
+
+def assert_same_results(serial, parallel):
+    for expected, actual in zip(serial.submissions, parallel.submissions):
+        assert actual.result.data == {}, "Worker results should not carry execution data"
+        assert expected.result.resolution.score == actual.result.resolution.score
+        assert expected.result.resolution.label == actual.result.resolution.label
+        assert ([f.label for f in expected.result.resolution._scores_feedback] ==
+                [f.label for f in actual.result.resolution._scores_feedback])
+        assert make_portable(expected.to_json()['result']) == make_portable(actual.to_json()['result'])
+
+
+def test_stats_pipeline_workers_match_serial():
+    """
+    Running the bundles across worker processes should give the same results, in the same order,
+    as running them serially.
+    """
+    serial = run_distinct_stats_pipeline(workers=0)
+    parallel = run_distinct_stats_pipeline(workers=2)
+    assert_distinct_results(serial)
+    assert_distinct_results(parallel)
+    assert_same_results(serial, parallel)
+
+
+def test_stats_pipeline_workers_with_isolation():
+    """
+    The workers cannot start their own worker processes, so isolated executions should still run
+    (with just the threaded time limit) instead of failing.
+    """
+    pipeline = StatsPipeline(JobConfig(
+        mode=MODES.STATS,
+        submissions="print('Hello')",
+        instructor="from pedal import *\nset_isolation()\nrun()\nprint(get_output())",
+        instructor_direct=True,
+        submission_direct=True,
+        skip_run=True,
+        workers=2,
+    ))
+    pipeline.load_submissions()
+    pipeline.submissions *= 2
+    pipeline.setup_execution()
+    pipeline.run_control_scripts()
+    for bundle in pipeline.submissions:
+        assert bundle.result.error is None
+        assert "['Hello']" in bundle.result.output
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="Requires os.fork")
+def test_stats_pipeline_fork_server_match_serial():
+    """
+    Running each bundle in a forked process should give the same results as running them serially.
+    """
+    serial = run_distinct_stats_pipeline()
+    for parallel in (run_distinct_stats_pipeline(fork_server=True),
+                     run_distinct_stats_pipeline(fork_server=True, workers=2)):
+        assert_distinct_results(parallel)
+        assert_same_results(serial, parallel)
+
+
+def test_stats_pipeline_streaming(tmp_path):
+    """
+    Streaming the bundles should write out each report as it is finished, without holding onto
+    the submissions or their reports.
+    """
+    output = tmp_path / "stats.jsonl"
+    pipeline = StatsPipeline(JobConfig(
+        mode=MODES.STATS,
+        submissions="def main():\n    return 'Hello, World!'",
+        instructor="from pedal import *\nensure_function('main', score='+60%')",
+        instructor_direct=True,
+        submission_direct=True,
+        points=".5",
+        stream=True,
+        output=str(output),
+    ))
+    report = pipeline.execute()
+    assert pipeline.submissions == [], "Streamed bundles should not be kept around"
+    assert report['result'] == [], "Streamed reports should not be kept around"
+    entries = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(entries) == 1
+    assert entries[0]['result']['score'] == .5
+
+
+def test_stats_pipeline_streaming_to_stdout(capsys):
+    """
+    Streaming to stdout should print each report as a line of JSON.
+    """
+    pipeline = StatsPipeline(JobConfig(
+        mode=MODES.STATS,
+        submissions="def main():\n    return 'Hello, World!'",
+        instructor="from pedal import *\nensure_function('main', score='+60%')",
+        instructor_direct=True,
+        submission_direct=True,
+        points=".5",
+        stream=True,
+        output='stdout',
+    ))
+    pipeline.execute()
+    entries = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+    assert len(entries) == 1
+    assert entries[0]['result']['score'] == .5
+
+
+def test_stats_pipeline_result_cache(tmp_path):
+    """
+    Identical bundles should only be graded once, with later runs reusing the cached results.
+    """
+    serial = run_repeated_stats_pipeline()
+    first = run_repeated_stats_pipeline(cache=str(tmp_path))
+    assert (first.result_cache.misses, first.result_cache.hits) == (1, 2)
+    assert_same_results(serial, first)
+    second = run_repeated_stats_pipeline(cache=str(tmp_path), workers=2)
+    assert all(bundle.cached for bundle in second.submissions)
+    assert_same_results(serial, second)
+    assert second.result_cache.hits == 3
+
+
+def run_unrepeatable_stats_pipeline(cache, instructor, submission):
+    pipeline = StatsPipeline(JobConfig(
+        mode=MODES.STATS,
+        submissions=submission,
+        instructor=instructor,
+        instructor_direct=True,
+        submission_direct=True,
+        skip_run=True,
+        cache=cache,
+    ))
+    pipeline.load_submissions()
+    pipeline.setup_execution()
+    pipeline.run_control_scripts()
+    return pipeline
+
+
+def test_stats_pipeline_result_cache_skips_errors_and_timeouts(tmp_path):
+    """
+    Errors and timeouts might only be caused by a busy machine, so they should not be cached.
+    """
+    for instructor, submission in [("raise ValueError('Broken')", "x = 0"),
+                                   ("from pedal import *\nget_sandbox().allowed_time = .1\nrun(threaded=True)",
+                                    "while True:\n    pass")]:
+        first = run_unrepeatable_stats_pipeline(str(tmp_path), instructor, submission)
+        second = run_unrepeatable_stats_pipeline(str(tmp_path), instructor, submission)
+        assert (second.result_cache.misses, second.result_cache.hits) == (1, 0)
+        assert first.submissions[0].result.error or first.submissions[0].result.statistics['timed_out']
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_size=1000)
+    cache.put('first', 'a' * 400)
+    cache.put('second', 'b' * 400)
+    assert cache.get('first') == 'a' * 400
+    cache.put('third', 'c' * 400)
+    assert cache.get('second') is None
+    assert cache.get('first') == 'a' * 400
+    assert cache.size <= 1000
+    assert ResultCache(str(tmp_path), max_size=1000).get('third') == 'c' * 400
+
+
+def run_progsnap_stats_pipeline(**settings):
+    pipeline = StatsPipeline(JobConfig(
+        mode=MODES.STATS,
+        submissions=os.path.join(os.path.dirname(__file__), "datafiles", "progsnap2_3.db"),
+        instructor="from pedal import *\nensure_function('main', score='+60%')",
+        instructor_direct=True,
+        limit=40,
+        **settings
+    ))
+    pipeline.load_submissions()
+    pipeline.setup_execution()
+    pipeline.run_control_scripts()
+    return pipeline
+
+
+def test_stats_pipeline_deduplicates_code_states():
+    """
+    Events that share a code state should only be run once, but each should still get the result
+    (along with its own metadata).
+    """
+    everything = run_progsnap_stats_pipeline(skip_dedup=True)
+    deduplicated = run_progsnap_stats_pipeline()
+    assert not any(bundle.cached for bundle in everything.submissions)
+    assert any(bundle.cached for bundle in deduplicated.submissions)
+    assert len(everything.submissions) == len(deduplicated.submissions)
+    for expected, actual in zip(everything.submissions, deduplicated.submissions):
+        assert expected.submission.execution == actual.submission.execution
+        expected, actual = expected.to_json()['result'], actual.to_json()['result']
+        for key in ('output', 'score', 'label', 'title', 'message', 'correct'):
+            assert expected[key] == actual[key]
+
+
+def test_stats_pipeline_deduplicates_recent_code_states(monkeypatch):
+    """
+    Only the most recent code states should be remembered, but every event should still get the
+    right result.
+    """
+    everything = run_progsnap_stats_pipeline(skip_dedup=True)
+    unbounded = run_progsnap_stats_pipeline()
+    monkeypatch.setattr(StatsPipeline, 'DUPLICATES_REMEMBERED', 1)
+    deduplicated = run_progsnap_stats_pipeline()
+    cached = sum(bundle.cached for bundle in deduplicated.submissions)
+    assert 0 < cached < sum(bundle.cached for bundle in unbounded.submissions)
+    for expected, actual in zip(everything.submissions, deduplicated.submissions):
+        expected, actual = expected.to_json()['result'], actual.to_json()['result']
+        for key in ('output', 'score', 'label', 'title', 'message', 'correct'):
+            assert expected[key] == actual[key]
+
+
+def test_stats_pipeline_profiles_cait_patterns(capsys):
+    """
+    Profiling CAIT should record the work done for each pattern in the statistics, and list the
+    most expensive patterns.
+    """
+    pipeline = StatsPipeline(JobConfig(
+        mode=MODES.STATS,
+        submissions="total = 0\nfor item in [1, 2]:\n    total = total + item",
+        instructor="from pedal import *\n"
+                   "from pedal.cait import find_matches\n"
+                   "find_matches('for _item_ in ___:\\n    ___ = ___ + _item_')",
+        instructor_direct=True,
+        submission_direct=True,
+        profile_cait=True,
+        output='stdout',
+    ))
+    pipeline.execute()
+    profile = pipeline.submissions[0].result.statistics['cait_profile']
+    assert list(profile) == ['for _item_ in ___:\n    ___ = ___ + _item_']
+    assert profile['for _item_ in ___:\n    ___ = ___ + _item_']['searches'] == 1
+    assert "Most expensive CAIT patterns:" in capsys.readouterr().out
@@ -11,8 +11,10 @@ import pedal.tifa
 import pedal.types.new_types as defs
 import pedal.types.normalize as normalize
 from pedal import contextualize_report, Submission, evaluate
+from pedal.core.report import Report
 from pedal.tifa import tifa_provide_module_type
 from pedal.tifa.state import print_history_diagram
+from pedal.types.builtin import get_builtin_module
 
 unit_tests = {
     'add_assign_inside_dataclass_function':
@@ -794,6 +796,21 @@ class TestVariables(unittest.TestCase):
         self.assertTrue(result.success)
         self.assertNotIn('module_not_found', result.issues)
 
+    def test_builtin_modules_are_not_shared(self):
+        first, second = Report(), Report()
+        pedal.tifa.Tifa(report=first).process_code('import math\nmath.pi = "pie"\nprint(math.pi)')
+        self.assertIsInstance(first['tifa']['types']['modules']['math'].fields['pi'], defs.StrType)
+        result = pedal.tifa.Tifa(report=second).process_code('import math\nx = math.pi + 1\nprint(x)')
+        self.assertIsInstance(result.top_level_variables['x'].type, defs.FloatType)
+        get_builtin_module('math').add_attr('pi', defs.StrType())
+        self.assertIsInstance(get_builtin_module('math').fields['pi'], defs.FloatType)
+
+    def test_builtin_module_classes_are_not_shared(self):
+        first, second = Report(), Report()
+        pedal.tifa.Tifa(report=first).process_code("from PIL import Image\nImage.Image.width = 'wide'")
+        result = pedal.tifa.Tifa(report=second).process_code("from PIL import Image\nprint(Image.Image.width + 5)")
+        self.assertNotIn('incompatible_types', result.issues)
+
     def test_get_types(self):
         tifa = pedal.tifa.Tifa()
         result = tifa.process_code('a=0\na="Hello"\na=[1,2,3]\na=1')
@@ -116,6 +116,17 @@ class TestNormalizeType(unittest.TestCase):
         self.assert_is_subtype(get_pedal_type_from_value({1: {2: 'hello'}}), nested_dict)
         self.assert_is_not_subtype(get_pedal_type_from_value({1: {"Ooops": 'hello'}}), nested_dict)
 
+    def test_interned_types(self):
+        self.assertIs(types.IntType(), types.IntType())
+        self.assertIs(types.StrType(), types.StrType(is_empty=False))
+        self.assertIsNot(types.StrType(True), types.StrType(False))
+        self.assertIsNot(types.LiteralStr("a"), types.LiteralStr("a"))
+        self.assertIsNot(types.ListType(False, types.IntType()), types.ListType(False, types.IntType()))
+        # A shared type that was already checked is not a subtype of everything
+        pair = types.TupleType((types.IntType(), types.IntType()))
+        self.assertTrue(is_subtype(pair, types.TupleType((types.NumType(), types.NumType()))))
+        self.assertFalse(is_subtype(pair, types.TupleType((types.NumType(), types.StrType()))))
+
 
 if __name__ == '__main__':
     unittest.main(buffer=False)
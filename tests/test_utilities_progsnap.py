@@ -1,14 +1,44 @@
 """
 Check utilities.sorting
 """
+import csv
+import io
 import sys
 import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
-from pedal.utilities.progsnap import SqlProgSnap2
+import zipfile
+from pedal.utilities.progsnap import SqlProgSnap2, ZipProgSnap2
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 here = "" if os.path.basename(os.getcwd()) == "tests" else "tests/"
 
+
+def export_progsnap_zip(database, path, code_state_table=False, compression=zipfile.ZIP_DEFLATED):
+    """ Converts the SQL version of a ProgSnap2 dataset into the Zipped-CSV version. """
+    def write_csv(archive, name, cursor):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow([column[0] for column in cursor.description])
+        writer.writerows(cursor)
+        archive.writestr(name, output.getvalue())
+
+    with sqlite3.connect(database) as connection, zipfile.ZipFile(path, 'w', compression) as archive:
+        write_csv(archive, "dataset/MainTable.csv", connection.execute("SELECT * FROM MainTable"))
+        for table in ('Subject', 'Assignment', 'AssignmentGroup'):
+            write_csv(archive, f"dataset/LinkTables/{table}.csv",
+                      connection.execute(f"SELECT * FROM Link{table}"))
+        if code_state_table:
+            write_csv(archive, "dataset/CodeStates/CodeStates.csv",
+                      connection.execute("SELECT ID AS CodeStateID, CAST(Contents AS TEXT) AS Code FROM CodeState "
+                                         "WHERE rowid IN (SELECT MIN(rowid) FROM CodeState GROUP BY ID)"))
+        else:
+            for code_state_id, filename, contents in connection.execute("SELECT * FROM CodeState"):
+                archive.writestr(f"dataset/CodeStates/{code_state_id}/{filename}", contents)
+
+
 class TestProgsnap(unittest.TestCase):
     def test_progsnap_sort(self):
         progsnap = SqlProgSnap2(here+"datafiles/progsnap2_3.db")
@@ -41,6 +71,107 @@ class TestProgsnap(unittest.TestCase):
         self.assertIsInstance(fun_student_edits[0], dict)
         self.assertEqual("592", fun_student_edits[0]['event_id'])
 
+    def test_progsnap_iterate_events(self):
+        progsnap = SqlProgSnap2(here+"datafiles/progsnap2_3.db")
+        progsnap.set_profile('blockpy')
+        all_edits = progsnap.get_events(event_filter={'EventType': 'File.Edit'})
+        streamed_edits = progsnap.iterate_events(event_filter={'EventType': 'File.Edit'},
+                                                 batch_size=7)
+        self.assertNotIsInstance(streamed_edits, list)
+        self.assertEqual(all_edits, list(streamed_edits))
+
+    def test_progsnap_incremental_cache(self):
+        with tempfile.TemporaryDirectory() as folder:
+            database = os.path.join(folder, "progsnap2.db")
+            shutil.copy(here+"datafiles/progsnap2_3.db", database)
+            cache = os.path.join(folder, "cache")
+            with SqlProgSnap2(database) as progsnap:
+                progsnap.set_profile('blockpy')
+                uncached = progsnap.get_events(event_filter={'EventType': 'File.Edit'})
+            with SqlProgSnap2(database, cache=cache) as progsnap:
+                progsnap.set_profile('blockpy')
+                cached = progsnap.get_events(event_filter={'EventType': 'File.Edit'})
+            self.assertEqual(sorted(uncached, key=repr), sorted(cached, key=repr))
+            # Add a new event, copied from an existing one
+            with sqlite3.connect(database) as connection:
+                connection.execute("INSERT INTO MainTable (EventID, EventType, SubjectID, AssignmentID, CodeStateID) "
+                                   "SELECT 'new', EventType, SubjectID, AssignmentID, CodeStateID "
+                                   "FROM MainTable WHERE EventID=?", (uncached[0]['event_id'],))
+            with SqlProgSnap2(database, cache=cache) as progsnap:
+                progsnap.set_profile('blockpy')
+                updated = progsnap.get_events(event_filter={'EventType': 'File.Edit'})
+                self.assertEqual(len(cached) + 1, len(updated))
+                self.assertEqual(cached, updated[:-1])
+                self.assertEqual('new', updated[-1]['event_id'])
+                self.assertEqual(updated, progsnap.get_events(event_filter={'EventType': 'File.Edit'}))
+                indexes = progsnap._cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+                self.assertIn('pedal_MainTable_EventType', {name for name, in indexes})
+
+    def test_progsnap_cache_keeps_filters_apart(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with SqlProgSnap2(here+"datafiles/progsnap2_3.db") as progsnap:
+                progsnap.set_profile('blockpy')
+                expected = {event_type: progsnap.get_events(event_filter={'EventType': event_type})
+                            for event_type in ('File.Edit', 'Run.Program')}
+            for _ in range(2):
+                with SqlProgSnap2(here+"datafiles/progsnap2_3.db", cache=folder) as progsnap:
+                    progsnap.set_profile('blockpy')
+                    for event_type, events in expected.items():
+                        cached = progsnap.get_events(event_filter={'EventType': event_type})
+                        self.assertEqual(sorted(events, key=repr), sorted(cached, key=repr))
+
+    def test_progsnap_zip_matches_sql(self):
+        with SqlProgSnap2(here+"datafiles/progsnap2_3.db") as progsnap:
+            progsnap.set_profile('blockpy')
+            expected = progsnap.get_events(event_filter={'EventType': 'File.Edit'},
+                                           link_filters={'Assignment': {'X-Name': "Fun%"}})
+        for event in expected:
+            event['submission_code'] = event['submission_code'].decode('utf-8')
+        self.assertTrue(expected)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "progsnap2.zip")
+            export_progsnap_zip(here+"datafiles/progsnap2_3.db", path)
+            with ZipProgSnap2(path) as progsnap:
+                progsnap.set_profile('blockpy')
+                events = progsnap.iterate_events(event_filter={'EventType': 'File.Edit'},
+                                                 link_filters={'Assignment': {'X-Name': "Fun%"}})
+                self.assertNotIsInstance(events, list)
+                self.assertEqual(sorted(expected, key=repr), sorted(events, key=repr))
+                self.assertEqual(5, len(progsnap.get_events(event_filter={'EventType': 'File.Edit'},
+                                                            limit=5)))
+
+    def test_progsnap_zip_like_filters_match_sql(self):
+        patterns = ["#16._) %", "#1_._) %", "%typo", "%[%", "%*%", "#14.?) %"]
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "progsnap2.zip")
+            export_progsnap_zip(here+"datafiles/progsnap2_3.db", path)
+            with SqlProgSnap2(here+"datafiles/progsnap2_3.db") as sql, ZipProgSnap2(path) as archive:
+                sql.set_profile('blockpy')
+                archive.set_profile('blockpy')
+                for pattern in patterns:
+                    expected, actual = [[event['event_id'] for event in progsnap.iterate_events(
+                                            event_filter={'EventType': 'File.Edit'},
+                                            link_filters={'Assignment': {'X-Name': pattern}}, with_code=False)]
+                                        for progsnap in (sql, archive)]
+                    self.assertEqual(sorted(expected), sorted(actual), pattern)
+                    if pattern.startswith("#16"):
+                        self.assertTrue(expected)
+
+    def test_progsnap_zip_code_state_table(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                path = os.path.join(folder, f"progsnap2_{compression}.zip")
+                export_progsnap_zip(here+"datafiles/progsnap2_3.db", path,
+                                    code_state_table=True, compression=compression)
+                with ZipProgSnap2(path) as progsnap, \
+                        sqlite3.connect(here+"datafiles/progsnap2_3.db") as connection:
+                    for code_state_id, contents in connection.execute(
+                            "SELECT ID, Contents FROM CodeState WHERE rowid IN "
+                            "(SELECT MIN(rowid) FROM CodeState GROUP BY ID) ORDER BY random() LIMIT 20"):
+                        self.assertEqual([contents.decode('utf-8')],
+                                         progsnap.get_code_states(code_state_id))
+                    self.assertEqual([], progsnap.get_code_states("missing"))
+
 
 if __name__ == '__main__':
     unittest.main(buffer=False)